@@ -1,26 +1,23 @@
 import math
-import pygame
 from math_utils import Vector, Ray
+from simulation_config import DEFAULT_SIMULATION_CONFIG
 
-FRICTION_ACCEL = 200
-MAX_VELOCITY = 500
 CAR_BOUNDING_BOX_WIDTH = 141
 CAR_BOUDNING_BOX_HEIGHT = 65
-RAY_ANGLE = math.radians(25)
 
 class Car:
 	"""
 	Represents a car in-game
 	"""
 
-	# Holds the sprite used to draw any instance of Car. Lazily loaded by `Car.get_sprite()`
-	car_sprite = None
-
-	def __init__(self, initial_x, initial_y):
+	def __init__(self, initial_x, initial_y, config=DEFAULT_SIMULATION_CONFIG):
 		"""
-		Constructs a car with the given initial position: `(initial_x, initial_y)`
+		Constructs a car with the given initial position: `(initial_x, initial_y)`. The physical
+		parameters of the car are taken from the `SimulationConfig` `config`.
 		"""
 
+		self.config = config
+
 		self.position = Vector(initial_x, initial_y)
 		self.direction = 0 # In radians
 
@@ -40,8 +37,9 @@ class Car:
 		if abs(self.velocity) < 0.9:
 			self.velocity = 0
 
-		if math.fabs(self.velocity) > MAX_VELOCITY:
-			self.velocity *= MAX_VELOCITY/(math.fabs(self.velocity))
+		max_velocity = self.config.max_velocity
+		if math.fabs(self.velocity) > max_velocity:
+			self.velocity *= max_velocity/(math.fabs(self.velocity))
 
 	def set_move_acceleration(self, acceleration):
 		"""
@@ -50,7 +48,7 @@ class Car:
 		self.acceleration = acceleration
 
 		if math.fabs(self.velocity) > 0:
-			friction_magnitude = min(self.velocity, FRICTION_ACCEL)
+			friction_magnitude = min(self.velocity, self.config.friction_accel)
 			self.acceleration -= math.copysign(friction_magnitude, self.velocity)
 
 	def draw(self, screen, screen_mapping):
@@ -58,13 +56,9 @@ class Car:
 		Draws the car on `screen`, with the position adjusted based on the provided `screen_mapping`
 		"""
 
-		rotated_sprite = pygame.transform.rotate(Car.get_sprite(), self.direction * 180/math.pi)
-
-		sprite_rect = rotated_sprite.get_rect()
-		sprite_middle = Vector(sprite_rect.width, sprite_rect.height)/2
-		sprite_position = self.position - sprite_middle
-		screen_position = sprite_position + screen_mapping
-		screen.blit(rotated_sprite, screen_position.as_tuple())
+		# The rendering layer needs pygame, so it is only imported once something is drawn
+		import render
+		render.draw_car(screen, self, screen_mapping)
 
 	def get_sight_rays(self):
 		"""
@@ -72,12 +66,30 @@ class Car:
 		"""
 
 		rays = []
-		for ray_angle in (-RAY_ANGLE, 0, RAY_ANGLE):
+		for ray_angle in self.config.ray_angles:
 			start_pos = self.position
 			direction = Vector.unit_from_angle(self.direction+ray_angle)
 			rays.append(Ray(start_pos, direction))
 		return rays
 
+	def get_ray_directions(self):
+		"""
+		Returns a list of the `(x, y)` unit directions of the sensors of the car, the same as those of
+		the rays returned by `get_sight_rays`
+		"""
+
+		directions = []
+		for ray_angle in self.config.ray_angles:
+			angle = self.direction + ray_angle
+			# See `Vector.unit_from_angle`, the direction is normalized again like in a `Ray`
+			dir_x, dir_y = math.cos(angle), -math.sin(angle)
+			sqr_magnitude = dir_x**2 + dir_y**2
+			if sqr_magnitude != 1.0:
+				scale = 1/math.sqrt(sqr_magnitude)
+				dir_x, dir_y = dir_x*scale, dir_y*scale
+			directions.append((dir_x, dir_y))
+		return directions
+
 	def get_bounding_box(self):
 		"""
 		Returns a list represention of the 4 points that define the car's bounding box.
@@ -100,14 +112,4 @@ class Car:
 		"""
 		Returns a normalized value representing the magnitude of the velocity
 		"""
-		return math.fabs(self.velocity)/MAX_VELOCITY
-
-	@staticmethod
-	def get_sprite():
-		"""
-		Returns the sprite used to draw a car. Lazily loads the sprite upon request.
-		"""
-
-		if Car.car_sprite is None:
-			Car.car_sprite = pygame.transform.scale(pygame.image.load('assets/red_car.png'), (165, 78)).convert_alpha()
-		return Car.car_sprite
+		return math.fabs(self.velocity)/self.config.max_velocity
@@ -0,0 +1,170 @@
+import os
+import time
+import argparse
+
+import game_map
+from game import Game
+from compiled_map import compile_map
+from chunked_track import ChunkedTrack, is_chunked_track
+from neat.genome import Genome
+from neat.history import HistoryReader
+from simulation import simulate, get_car_controls, stop_stalled_cars
+from simulation_config import DEFAULT_SIMULATION_CONFIG, RAY_ANGLES, parse_ray_angle
+
+SCREEN_WIDTH = 1600
+SCREEN_HEIGHT = 900
+
+def load_champions(genome_filenames, history_filename=None, generations=None):
+	"""
+	Loads the genomes to evaluate: the genomes saved in the files `genome_filenames`, and the
+	champions of `generations` (by default the last generation) out of the history at
+	`history_filename`. Returns a list of `(name, genome)` tuples.
+	"""
+
+	champions = []
+	for genome_filename in genome_filenames:
+		with open(genome_filename, 'rb') as genome_file:
+			champions.append((os.path.basename(genome_filename), Genome.from_bytes(genome_file.read())))
+
+	if history_filename is not None:
+		with HistoryReader(history_filename) as history:
+			if generations is None:
+				generations = history.generations()[-1:]
+			for generation in generations:
+				champions.append((f'generation {generation}', history.read_champion(generation)))
+
+	return champions
+
+def benchmark_champion(network, track, config=DEFAULT_SIMULATION_CONFIG, repeat=1):
+	"""
+	Simulates the car driven by `network` alone on `track` (a tuple of the start position, the walls
+	and the checkpoints) `repeat` times. Returns the final `Game` and the fastest simulation time (in
+	seconds).
+	"""
+
+	best_elapsed = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		game = simulate([network], *track, config)
+		elapsed = time.perf_counter() - start
+		if best_elapsed is None or elapsed < best_elapsed:
+			best_elapsed = elapsed
+	return (game, best_elapsed)
+
+def render_champions(networks, track, config=DEFAULT_SIMULATION_CONFIG):
+	"""
+	Shows the cars driven by `networks` driving together on `track` in the game window, until all of
+	them die or stall, or the window is closed. The simulation uses the same fixed time step as the
+	headless evaluation, so the cars drive exactly as they were evaluated.
+	"""
+
+	# The window is only needed when rendering, so pygame is only imported here
+	import pygame
+	import ui
+
+	pygame.init()
+	screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+	frame_clock = pygame.time.Clock()
+
+	game = Game(len(networks), *track, config)
+	last_car_sensors = None
+	last_fitness = None
+	stall_time = [0]*len(networks)
+	while True:
+		for event in pygame.event.get():
+			if event.type == pygame.QUIT:
+				pygame.quit()
+				return
+
+		fitness = game.get_cars_fitness()
+		if last_fitness is not None:
+			stop_stalled_cars(game, stall_time, last_fitness, fitness, config)
+		last_fitness = fitness
+		if all(game.dead):
+			pygame.quit()
+			return
+
+		# The camera follows the most fit car which is still driving
+		alive_cars = [i for i in range(len(networks)) if not game.dead[i]]
+		game.track_car(max(alive_cars, key=lambda i: fitness[i]))
+
+		controls = get_car_controls(networks, last_car_sensors)
+		last_car_sensors = game.update(config.timestep, controls)
+		for car_idx in range(len(stall_time)):
+			stall_time[car_idx] += config.timestep * 1000
+
+		# Background color
+		screen.fill((57, 57, 57))
+		game.draw_scene(screen)
+		ui.draw_speedometer(screen, game.cars[game.tracked_car].get_normalized_speed())
+		pygame.display.flip()
+		frame_clock.tick(round(1 / config.timestep))
+
+def main():
+	parser = argparse.ArgumentParser(description='Evaluates saved champions headless and benchmarks the simulation')
+	parser.add_argument('genomes', metavar='GENOME', nargs='*',
+		help='a genome file to evaluate, e.g. saved with --output or with the `s` key')
+	parser.add_argument('--history', metavar='HISTORY',
+		help='also evaluate champions recorded in the history file HISTORY')
+	parser.add_argument('--generation', metavar='N', dest='generations', type=int, action='append',
+		help='evaluate the champion of generation N of the history (may be given more than once, ' +
+		'default: the last generation)')
+	parser.add_argument('--track', metavar='TRACK', dest='tracks', action='append',
+		help='a track description image or chunked track to evaluate on (may be given more than once, ' +
+		'default: assets/track.png)')
+	parser.add_argument('--repeat', metavar='N', type=int, default=1,
+		help='simulate every evaluation N times and report the fastest, for stable timings (default: 1)')
+	parser.add_argument('--ray-angles', metavar='DEGREES', type=parse_ray_angle, nargs='+', default=RAY_ANGLES,
+		help='the angles of the sensor rays of the cars the champions were evolved with, relative to ' +
+		'their heading (default: -25 0 25)')
+	parser.add_argument('--heading-input', action='store_true',
+		help='also give the networks the heading to the next checkpoint as an input')
+	parser.add_argument('--render', action='store_true',
+		help='afterwards, show the champions driving on each track in the game window')
+	args = parser.parse_args()
+
+	champions = load_champions(args.genomes, args.history, args.generations)
+	if len(champions) == 0:
+		parser.error('no genomes to evaluate, give GENOME files or --history')
+	tracks = args.tracks if args.tracks is not None else ['assets/track.png']
+
+	config = DEFAULT_SIMULATION_CONFIG.with_changes(ray_angles=tuple(args.ray_angles),
+		checkpoint_heading_input=args.heading_input)
+	for name, genome in champions:
+		if genome.num_inputs != config.num_inputs():
+			parser.error(f'{name} has {genome.num_inputs} inputs, but the sensors give {config.num_inputs()}, ' +
+				'give the --ray-angles and --heading-input it was evolved with')
+	networks = [genome.as_neural_network() for _, genome in champions]
+	name_width = max(len(name) for name, _ in champions)
+
+	for track_filename in tracks:
+		# The track is compiled once, so the timings only measure the simulation
+		if is_chunked_track(track_filename):
+			chunked_track = ChunkedTrack(track_filename)
+			track = (chunked_track.start_pos, chunked_track, chunked_track.get_checkpoints())
+		else:
+			start_pos, walls, checkpoints = game_map.gen_map(track_filename)
+			track = (start_pos, compile_map(start_pos, walls, checkpoints), checkpoints)
+		print(f'Track {track_filename}:')
+
+		total_steps = 0
+		total_elapsed = 0
+		for (name, _), network in zip(champions, networks):
+			game, elapsed = benchmark_champion(network, track, config, args.repeat)
+			steps = round(game.time / config.timestep)
+			total_steps += steps
+			total_elapsed += elapsed
+
+			fitness = game.get_cars_fitness()[0]
+			best_lap_time = game.get_best_lap_time()
+			lap_report = f'Best lap: {best_lap_time:6.2f}s' if best_lap_time is not None else 'Best lap:      -'
+			print(f'  {name:{name_width}} Fitness: {fitness:7.2f} Laps: {game.laps[0]} {lap_report} ' +
+				f'Steps: {steps:5} Steps/sec: {steps/elapsed:8.1f}')
+
+		print(f'  Simulated {total_steps} steps in {total_elapsed:.2f}s ({total_steps/total_elapsed:.1f} steps/sec)')
+
+		if args.render:
+			render_champions(networks, track, config)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,272 @@
+import os
+import math
+import struct
+import hashlib
+import argparse
+from array import array
+from collections import OrderedDict
+
+import game_map
+from compiled_map import CompiledMap, compile_map
+
+CHUNKED_TRACK_MAGIC = b'CHNKTRAK'
+CHUNKED_TRACK_VERSION = 2
+
+# The header of a chunked track file: the magic bytes, the format version, the number of tiles along
+# a side of a chunk, the number of chunk columns and rows, the total number of walls, the number of
+# checkpoints, the offset of the tables at the end of the file, the start position, the margin by
+# which walls may stick out of their chunk, and the content key of the track
+CHUNKED_TRACK_HEADER = struct.Struct('=8sIIIIqqqddd16s')
+
+# The number of map tiles along a side of a square chunk
+CHUNK_TILES = 32
+# The default number of chunks a track keeps loaded. The chunks are loaded on demand, wherever the
+# cars and the camera look up walls, and the least recently used chunk is unloaded when it is full
+CHUNK_CACHE_CAPACITY = 64
+
+# Walls are numbered by their chunk in the high bits and their index in the chunk in the low bits
+CHUNK_WALL_BITS = 32
+CHUNK_WALL_MASK = (1 << CHUNK_WALL_BITS) - 1
+
+class ChunkedTrack:
+	"""
+	A track split into square chunks of `CHUNK_TILES` tiles, stored in a file. Each chunk is a
+	`CompiledMap` of the walls of its tiles, with its own spatial index, and only the chunks which are
+	looked at are loaded, so the memory used and the cost of a lookup don't grow with the size of the
+	track. A chunked track can be used anywhere a `CompiledMap` is expected.
+	"""
+
+	def __init__(self, filename, capacity=CHUNK_CACHE_CAPACITY):
+		self.filename = filename
+		self.capacity = capacity
+		self.track_file = open(filename, 'rb')
+
+		(magic, version, self.chunk_tiles, self.chunk_cols, self.chunk_rows, self.num_walls,
+			num_checkpoints, tables_offset, start_x, start_y, self.margin,
+			self.content_key) = CHUNKED_TRACK_HEADER.unpack(self.track_file.read(CHUNKED_TRACK_HEADER.size))
+		if magic != CHUNKED_TRACK_MAGIC or version != CHUNKED_TRACK_VERSION:
+			raise ValueError(f'{filename} is not a chunked track')
+		self.start_pos = (start_x, start_y)
+		self.chunk_size = self.chunk_tiles * game_map.GRID_SIZE
+
+		self.track_file.seek(tables_offset)
+		# Each checkpoint is 2 doubles, its `(x, y)`
+		self.checkpoint_coords = array('d')
+		self.checkpoint_coords.fromfile(self.track_file, 2*num_checkpoints)
+		# Each chunk is 2 entries, the offset and length of its compiled map in the file, where the
+		# chunks are ordered row by row. Chunks without walls have a length of 0
+		self.chunk_table = array('q')
+		self.chunk_table.fromfile(self.track_file, 2*self.chunk_cols*self.chunk_rows)
+
+		# The loaded chunks by their index, in least to most recently used order
+		self.chunks = OrderedDict()
+		self.loads = 0
+		self.wall_sqr_half_side = ChunkedWallSides(self)
+
+	def __len__(self):
+		return self.num_walls
+
+	def __reduce__(self):
+		# Other processes open the file themselves, so only the filename is sent to them
+		return (ChunkedTrack, (self.filename, self.capacity))
+
+	def get_checkpoints(self):
+		"""
+		Returns the list of the `(x, y)` positions of the checkpoints
+		"""
+
+		coords = self.checkpoint_coords
+		return [(coords[i], coords[i+1]) for i in range(0, len(coords), 2)]
+
+	def get_chunk(self, chunk_idx):
+		"""
+		Returns the `CompiledMap` of the chunk at index `chunk_idx`, loading it if it isn't loaded
+		"""
+
+		chunk = self.chunks.get(chunk_idx)
+		if chunk is not None:
+			self.chunks.move_to_end(chunk_idx)
+			return chunk
+
+		offset, length = self.chunk_table[2*chunk_idx], self.chunk_table[2*chunk_idx + 1]
+		# Forked processes share the position of the file, so the chunk is read without moving it
+		chunk = CompiledMap(bytearray(os.pread(self.track_file.fileno(), length, offset)))
+		self.loads += 1
+
+		self.chunks[chunk_idx] = chunk
+		if len(self.chunks) > self.capacity:
+			self.chunks.popitem(last=False)
+		return chunk
+
+	def get_wall_rect(self, wall_idx):
+		"""
+		Returns the wall at index `wall_idx` as a tuple of its 4 `(x, y)` vertices
+		"""
+
+		return self.get_chunk(wall_idx >> CHUNK_WALL_BITS).get_wall_rect(wall_idx & CHUNK_WALL_MASK)
+
+	def get_walls_in_box(self, min_x, min_y, max_x, max_y):
+		"""
+		Returns a sorted list of the indices of the walls which may overlap the axis-aligned box
+		`(min_x, min_y, max_x, max_y)`. Every wall which does overlap the box is in the list.
+		"""
+
+		# Walls may stick out of their chunk by up to the margin, so the chunks just outside of the box
+		# are looked at as well
+		first_col = max(math.floor((min_x - self.margin) / self.chunk_size), 0)
+		last_col = min(math.floor((max_x + self.margin) / self.chunk_size), self.chunk_cols - 1)
+		first_row = max(math.floor((min_y - self.margin) / self.chunk_size), 0)
+		last_row = min(math.floor((max_y + self.margin) / self.chunk_size), self.chunk_rows - 1)
+
+		# The chunks are visited in index order, so the wall indices come out sorted
+		wall_indices = []
+		for row in range(first_row, last_row + 1):
+			for col in range(first_col, last_col + 1):
+				chunk_idx = row*self.chunk_cols + col
+				if self.chunk_table[2*chunk_idx + 1] == 0:
+					continue
+				chunk_walls = self.get_chunk(chunk_idx).get_walls_in_box(min_x, min_y, max_x, max_y)
+				base = chunk_idx << CHUNK_WALL_BITS
+				wall_indices.extend(base | wall_idx for wall_idx in chunk_walls)
+		return wall_indices
+
+	def get_wall_indices(self):
+		"""
+		Returns the indices of all the walls. Every chunk is loaded in turn to list its walls.
+		"""
+
+		wall_indices = []
+		for chunk_idx in range(self.chunk_cols*self.chunk_rows):
+			if self.chunk_table[2*chunk_idx + 1] == 0:
+				continue
+			base = chunk_idx << CHUNK_WALL_BITS
+			wall_indices.extend(base | wall_idx for wall_idx in self.get_chunk(chunk_idx).get_wall_indices())
+		return wall_indices
+
+	def get_content_key(self):
+		"""
+		Returns a digest of the track, tracks with the same content key are identical. The digest is
+		computed when the track is built, so it doesn't cost a read of the whole track.
+		"""
+
+		return self.content_key
+
+	def close(self):
+		self.chunks.clear()
+		self.track_file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+class ChunkedWallSides:
+	"""
+	Looks up the `wall_sqr_half_side` of a wall of a `ChunkedTrack` by its index, the same way as in
+	a `CompiledMap`
+	"""
+
+	def __init__(self, track):
+		self.track = track
+
+	def __getitem__(self, wall_idx):
+		chunk = self.track.get_chunk(wall_idx >> CHUNK_WALL_BITS)
+		return chunk.wall_sqr_half_side[wall_idx & CHUNK_WALL_MASK]
+
+def build_chunked_track(map_description_filename, filename, chunk_tiles=CHUNK_TILES):
+	"""
+	Converts the map description image at `map_description_filename` into a chunked track file at
+	`filename`, with chunks of `chunk_tiles` tiles. The image is read one band of chunks at a time,
+	so only the walls of a single band are ever held in memory. Returns the number of walls.
+	"""
+
+	width, height, rows = game_map.read_track_rows(map_description_filename)
+	chunk_cols = max(math.ceil(width / chunk_tiles), 1)
+	chunk_rows = max(math.ceil(height / chunk_tiles), 1)
+	chunk_size = chunk_tiles * game_map.GRID_SIZE
+
+	start_pos = None
+	checkpoints = dict()
+	chunk_table = array('q')
+	num_walls = 0
+	margin = 0
+	# The content key is a digest of everything written to the file, other than itself
+	digest = hashlib.blake2b(digest_size=16)
+
+	with open(filename, 'wb') as track_file:
+		# The header is only written once the whole track has been read
+		track_file.write(bytes(CHUNKED_TRACK_HEADER.size))
+
+		for chunk_row in range(chunk_rows):
+			band_walls = [[] for _ in range(chunk_cols)]
+			first_y = chunk_row*chunk_tiles
+			for y in range(first_y, min(first_y + chunk_tiles, height)):
+				for x, color in enumerate(next(rows)):
+					if color == game_map.CAR_START_COLOR:
+						start_pos = game_map.get_tile_center(x, y)
+						checkpoints[0] = start_pos
+					elif color[:2] == game_map.CHECKPOINT_MARKER_COLOR:
+						checkpoints[color[2]] = game_map.get_tile_center(x, y)
+					else:
+						wall = game_map.get_tile_wall(x, y, color)
+						if wall is not None:
+							band_walls[x // chunk_tiles].append(wall)
+
+			for chunk_col, walls in enumerate(band_walls):
+				if len(walls) == 0:
+					chunk_table.extend((0, 0))
+					continue
+
+				# Diagonal walls stick out of their tile, and therefore maybe out of their chunk
+				chunk_min_x, chunk_min_y = chunk_col*chunk_size, chunk_row*chunk_size
+				for wall in walls:
+					for vert_x, vert_y in wall.verts:
+						margin = max(margin, chunk_min_x - vert_x, vert_x - (chunk_min_x + chunk_size),
+							chunk_min_y - vert_y, vert_y - (chunk_min_y + chunk_size))
+
+				compiled_chunk = compile_map((0, 0), walls, [])
+				chunk_table.extend((track_file.tell(), compiled_chunk.size))
+				track_file.write(compiled_chunk.buffer[:compiled_chunk.size])
+				digest.update(compiled_chunk.buffer[:compiled_chunk.size])
+				num_walls += len(walls)
+
+		ordered_checkpoints = [checkpoints[i] for i in range(len(checkpoints))]
+		tables_offset = track_file.tell()
+		checkpoint_coords = array('d', (coord for checkpoint in ordered_checkpoints for coord in checkpoint))
+		checkpoint_coords.tofile(track_file)
+		chunk_table.tofile(track_file)
+		digest.update(checkpoint_coords.tobytes())
+		digest.update(chunk_table.tobytes())
+
+		header_fields = (CHUNKED_TRACK_MAGIC, CHUNKED_TRACK_VERSION, chunk_tiles, chunk_cols, chunk_rows, num_walls,
+			len(ordered_checkpoints), tables_offset, start_pos[0], start_pos[1], margin)
+		digest.update(CHUNKED_TRACK_HEADER.pack(*header_fields, bytes(digest.digest_size)))
+		track_file.seek(0)
+		track_file.write(CHUNKED_TRACK_HEADER.pack(*header_fields, digest.digest()))
+
+	return num_walls
+
+def is_chunked_track(filename):
+	"""
+	Returns whether the file at `filename` is a chunked track, rather than a map description image
+	"""
+
+	with open(filename, 'rb') as track_file:
+		return track_file.read(len(CHUNKED_TRACK_MAGIC)) == CHUNKED_TRACK_MAGIC
+
+def main():
+	parser = argparse.ArgumentParser(description='Converts a track description image into a chunked track, ' +
+		'whose chunks are loaded on demand')
+	parser.add_argument('image', metavar='IMAGE', help='the track description image')
+	parser.add_argument('output', metavar='OUTPUT', help='the chunked track file to write')
+	parser.add_argument('--chunk-tiles', metavar='N', type=int, default=CHUNK_TILES,
+		help=f'the number of tiles along a side of a chunk (default: {CHUNK_TILES})')
+	args = parser.parse_args()
+
+	num_walls = build_chunked_track(args.image, args.output, args.chunk_tiles)
+	with ChunkedTrack(args.output) as track:
+		print(f'Wrote {num_walls} walls in {track.chunk_cols}x{track.chunk_rows} chunks to {args.output}')
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,231 @@
+import math
+import struct
+import hashlib
+from array import array
+from multiprocessing import shared_memory
+
+import game_map
+
+# The header of a compiled map: the number of walls, checkpoints, spatial index columns and rows and
+# spatial index entries, followed by the start position, the origin of the spatial index and the
+# size of its cells
+COMPILED_MAP_HEADER = struct.Struct('=qqqqqddddd')
+
+# The shared memory blocks this process attached to, by name. A block is attached at most once per
+# process, no matter how many times a map is sent to it
+attached_maps = dict()
+
+class CompiledMap:
+	"""
+	The geometry of a map compiled into flat arrays in a single buffer: the walls, the checkpoints,
+	and a grid which indexes the walls by the cells they overlap. Because the buffer has no pointers,
+	it can be published in shared memory, and other processes can use it in place without a copy.
+	A compiled map can be used anywhere a list of walls is expected.
+	"""
+
+	def __init__(self, buffer, shared_block=None):
+		# The `SharedMemory` the buffer belongs to, if it was published or attached
+		self.shared_block = shared_block
+		# Every process which uses the map sees the same shared memory, so the map only reads it. It is
+		# only written once, when it is published
+		if shared_block is not None:
+			buffer = memoryview(buffer).toreadonly()
+		self.buffer = buffer
+
+		(self.num_walls, num_checkpoints, self.grid_cols, self.grid_rows, num_cell_entries, start_x,
+			start_y, self.grid_origin_x, self.grid_origin_y, self.cell_size) = COMPILED_MAP_HEADER.unpack_from(buffer)
+		self.start_pos = (start_x, start_y)
+
+		# The arrays are views into the buffer, in the order they are laid out in it
+		view = memoryview(buffer)
+		offset = COMPILED_MAP_HEADER.size
+		def take(typecode, count):
+			nonlocal offset
+			size = count * array(typecode).itemsize
+			typed_view = view[offset:offset + size].cast(typecode)
+			offset += size
+			return typed_view
+
+		# Each wall is 8 doubles: the `(x, y)` of each of its 4 vertices
+		self.wall_verts = take('d', 8*self.num_walls)
+		# Half of the longest side of each wall, squared, used to bound the distance to the wall
+		self.wall_sqr_half_side = take('d', self.num_walls)
+		# Each checkpoint is 2 doubles, its `(x, y)`
+		self.checkpoint_coords = take('d', 2*num_checkpoints)
+		# The walls which overlap cell `i` are `cell_walls[cell_starts[i]:cell_starts[i+1]]`, where
+		# the cells are ordered row by row
+		self.cell_starts = take('q', self.grid_cols*self.grid_rows + 1)
+		self.cell_walls = take('q', num_cell_entries)
+		# The size of the compiled map, the buffer may be larger (e.g. shared memory is page-aligned)
+		self.size = offset
+		# The content key is computed the first time it is needed, see `get_content_key`
+		self.content_key = None
+
+	def __len__(self):
+		return self.num_walls
+
+	def __reduce__(self):
+		# A published map is sent to other processes by name, and they attach to it instead of copying
+		if self.shared_block is not None:
+			return (attach_map, (self.shared_block.name,))
+		return (CompiledMap, (bytes(self.buffer[:self.size]),))
+
+	def get_checkpoints(self):
+		"""
+		Returns the list of the `(x, y)` positions of the checkpoints
+		"""
+
+		coords = self.checkpoint_coords
+		return [(coords[i], coords[i+1]) for i in range(0, len(coords), 2)]
+
+	def get_wall_rect(self, wall_idx):
+		"""
+		Returns the wall at index `wall_idx` as a tuple of its 4 `(x, y)` vertices
+		"""
+
+		v = self.wall_verts[8*wall_idx:8*wall_idx + 8]
+		return ((v[0], v[1]), (v[2], v[3]), (v[4], v[5]), (v[6], v[7]))
+
+	def get_wall_indices(self):
+		"""
+		Returns the indices of all the walls
+		"""
+
+		return range(self.num_walls)
+
+	def get_walls_in_box(self, min_x, min_y, max_x, max_y):
+		"""
+		Returns a sorted list of the indices of the walls which may overlap the axis-aligned box
+		`(min_x, min_y, max_x, max_y)`. Every wall which does overlap the box is in the list.
+		"""
+
+		first_col, first_row = self.get_cell(min_x, min_y)
+		last_col, last_row = self.get_cell(max_x, max_y)
+
+		wall_indices = set()
+		for row in range(first_row, last_row + 1):
+			for col in range(first_col, last_col + 1):
+				cell = row*self.grid_cols + col
+				wall_indices.update(self.cell_walls[self.cell_starts[cell]:self.cell_starts[cell + 1]])
+		return sorted(wall_indices)
+
+	def get_cell(self, x, y):
+		"""
+		Returns the `(column, row)` of the spatial index cell containing `(x, y)`. Points outside of
+		the grid are clamped to the nearest cell.
+		"""
+
+		col = math.floor((x - self.grid_origin_x) / self.cell_size)
+		row = math.floor((y - self.grid_origin_y) / self.cell_size)
+		return (min(max(col, 0), self.grid_cols - 1), min(max(row, 0), self.grid_rows - 1))
+
+	def get_content_key(self):
+		"""
+		Returns a digest of the compiled map, maps with the same content key are identical. A map is
+		never modified, so the digest is only computed once.
+		"""
+
+		if self.content_key is None:
+			self.content_key = hashlib.blake2b(self.buffer[:self.size], digest_size=16).digest()
+		return self.content_key
+
+	def close(self):
+		"""
+		Releases this process' access to the shared memory the map is in, if any
+		"""
+
+		if self.shared_block is not None and self.buffer is not None:
+			# The views into the buffer must be released before the shared memory can be closed
+			for typed_view in (self.wall_verts, self.wall_sqr_half_side, self.checkpoint_coords,
+				self.cell_starts, self.cell_walls):
+				typed_view.release()
+			self.buffer.release()
+			self.buffer = None
+			self.shared_block.close()
+
+	def unlink(self):
+		"""
+		Frees the shared memory the map was published in. Only the process which published the map
+		should unlink it, once no other process uses it anymore.
+		"""
+
+		shared_block = self.shared_block
+		attached_maps.pop(shared_block.name, None)
+		self.close()
+		shared_block.unlink()
+
+def compile_map(start_pos, walls, checkpoints, cell_size=game_map.GRID_SIZE):
+	"""
+	Compiles the map made of `start_pos`, the list of `Rectangle` walls `walls` and the list of
+	checkpoints `checkpoints` into a `CompiledMap`. The walls are indexed in a grid of square cells of
+	size `cell_size`.
+	"""
+
+	wall_verts = array('d', (coord for wall in walls for vert in wall.verts for coord in vert))
+	wall_sqr_half_side = array('d', (wall.sqr_half_side for wall in walls))
+	checkpoint_coords = array('d', (coord for checkpoint in checkpoints for coord in checkpoint))
+
+	# The grid covers the bounding box of all the walls
+	if len(walls) > 0:
+		origin_x = min(wall_verts[0::2])
+		origin_y = min(wall_verts[1::2])
+		grid_cols = math.floor((max(wall_verts[0::2]) - origin_x) / cell_size) + 1
+		grid_rows = math.floor((max(wall_verts[1::2]) - origin_y) / cell_size) + 1
+	else:
+		origin_x, origin_y, grid_cols, grid_rows = 0, 0, 1, 1
+
+	# Each wall is added to every cell its bounding box overlaps
+	cells = [[] for _ in range(grid_cols*grid_rows)]
+	for wall_idx, wall in enumerate(walls):
+		xs = [vert[0] for vert in wall.verts]
+		ys = [vert[1] for vert in wall.verts]
+		first_col = math.floor((min(xs) - origin_x) / cell_size)
+		last_col = math.floor((max(xs) - origin_x) / cell_size)
+		first_row = math.floor((min(ys) - origin_y) / cell_size)
+		last_row = math.floor((max(ys) - origin_y) / cell_size)
+		for row in range(first_row, last_row + 1):
+			for col in range(first_col, last_col + 1):
+				cells[row*grid_cols + col].append(wall_idx)
+
+	cell_starts = array('q', [0])
+	cell_walls = array('q')
+	for cell in cells:
+		cell_walls.extend(cell)
+		cell_starts.append(len(cell_walls))
+
+	header = COMPILED_MAP_HEADER.pack(len(walls), len(checkpoints), grid_cols, grid_rows, len(cell_walls),
+		start_pos[0], start_pos[1], origin_x, origin_y, cell_size)
+	buffer = bytearray(header)
+	for typed_array in (wall_verts, wall_sqr_half_side, checkpoint_coords, cell_starts, cell_walls):
+		buffer += typed_array.tobytes()
+	return CompiledMap(buffer)
+
+def publish_map(compiled_map):
+	"""
+	Copies `compiled_map` into a new block of shared memory, and returns the published map. Worker
+	processes which receive the published map attach to the shared memory instead of copying it.
+	The publishing process should `unlink` the map once it is done with it.
+	"""
+
+	shared_block = shared_memory.SharedMemory(create=True, size=compiled_map.size)
+	shared_block.buf[:compiled_map.size] = compiled_map.buffer[:compiled_map.size]
+	published_map = CompiledMap(shared_block.buf, shared_block)
+	published_map.content_key = compiled_map.content_key
+	# Forked worker processes inherit the mapping of the shared memory, so they don't even need to
+	# attach to it
+	attached_maps[shared_block.name] = published_map
+	return published_map
+
+def attach_map(name):
+	"""
+	Attaches to the map published in the shared memory block `name`, without copying it
+	"""
+
+	compiled_map = attached_maps.get(name)
+	if compiled_map is None:
+		# Worker processes share the resource tracker of the process which started them, so attaching
+		# doesn't make the shared memory outlive the publishing process
+		shared_block = shared_memory.SharedMemory(name=name)
+		compiled_map = CompiledMap(shared_block.buf, shared_block)
+		attached_maps[name] = compiled_map
+	return compiled_map
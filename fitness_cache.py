@@ -0,0 +1,113 @@
+import hashlib
+from collections import OrderedDict
+
+from compiled_map import CompiledMap
+from chunked_track import ChunkedTrack
+from simulation import evaluate_networks
+from simulation_config import DEFAULT_SIMULATION_CONFIG
+
+# The default number of fitness scores a cache remembers
+FITNESS_CACHE_CAPACITY = 10000
+
+class FitnessCache:
+	"""
+	Remembers the fitness of networks which were already simulated, so the carried-over champions
+	and the offspring which came out identical to their parents don't need to be simulated again. A
+	fitness is keyed by the genome's network key and by the context it was measured in: the map and
+	the simulation config. When the cache is full, the least recently used fitness is evicted.
+	"""
+
+	def __init__(self, capacity=FITNESS_CACHE_CAPACITY):
+		self.capacity = capacity
+		self.entries = OrderedDict()
+
+		self.hits = 0
+		self.misses = 0
+
+	def lookup(self, key):
+		"""
+		Returns the cached fitness of `key`, or None if it is not cached
+		"""
+
+		fitness = self.entries.get(key)
+		if fitness is None:
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		self.entries.move_to_end(key)
+		return fitness
+
+	def store(self, key, fitness):
+		"""
+		Caches `fitness` as the fitness of `key`, evicting the least recently used fitness if the cache
+		is full
+		"""
+
+		self.entries[key] = fitness
+		self.entries.move_to_end(key)
+		if len(self.entries) > self.capacity:
+			self.entries.popitem(last=False)
+
+	def hit_rate(self):
+		"""
+		Returns the fraction of lookups which were cache hits
+		"""
+
+		lookups = self.hits + self.misses
+		return self.hits / lookups if lookups > 0 else 0
+
+	def __len__(self):
+		return len(self.entries)
+
+def get_context_key(start_pos, walls, checkpoints, config=DEFAULT_SIMULATION_CONFIG, trial_seed=None,
+	evaluate=evaluate_networks):
+	"""
+	Returns a digest of everything other than the network which determines a simulated fitness: the
+	map, the `SimulationConfig` `config`, if the config has randomized trials `trial_seed`, and the
+	function `evaluate` which measures the fitness
+	"""
+
+	digest = hashlib.blake2b(digest_size=16)
+	digest.update(evaluate.__name__.encode())
+	if isinstance(walls, (CompiledMap, ChunkedTrack)):
+		digest.update(walls.get_content_key())
+	else:
+		digest.update(repr([wall.verts for wall in walls]).encode())
+	digest.update(repr((start_pos, checkpoints, config)).encode())
+	if config.num_trials > 1:
+		digest.update(repr(trial_seed).encode())
+	return digest.digest()
+
+def evaluate_genomes(genomes, start_pos, walls, checkpoints, cache, config=DEFAULT_SIMULATION_CONFIG,
+	trial_seed=0, pool=None, evaluate=evaluate_networks):
+	"""
+	Returns the fitness of each genome in `genomes`, like `evaluate_networks`, but only the genomes
+	whose fitness is not in the `FitnessCache` `cache` are simulated. A network's fitness doesn't
+	depend on the other networks it is simulated with, so only simulating the uncached networks
+	gives the same fitness as simulating them all. The networks are simulated by
+	`evaluate`, which may also be another function with the same arguments, e.g. `evaluate_behaviors`.
+	"""
+
+	context_key = get_context_key(start_pos, walls, checkpoints, config, trial_seed, evaluate)
+	keys = [(genome.get_network_key(), context_key) for genome in genomes]
+
+	fitness = [cache.lookup(key) for key in keys]
+	# Identical networks in this batch only need to be simulated once
+	uncached = dict()
+	for genome, key, cached_fitness in zip(genomes, keys, fitness):
+		if cached_fitness is None and key not in uncached:
+			uncached[key] = genome
+
+	if len(uncached) > 0:
+		networks = [genome.as_neural_network() for genome in uncached.values()]
+		simulated_fitness = dict(zip(uncached,
+			evaluate(networks, start_pos, walls, checkpoints, config, trial_seed, pool)))
+		for key, network_fitness in simulated_fitness.items():
+			cache.store(key, network_fitness)
+
+		for i, key in enumerate(keys):
+			if fitness[i] is None:
+				fitness[i] = simulated_fitness[key]
+
+	return fitness
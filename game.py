@@ -1,52 +1,133 @@
-import pygame
-from car import Car, MAX_VELOCITY
+import math
+from dataclasses import dataclass
+from car import Car
 from math_utils import Vector
-from intersections import rect_rect_intersection, ray_rect_intersection
+from intersections import rect_rect_intersection, ray_rect_intersection, ray_fan_rects_distances
+from simulation_config import DEFAULT_SIMULATION_CONFIG
+from compiled_map import CompiledMap, compile_map
+from chunked_track import ChunkedTrack
 import game_map
 
-CAR_ACCELERATION = 300
-CAR_ROTATION_SPEED = 0.07
-MAX_RAY_LENGTH = 220
+@dataclass
+class CarStart:
+	"""
+	The initial state of a car: its position, its direction (in radians), and the index of the
+	checkpoint it starts at
+	"""
+
+	x: float
+	y: float
+	direction: float = 0
+	checkpoint: int = 0
 
 class Game:
 	"""
 	Represents a game simulation
 	"""
 
-	def __init__(self, num_cars, start_pos, walls, checkpoints):
+	def __init__(self, num_cars, start_pos, walls, checkpoints, config=DEFAULT_SIMULATION_CONFIG,
+		car_starts=None, recorder=None):
+		"""
+		Constructs a game with `num_cars` cars. By default all cars start at `start_pos` facing
+		direction 0, otherwise `car_starts` is a list with the `CarStart` of each car. `walls` is
+		either a list of `Rectangle`s, a `CompiledMap` or a `ChunkedTrack`. If a `TrajectoryRecorder` `recorder` is
+		supplied, every update is recorded to it.
+		"""
+
 		self.camera_position = Vector(0, 0)
 
+		# The physical parameters of the simulation are taken from the `SimulationConfig` `config`
+		self.config = config
+
+		# The walls are looked up through the spatial index of a compiled map, so a car only needs to be
+		# checked against the walls around it
+		if not isinstance(walls, (CompiledMap, ChunkedTrack)):
+			walls = compile_map(start_pos, walls, checkpoints)
 		self.walls = walls
 		self.checkpoints = [Vector.from_tuple(x) for x in checkpoints]
 
-		start_pos_x, start_pos_y = start_pos
-		self.cars = [Car(start_pos_x, start_pos_y) for _ in range(num_cars)]
+		# The distance along the track from the first checkpoint to each checkpoint, and the length of
+		# a full lap, which includes the closing segment from the last checkpoint back to the first
+		self.checkpoint_acc = [0]*len(self.checkpoints)
+		for i in range(1, len(self.checkpoints)):
+			self.checkpoint_acc[i] = self.checkpoint_acc[i-1]
+			self.checkpoint_acc[i] += (self.checkpoints[i] - self.checkpoints[i-1]).magnitude()
+		self.lap_length = self.checkpoint_acc[-1] + (self.checkpoints[0] - self.checkpoints[-1]).magnitude()
+
+		# The game clock (in seconds), which is used to time laps
+		self.time = 0
+
+		if car_starts is None:
+			start_pos_x, start_pos_y = start_pos
+			car_starts = [CarStart(start_pos_x, start_pos_y)]*num_cars
+		self.car_starts = car_starts
+
+		self.cars = [None]*num_cars
 		self.reached_checkpoint = [0]*num_cars
 		self.dead = [False]*num_cars
 
+		# The number of laps each car completed, the duration of each of its completed laps, and the
+		# time its current lap started at
+		self.laps = [0]*num_cars
+		self.lap_times = [None]*num_cars
+		self.lap_start_time = [0]*num_cars
+		# The time it took each car to reach the lap target, or None if it didn't reach it. Cars which
+		# reached the lap target are retired: they are marked as dead, but keep their fitness
+		self.finish_time = [None]*num_cars
+		# The positions of each car sampled along its trajectory, which describe its behavior. The
+		# samples are taken at the same times for all the cars
+		self.behavior_samples = [None]*num_cars
+		self.next_behavior_sample_time = config.behavior_sample_interval
+		for car_idx in range(num_cars):
+			self.respawn_car(car_idx)
+
 		self.tracked_car = 0
+		self.recorder = recorder
+
+	def respawn_car(self, car_idx):
+		"""
+		Places a new car at the start of the car at index `car_idx`, which lets a slot be reused by
+		another driver while the rest of the cars keep going
+		"""
+
+		car_start = self.car_starts[car_idx]
+		car = Car(car_start.x, car_start.y, self.config)
+		car.direction = car_start.direction
+		self.cars[car_idx] = car
+		self.reached_checkpoint[car_idx] = car_start.checkpoint
+		self.dead[car_idx] = False
+		self.laps[car_idx] = 0
+		self.lap_times[car_idx] = []
+		self.lap_start_time[car_idx] = self.time
+		self.finish_time[car_idx] = None
+		self.behavior_samples[car_idx] = []
 
 	def update(self, delta_time, car_controls):
 		"""
 		Updates the physical game state given that `delta_time` seconds passed since the last call
 		to update. The inputs that control each car are represented by a dictionary, and those dicts
 		are ordered by car index in `car_controls`. An array is returned which holds info about each
-		car: [normalized_speed, normalized_ray_dist1, normalized_ray_dist2, normalized_ray_dist3]
+		car: its normalized speed, the normalized distance of each of its sensor rays, and if the config
+		asks for it, its normalized heading to the next checkpoint
 		"""
 
+		car_acceleration_step = self.config.car_acceleration
+		car_rotation_speed = self.config.car_rotation_speed
+		self.time += delta_time
+
 		for car_idx, car in enumerate(self.cars):
 			if self.dead[car_idx]: continue
 
 			car_acceleration = 0
 			if car_controls[car_idx]['forward']:
-				car_acceleration += CAR_ACCELERATION
+				car_acceleration += car_acceleration_step
 			if car_controls[car_idx]['backward']:
-				car_acceleration -= CAR_ACCELERATION
+				car_acceleration -= car_acceleration_step
 
 			if car_controls[car_idx]['left']:
-				car.direction += CAR_ROTATION_SPEED
+				car.direction += car_rotation_speed
 			if car_controls[car_idx]['right']:
-				car.direction -= CAR_ROTATION_SPEED
+				car.direction -= car_rotation_speed
 
 			car.set_move_acceleration(car_acceleration)
 			car.physics_update(delta_time)
@@ -54,10 +135,12 @@ class Game:
 			# This method is expensive, so we cache the result because we know the rotation of the car
 			# won't change
 			cached_car_rect = car.get_bounding_box()
+			car_xs = [vert[0] for vert in cached_car_rect]
+			car_ys = [vert[1] for vert in cached_car_rect]
 			is_intersecting = False
-			for wall in self.walls:
-				# For each wall, we check if the car's bounding box intersects the wall
-				if rect_rect_intersection(wall.verts, cached_car_rect):
+			for wall_idx in self.walls.get_walls_in_box(min(car_xs), min(car_ys), max(car_xs), max(car_ys)):
+				# For each wall near the car, we check if the car's bounding box intersects the wall
+				if rect_rect_intersection(self.walls.get_wall_rect(wall_idx), cached_car_rect):
 					is_intersecting = True
 					break
 			if is_intersecting:
@@ -74,77 +157,93 @@ class Game:
 				# reflect that the car reached a new checkpoint
 				self.reached_checkpoint[car_idx] = next_checkpoint_idx
 
+				# Reaching the checkpoint the car started at again completes a lap
+				if next_checkpoint_idx == self.car_starts[car_idx].checkpoint:
+					self.complete_lap(car_idx)
+
+		# We sample the positions of the cars along their trajectories, the last point of a behavior is
+		# always the final position, so it isn't sampled
+		if self.config.behavior_samples > 1 and self.time >= self.next_behavior_sample_time:
+			self.next_behavior_sample_time += self.config.behavior_sample_interval
+			for car_idx, car in enumerate(self.cars):
+				if len(self.behavior_samples[car_idx]) < self.config.behavior_samples - 1:
+					self.behavior_samples[car_idx].append(car.position.as_tuple())
+
 		# Update camera position to follow the tracked car
 		self.camera_position = self.cars[self.tracked_car].position
 
 		# We then generate the sensor info for each car for use as input to the neural networks
 		ray_dists = self.calc_ray_dists()
+		max_velocity = self.config.max_velocity
+		checkpoint_heading_input = self.config.checkpoint_heading_input
 		car_info = [None]*len(self.cars)
 		for i, car in enumerate(self.cars):
-			# This isn't the prettiest code, but combining lists is slow the idiomatic way
-			car_info[i] = [self.cars[i].velocity/MAX_VELOCITY, ray_dists[i][0], ray_dists[i][1], ray_dists[i][2]]
+			sensors = [car.velocity/max_velocity]
+			sensors += ray_dists[i]
+			if checkpoint_heading_input:
+				sensors.append(self.get_checkpoint_heading(i))
+			car_info[i] = sensors
+
+		if self.recorder is not None:
+			self.recorder.record_step(self, car_controls)
+
 		return car_info
 
+	def complete_lap(self, car_idx):
+		"""
+		Records a completed lap of the car at index `car_idx`, and retires the car if it reached the
+		lap target
+		"""
+
+		self.laps[car_idx] += 1
+		self.lap_times[car_idx].append(self.time - self.lap_start_time[car_idx])
+		self.lap_start_time[car_idx] = self.time
+
+		lap_target = self.config.lap_target
+		if lap_target > 0 and self.laps[car_idx] >= lap_target and not self.dead[car_idx]:
+			self.finish_time[car_idx] = sum(self.lap_times[car_idx])
+			self.dead[car_idx] = True
+
 	def calc_ray_dists(self):
 		"""
-		Calculates the hit distance for each sensor ray, for each car
+		Calculates the hit distance for each sensor ray, for each car. The rays of a car are cast as a
+		single batch: the walls in range of the car are only looked up once, for all of its rays.
 		"""
 
 		ray_dists = [None]*len(self.cars)
 
+		max_ray_length = self.config.max_ray_length
 		for i, car in enumerate(self.cars):
-			ray_dists[i] = [1]*3
-			for j, ray in enumerate(car.get_sight_rays()):
-				inter_point, ray_dist = self.raycast_against_walls(ray, MAX_RAY_LENGTH)
-				if inter_point is not None and ray_dist <= MAX_RAY_LENGTH:
-					ray_dists[i][j] = ray_dist / MAX_RAY_LENGTH
+			start_x, start_y = car.position.x, car.position.y
+			directions = car.get_ray_directions()
+			walls_in_range = self.get_walls_in_range(start_x, start_y, max_ray_length)
+			hit_dists = ray_fan_rects_distances((start_x, start_y), directions, walls_in_range)
+			ray_dists[i] = [ray_dist / max_ray_length if ray_dist is not None and ray_dist <= max_ray_length else 1
+				for ray_dist in hit_dists]
 
 		return ray_dists
 
-	def draw_scene(self, screen):
+	def get_checkpoint_heading(self, car_idx):
 		"""
-		Draws the game state on `screen`
+		Returns the angle between the heading of the car at index `car_idx` and the direction to the
+		next checkpoint, normalized from -1 to 1
 		"""
 
-		screen_mapping = self.get_screen_mapping(screen)
-
-		# We draw each checkpoint
-		for cp_idx, checkpoint in enumerate(self.checkpoints):
-			# If this checkpoint is the last checkpoint the tracked car reached, we mark it with a
-			# different color
-			if cp_idx == self.reached_checkpoint[self.tracked_car]:
-				circle_color = (221, 40, 0)
-			else:
-				circle_color = (0, 130, 224)
-			pygame.draw.circle(screen, circle_color, (checkpoint + screen_mapping).as_tuple(), 20)
-
+		car = self.cars[car_idx]
+		next_checkpoint = self.checkpoints[(self.reached_checkpoint[car_idx] + 1) % len(self.checkpoints)]
+		offset = next_checkpoint - car.position
+		# The y axis of the screen points down, while car directions are counter-clockwise
+		heading = math.atan2(-offset.y, offset.x) - car.direction
+		return (heading + math.pi) % (2*math.pi) / math.pi - 1
 
-		for car_idx, car in enumerate(self.cars):
-			if self.dead[car_idx]: continue
-
-			# We draw the sensor rays of each car
-			for ray in car.get_sight_rays():
-				start_pos = ray.start + screen_mapping
-				full_end_pos = ray.start + ray.direction*MAX_RAY_LENGTH + screen_mapping
-				pygame.draw.line(screen, (255, 0, 0), start_pos.as_tuple(), full_end_pos.as_tuple())
-
-				inter_point, ray_dist = self.raycast_against_walls(ray, MAX_RAY_LENGTH)
-				if inter_point is not None and ray_dist <= MAX_RAY_LENGTH:
-					end_pos = inter_point + screen_mapping
-					pygame.draw.line(screen, (0, 255, 0), start_pos.as_tuple(), end_pos.as_tuple(), 2)
-
-			# We draw the body of each car
-			car.draw(screen, screen_mapping)
+	def draw_scene(self, screen):
+		"""
+		Draws the game state on `screen`
+		"""
 
-		# We draw each wall. Because there are many walls, and this is expensive, we don't draw walls
-		# that are too far away to show up on screen
-		screen_rect = screen.get_rect()
-		cutoff_dist_sq = 2 * (screen_rect.width**2 + screen_rect.height**2)
-		for wall in self.walls:
-			mapped_wall = map_rect_to_screen(wall.verts, screen_mapping)
-			if mapped_wall[0][0]**2 + mapped_wall[0][1]**2 > cutoff_dist_sq:
-				continue
-			pygame.draw.polygon(screen, (160, 160, 160), mapped_wall)
+		# The rendering layer needs pygame, so it is only imported once something is drawn
+		import render
+		render.draw_scene(screen, self)
 
 	def raycast_against_walls(self, ray, max_ray_length=0):
 		# Raycasting against every wall (and therefore against every rect segment) is way too slow
@@ -152,29 +251,17 @@ class Game:
 		# prune away walls that we know we can't hit anyway, i.e. those that are too far away to
 		# hit. We can only use that optimization if we know the `max_ray_length`.
 
-		candidate_walls = []
 		if max_ray_length == 0:
-			candidate_walls = self.walls
+			candidate_walls = [self.walls.get_wall_rect(wall_idx) for wall_idx in self.walls.get_wall_indices()]
 		else:
-			for wall in self.walls:
-				# For each wall, we find the minimum distance to the ray start from the vertices
-				min_sqr_dist_lower_bound = None
-				for vert in wall.verts:
-					sqr_vert_dist = (Vector.from_tuple(vert) - ray.start).sqr_magnitude()
-					sqr_dist_lower_bound = sqr_vert_dist-wall.sqr_half_side
-					if min_sqr_dist_lower_bound is None or sqr_dist_lower_bound < min_sqr_dist_lower_bound:
-						min_sqr_dist_lower_bound = sqr_dist_lower_bound
-
-				# We then only consider walls that are below the threshold as candidates for hit detection
-				if min_sqr_dist_lower_bound < max_ray_length**2:
-					candidate_walls.append(wall)
+			candidate_walls = self.get_walls_in_range(ray.start.x, ray.start.y, max_ray_length)
 
 		# We go through each candidate wall, and calculate if an intersection exists between and the
 		# wall and ray, if it does, we update the hit point if it is closer to the ray start
 		closest_point = None
 		shortest_distance = None
 		for wall in candidate_walls:
-			inter_point, ray_dist = ray_rect_intersection(ray, wall.verts)
+			inter_point, ray_dist = ray_rect_intersection(ray, wall)
 			if ray_dist is not None:
 				if shortest_distance is None or ray_dist < shortest_distance:
 					closest_point = inter_point
@@ -182,6 +269,33 @@ class Game:
 
 		return (closest_point, shortest_distance)
 
+	def get_walls_in_range(self, start_x, start_y, max_ray_length):
+		"""
+		Returns the walls which a ray of length `max_ray_length` starting at `(start_x, start_y)` may hit,
+		in any direction. Each wall is a tuple of its 4 `(x, y)` vertices.
+		"""
+
+		# Only the walls in the cells around the ray start can be in range, so we don't even look at
+		# the rest
+		walls = self.walls
+		nearby_walls = walls.get_walls_in_box(start_x - max_ray_length, start_y - max_ray_length,
+			start_x + max_ray_length, start_y + max_ray_length)
+		walls_in_range = []
+		for wall_idx in nearby_walls:
+			# For each wall, we find the minimum distance to the ray start from the vertices
+			wall = walls.get_wall_rect(wall_idx)
+			sqr_half_side = walls.wall_sqr_half_side[wall_idx]
+			min_sqr_dist_lower_bound = None
+			for vert_x, vert_y in wall:
+				sqr_dist_lower_bound = (vert_x - start_x)**2 + (vert_y - start_y)**2 - sqr_half_side
+				if min_sqr_dist_lower_bound is None or sqr_dist_lower_bound < min_sqr_dist_lower_bound:
+					min_sqr_dist_lower_bound = sqr_dist_lower_bound
+
+			# We then only consider walls that are below the threshold as candidates for hit detection
+			if min_sqr_dist_lower_bound < max_ray_length**2:
+				walls_in_range.append(wall)
+		return walls_in_range
+
 	def get_screen_mapping(self, screen):
 		"""
 		Calculates a vector that when added to a point in game-space maps it to screen-space
@@ -201,19 +315,33 @@ class Game:
 		# measuring the exact distance is costly, we use a set of checkpoints along the track to
 		# estimate the total distance
 
-		# As an optimization, we calculate the accumulated distance after each checkpoint
-		checkpoint_acc = [0]*len(self.checkpoints)
-		for i in range(1, len(self.checkpoints)):
-			checkpoint_acc[i] = checkpoint_acc[i-1]
-			checkpoint_acc[i] += (self.checkpoints[i] - self.checkpoints[i-1]).magnitude()
+		# The accumulated distance after each checkpoint is calculated once, when the game is created
+		checkpoint_acc = self.checkpoint_acc
+		lap_length = self.lap_length
+
+		def distance_from_start(start_checkpoint, checkpoint):
+			# Cars measure their distance from the checkpoint they started at, so if a car started after
+			# the first checkpoint, the distance wraps around the end of the lap
+			distance = checkpoint_acc[checkpoint] - checkpoint_acc[start_checkpoint]
+			if distance < 0:
+				distance += lap_length
+			return distance
 
 		fitness = [0]*len(self.cars)
 		for i in range(len(self.cars)):
+			# A retired car covered exactly the laps of the lap target
+			if self.finish_time[i] is not None:
+				fitness[i] = self.laps[i] * lap_length
+				continue
+
 			# Because we reach a checkpoint whenever we get close enough to it, the `reached_checkpoint`
 			# list might actually contain the next checkpoint, if we are just before it, so we grab
 			# both the reached checkpoint and the one before it
 			reached_checkpoint = self.reached_checkpoint[i]
+			start_checkpoint = self.car_starts[i].checkpoint
 			prev_checkpoint = self.checkpoints[(reached_checkpoint - 1)%len(self.checkpoints)]
+			# Every completed lap adds the length of the whole lap
+			laps_distance = self.laps[i] * lap_length
 
 			# We calculate the distance between the car and the previous checkpoint
 			dist_to_prev = (prev_checkpoint - self.cars[i].position).magnitude()
@@ -224,36 +352,63 @@ class Game:
 			# If the distance to the previous checkpoint is less than the distance between the previous
 			# and current checkpoint, we didn't actually reach the checkpoint yet
 			if dist_to_prev < last_checkpoint_dist:
-				# If the car is before the first checkpoint, it drived backwards
-				if reached_checkpoint == 0:
-					fitness[i] = 0
-				else:
-					# The fitness is then the accumulated distance up to the previous checkpoint plus the
-					# distance the car covered since it passed that last checkpoint
-					fitness[i] = checkpoint_acc[(reached_checkpoint - 1)%len(self.checkpoints)] + dist_to_prev
+				if reached_checkpoint == start_checkpoint:
+					# If the car is before the checkpoint it started at and didn't complete a lap, it
+					# drived backwards. Otherwise, it is just about to finish the lap it already counted
+					if self.laps[i] == 0:
+						fitness[i] = 0
+						continue
+					laps_distance -= lap_length
+
+				# The fitness is then the accumulated distance up to the previous checkpoint plus the
+				# distance the car covered since it passed that last checkpoint
+				prev_checkpoint_idx = (reached_checkpoint - 1)%len(self.checkpoints)
+				fitness[i] = laps_distance + distance_from_start(start_checkpoint, prev_checkpoint_idx) + dist_to_prev
 			else:
 				# The fitness is then the accumulated distance up to the current checkpoint plus the
 				# distance the covered sicne it passed the current checkpoint
 				dist_to_reached = (self.checkpoints[reached_checkpoint] - self.cars[i].position).magnitude()
-				fitness[i] = checkpoint_acc[reached_checkpoint] + dist_to_reached
+				fitness[i] = laps_distance + distance_from_start(start_checkpoint, reached_checkpoint) + dist_to_reached
 
 		# Distance in pixels grows quite rapidly, so we multiply everything by 0.01 to get fitness
 		# scores in a saner range
 		for i in range(len(self.cars)):
 			fitness[i] *= 0.01
 
+		# Retired cars also get a bonus for finishing faster
+		for i in range(len(self.cars)):
+			if self.finish_time[i] is not None:
+				fitness[i] += self.config.finish_time_bonus / self.finish_time[i]
+
 		return fitness
 
+	def get_cars_behavior(self):
+		"""
+		Returns the behavior of each car: a tuple of the `(x, y)` coordinates of the car's positions
+		sampled along its trajectory, followed by its current position. If the game ended before all
+		the samples were taken, the missing samples are the current position too, because a car only
+		stops moving once it is dead.
+		"""
+
+		num_points = self.config.behavior_samples
+		behaviors = [None]*len(self.cars)
+		for i, car in enumerate(self.cars):
+			samples = self.behavior_samples[i]
+			points = samples + [car.position.as_tuple()]*(num_points - len(samples))
+			behaviors[i] = tuple(coord for point in points for coord in point)
+		return behaviors
+
+	def get_best_lap_time(self):
+		"""
+		Returns the fastest lap any car completed (in seconds), or None if no car completed a lap
+		"""
+
+		all_lap_times = [lap_time for car_lap_times in self.lap_times for lap_time in car_lap_times]
+		return min(all_lap_times) if len(all_lap_times) > 0 else None
+
 	def track_car(self, car_idx):
 		"""
 		Sets `car_idx` to be the car tracked by the camera
 		"""
 
 		self.tracked_car = car_idx
-
-def map_rect_to_screen(rect, screen_mapping):
-	"""
-	Helper function to adjust a rect's vertices based on a mapping
-	"""
-
-	return [(v[0] + screen_mapping.x, v[1] + screen_mapping.y) for v in rect]
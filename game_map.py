@@ -1,5 +1,5 @@
-import pygame
 from math_utils import Rectangle
+from png_reader import read_png_rows
 
 HORIZ_WALL_COLOR = (182, 255, 0)
 VERT_WALL_COLOR = (0, 127, 14)
@@ -19,68 +19,112 @@ def gen_map(map_description_filename):
 	Returns a tuple containing the track's starting point, a list of walls, and a list of checkpoints
 	"""
 
-	track = pygame.image.load(map_description_filename)
-	pxarray = pygame.PixelArray(track)
+	track_colors = read_track_colors(map_description_filename)
 
 	start_pos = None
 	checkpoints = dict()
 	walls = []
 
-	wall_width = GRID_SIZE*(1 - 2*WALL_INSERT)
-	diag_offset = wall_width/2
-
 	# We got through each pixel in the image, and based on its color we determine what it represents
-	for y in range(pxarray.shape[1]):
-		for x in range(pxarray.shape[0]):
-			color_at_px = track.unmap_rgb(pxarray[x, y])[:3]
+	for y, row_colors in enumerate(track_colors):
+		for x, color_at_px in enumerate(row_colors):
 			if color_at_px == CAR_START_COLOR:
-				start_pos = ((x+.5)*GRID_SIZE, (y+.5)*GRID_SIZE)
+				start_pos = get_tile_center(x, y)
 				checkpoints[0] = start_pos
-			elif color_at_px == HORIZ_WALL_COLOR:
-				walls.append(Rectangle(
-					(x*GRID_SIZE, (y+WALL_INSERT)*GRID_SIZE),
-					(x*GRID_SIZE, (y+1-WALL_INSERT)*GRID_SIZE),
-					((x+1)*GRID_SIZE, (y+1-WALL_INSERT)*GRID_SIZE),
-					((x+1)*GRID_SIZE, (y+WALL_INSERT)*GRID_SIZE)
-				))
-			elif color_at_px == VERT_WALL_COLOR:
-				walls.append(Rectangle(
-					((x+WALL_INSERT)*GRID_SIZE, y*GRID_SIZE),
-					((x+WALL_INSERT)*GRID_SIZE, (y+1)*GRID_SIZE),
-					((x+1-WALL_INSERT)*GRID_SIZE, (y+1)*GRID_SIZE),
-					((x+1-WALL_INSERT)*GRID_SIZE, y*GRID_SIZE)
-				))
-			elif color_at_px == UPPER_LEFT_WALL_COLOR:
-				walls.append(Rectangle(
-					((x+WALL_INSERT)*GRID_SIZE, (y+1)*GRID_SIZE),
-					((x+1)*GRID_SIZE, (y+WALL_INSERT)*GRID_SIZE),
-					((x+1)*GRID_SIZE + diag_offset, (y+WALL_INSERT)*GRID_SIZE + diag_offset),
-					((x+WALL_INSERT)*GRID_SIZE + diag_offset, (y+1)*GRID_SIZE + diag_offset)
-				))
-			elif color_at_px == UPPER_RIGHT_WALL_COLOR:
-				walls.append(Rectangle(
-					((x+1-WALL_INSERT)*GRID_SIZE, (y+1)*GRID_SIZE),
-					(x*GRID_SIZE, (y+WALL_INSERT)*GRID_SIZE),
-					(x*GRID_SIZE - diag_offset, (y+WALL_INSERT)*GRID_SIZE + diag_offset),
-					((x+1-WALL_INSERT)*GRID_SIZE - diag_offset, (y+1)*GRID_SIZE + diag_offset)
-				))
-			elif color_at_px == LOWER_RIGHT_WALL_COLOR:
-				walls.append(Rectangle(
-					((x+1-WALL_INSERT)*GRID_SIZE, y*GRID_SIZE),
-					(x*GRID_SIZE, (y+1-WALL_INSERT)*GRID_SIZE),
-					(x*GRID_SIZE - diag_offset, (y+1-WALL_INSERT)*GRID_SIZE - diag_offset),
-					((x+1-WALL_INSERT)*GRID_SIZE - diag_offset, y*GRID_SIZE - diag_offset)
-				))
-			elif color_at_px == LOWER_LEFT_WALL_COLOR:
-				walls.append(Rectangle(
-					((x+WALL_INSERT)*GRID_SIZE, y*GRID_SIZE),
-					((x+1)*GRID_SIZE, (y+1-WALL_INSERT)*GRID_SIZE),
-					((x+1)*GRID_SIZE + diag_offset, (y+1-WALL_INSERT)*GRID_SIZE - diag_offset),
-					((x+WALL_INSERT)*GRID_SIZE + diag_offset, y*GRID_SIZE - diag_offset),
-				))
 			elif color_at_px[:2] == CHECKPOINT_MARKER_COLOR:
-				checkpoints[color_at_px[2]] = (((x+.5)*GRID_SIZE, (y+.5)*GRID_SIZE))
+				checkpoints[color_at_px[2]] = get_tile_center(x, y)
+			else:
+				wall = get_tile_wall(x, y, color_at_px)
+				if wall is not None:
+					walls.append(wall)
 
 	ordered_checkpoints = [checkpoints[i] for i in range(len(checkpoints))]
 
 	return (start_pos, walls, ordered_checkpoints)
+
+def get_tile_center(x, y):
+	"""
+	Returns the position of the center of the tile at column `x` and row `y` of the map
+	"""
+
+	return ((x+.5)*GRID_SIZE, (y+.5)*GRID_SIZE)
+
+def get_tile_wall(x, y, color):
+	"""
+	Returns the `Rectangle` wall of the tile at column `x` and row `y` of the map, which is
+	described by the pixel color `color`, or None if the tile has no wall
+	"""
+
+	wall_width = GRID_SIZE*(1 - 2*WALL_INSERT)
+	diag_offset = wall_width/2
+
+	if color == HORIZ_WALL_COLOR:
+		return Rectangle(
+			(x*GRID_SIZE, (y+WALL_INSERT)*GRID_SIZE),
+			(x*GRID_SIZE, (y+1-WALL_INSERT)*GRID_SIZE),
+			((x+1)*GRID_SIZE, (y+1-WALL_INSERT)*GRID_SIZE),
+			((x+1)*GRID_SIZE, (y+WALL_INSERT)*GRID_SIZE)
+		)
+	elif color == VERT_WALL_COLOR:
+		return Rectangle(
+			((x+WALL_INSERT)*GRID_SIZE, y*GRID_SIZE),
+			((x+WALL_INSERT)*GRID_SIZE, (y+1)*GRID_SIZE),
+			((x+1-WALL_INSERT)*GRID_SIZE, (y+1)*GRID_SIZE),
+			((x+1-WALL_INSERT)*GRID_SIZE, y*GRID_SIZE)
+		)
+	elif color == UPPER_LEFT_WALL_COLOR:
+		return Rectangle(
+			((x+WALL_INSERT)*GRID_SIZE, (y+1)*GRID_SIZE),
+			((x+1)*GRID_SIZE, (y+WALL_INSERT)*GRID_SIZE),
+			((x+1)*GRID_SIZE + diag_offset, (y+WALL_INSERT)*GRID_SIZE + diag_offset),
+			((x+WALL_INSERT)*GRID_SIZE + diag_offset, (y+1)*GRID_SIZE + diag_offset)
+		)
+	elif color == UPPER_RIGHT_WALL_COLOR:
+		return Rectangle(
+			((x+1-WALL_INSERT)*GRID_SIZE, (y+1)*GRID_SIZE),
+			(x*GRID_SIZE, (y+WALL_INSERT)*GRID_SIZE),
+			(x*GRID_SIZE - diag_offset, (y+WALL_INSERT)*GRID_SIZE + diag_offset),
+			((x+1-WALL_INSERT)*GRID_SIZE - diag_offset, (y+1)*GRID_SIZE + diag_offset)
+		)
+	elif color == LOWER_RIGHT_WALL_COLOR:
+		return Rectangle(
+			((x+1-WALL_INSERT)*GRID_SIZE, y*GRID_SIZE),
+			(x*GRID_SIZE, (y+1-WALL_INSERT)*GRID_SIZE),
+			(x*GRID_SIZE - diag_offset, (y+1-WALL_INSERT)*GRID_SIZE - diag_offset),
+			((x+1-WALL_INSERT)*GRID_SIZE - diag_offset, y*GRID_SIZE - diag_offset)
+		)
+	elif color == LOWER_LEFT_WALL_COLOR:
+		return Rectangle(
+			((x+WALL_INSERT)*GRID_SIZE, y*GRID_SIZE),
+			((x+1)*GRID_SIZE, (y+1-WALL_INSERT)*GRID_SIZE),
+			((x+1)*GRID_SIZE + diag_offset, (y+1-WALL_INSERT)*GRID_SIZE - diag_offset),
+			((x+WALL_INSERT)*GRID_SIZE + diag_offset, y*GRID_SIZE - diag_offset),
+		)
+	return None
+
+def read_track_colors(map_description_filename):
+	"""
+	Returns the rows of `(r, g, b)` pixel colors of the map description image at
+	`map_description_filename`. The image is decoded without pygame, so headless processes don't need
+	to load it, unless the image uses a format only pygame can read.
+	"""
+
+	_, _, rows = read_track_rows(map_description_filename)
+	return rows
+
+def read_track_rows(map_description_filename):
+	"""
+	Returns a tuple of the width and height of the map description image at
+	`map_description_filename` and an iterator over its rows of `(r, g, b)` pixel colors. Unless the
+	image has to be loaded by pygame, the rows are decoded one at a time as they are iterated over.
+	"""
+
+	try:
+		return read_png_rows(map_description_filename)
+	except ValueError:
+		import pygame
+		track = pygame.image.load(map_description_filename)
+		pxarray = pygame.PixelArray(track)
+		width, height = pxarray.shape
+		return (width, height, ([track.unmap_rgb(pxarray[x, y])[:3] for x in range(width)]
+			for y in range(height)))
@@ -34,6 +34,46 @@ def ray_rect_intersection(ray, rect):
 		return (None, None)
 
 
+def ray_fan_rects_distances(start, directions, rects):
+	"""
+	Finds the distance to the closest rectangle along each ray of a fan of rays which all start at
+	the same point.
+
+	Returns a list with the distance along each ray, or None if the ray hits no rectangle. `start` is
+	the `(x, y)` start of the rays, `directions` is a list of the `(x, y)` unit direction of each ray,
+	and `rects` is a list of rectangles, each a tuple of 4 `(x, y)` points. The result is the same as
+	that of `ray_rect_intersection` for every ray and rectangle, but the parts of the calculation
+	which only depend on the side of a rectangle are shared by all the rays.
+	"""
+
+	x1, y1 = start
+	# The rays are intersected as lines through the start and a point one unit along them, see
+	# `ray_segment_intersection`
+	ray_deltas = [(x1 - (x1 + dx), y1 - (y1 + dy)) for dx, dy in directions]
+	closest_sqr_distances = [None]*len(directions)
+
+	for rect in rects:
+		for i in range(4):
+			x3, y3 = rect[i]
+			x4, y4 = rect[(i+1)%4]
+			side_dx = x3 - x4
+			side_dy = y3 - y4
+			start_dx = x1 - x3
+			start_dy = y1 - y3
+			t_num = start_dx*side_dy - start_dy*side_dx
+
+			for j, (ray_dx, ray_dy) in enumerate(ray_deltas):
+				den = ray_dx*side_dy - ray_dy*side_dx
+				u_num = -(ray_dx*start_dy - ray_dy*start_dx)
+				if den != 0 and (u_num*den) >= 0 and abs(u_num) <= abs(den) and (t_num*den) >= 0:
+					u = u_num/den
+					sqr_distance = (x3 + u*(x4 - x3) - x1)**2 + (y3 + u*(y4 - y3) - y1)**2
+					closest_sqr_distance = closest_sqr_distances[j]
+					if closest_sqr_distance is None or sqr_distance < closest_sqr_distance:
+						closest_sqr_distances[j] = sqr_distance
+
+	return [math.sqrt(sqr_distance) if sqr_distance is not None else None for sqr_distance in closest_sqr_distances]
+
 def ray_segment_intersection(ray, segment):
 	"""
 	Finds the point of intersection between a ray and a segment, or returns None if such a point
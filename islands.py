@@ -0,0 +1,202 @@
+import argparse
+import multiprocessing
+
+import game_map
+from compiled_map import CompiledMap, compile_map, publish_map
+from chunked_track import ChunkedTrack, is_chunked_track
+from neat.genome import Genome
+from neat.population import Population
+from simulation import FITNESS_REDUCERS, evaluate_behaviors, simulate
+from trajectory import TrajectoryRecorder
+from fitness_cache import FitnessCache, FITNESS_CACHE_CAPACITY, evaluate_genomes
+from novelty import NoveltyArchive, NOVELTY_NEIGHBOURS
+from simulation_config import SimulationConfig, TRIAL_REDUCER, BEHAVIOR_SAMPLES, RAY_ANGLES, parse_ray_angle
+
+CARS_PER_ISLAND = 60
+MIGRATION_INTERVAL = 5
+MIGRANTS_PER_ISLAND = 1
+RECORD_INTERVAL = 10
+
+def run_island(island_idx, num_islands, args, track, migration_queues, stats_queue):
+	"""
+	Evolves a single island: an independent population evaluated in a headless game. Every
+	`args.migration_interval` generations the island sends its champions to the next island in the
+	ring, and receives the champions of the previous one. `track` is the published `CompiledMap` of
+	the track, which all the islands share, or a `ChunkedTrack`, which each island loads on demand.
+	"""
+
+	start_pos, walls, checkpoints = track.start_pos, track, track.get_checkpoints()
+	config = SimulationConfig(num_trials=args.trials, trial_reducer=args.reducer,
+		behavior_samples=args.behavior_samples, ray_angles=tuple(args.ray_angles),
+		checkpoint_heading_input=args.heading_input)
+	fitness_cache = FitnessCache(args.fitness_cache)
+	# In novelty search, organisms are rewarded for the novelty of their behavior instead of for their
+	# fitness. The fitness is still measured, to report the progress of the run
+	novelty_archive = NoveltyArchive(args.novelty_neighbours) if args.novelty else None
+	# Each island records the trajectories of its generations to its own file
+	recorder = TrajectoryRecorder(f'{args.record}.{island_idx}') if args.record is not None else None
+
+	# Each island allocates innovation numbers and node ids from its own namespace, so migrants never
+	# falsely match the genes of the islands they migrate to
+	population = Population(args.population, config.num_inputs(), 4, seed=f'{args.seed}:{island_idx}', id_namespace=island_idx)
+
+	for generation in range(args.generations):
+		genomes = [organism.genome for organism in population.organisms]
+		trial_seed = f'{args.seed}:{island_idx}:{generation}'
+		if novelty_archive is None:
+			fitness = evaluate_genomes(genomes, start_pos, walls, checkpoints, fitness_cache, config, trial_seed)
+			scores = fitness
+		else:
+			outcomes = evaluate_genomes(genomes, start_pos, walls, checkpoints, fitness_cache, config,
+				trial_seed, evaluate=evaluate_behaviors)
+			fitness = [car_fitness for car_fitness, _ in outcomes]
+			scores = novelty_archive.score([behavior for _, behavior in outcomes])
+
+		if recorder is not None and generation % args.record_interval == 0:
+			# The recorded generation drives once more from the regular start, because the trials and
+			# the cached networks aren't simulated as a whole generation
+			recorder.begin_generation(generation, len(genomes))
+			simulate([genome.as_neural_network() for genome in genomes], start_pos, walls, checkpoints,
+				config, recorder=recorder)
+			recorder.end_generation()
+
+		# A tiny epsilon is added because a fitness score of zero does not work well when the relative
+		# fitness is calculated
+		for organism, score in zip(population.organisms, scores):
+			organism.fitness = 0.00001 + score
+
+		# We find the most fit organisms before `epoch` reorders the population. The champion is the
+		# organism with the best fitness, even if the organisms are ranked by novelty
+		ranked = sorted(population.organisms, key=lambda organism: organism.fitness, reverse=True)
+		champion = population.organisms[max(range(len(fitness)), key=lambda i: fitness[i])]
+
+		is_migration_generation = num_islands > 1 and (generation + 1) % args.migration_interval == 0
+		if is_migration_generation:
+			# The islands form a ring: each island sends to the next one and receives from the previous
+			# one. Genomes are sent serialized, which is both compact and independent of pickling
+			emigrants = [organism.genome.to_bytes() for organism in ranked[:args.migrants]]
+			migration_queues[(island_idx + 1) % num_islands].put(emigrants)
+
+		population.epoch()
+
+		# The species are only known once the generation went through `epoch`
+		stats_queue.put({
+			'island': island_idx,
+			'generation': generation,
+			'average': sum(fitness)/len(fitness),
+			'max': max(fitness),
+			'species': len(population.species),
+			'cache_hit_rate': fitness_cache.hit_rate(),
+			'archive_size': len(novelty_archive) if novelty_archive is not None else 0,
+			'champion': champion.genome.to_bytes()
+		})
+
+		if is_migration_generation:
+			immigrants = migration_queues[island_idx].get()
+			population.accept_migrants([Genome.from_bytes(genome_bytes) for genome_bytes in immigrants])
+
+	population.close()
+	if recorder is not None:
+		recorder.close()
+
+def run_islands(args):
+	"""
+	Runs `args.islands` islands in separate processes, and reports the statistics of every island
+	for each generation. Returns the best fitness reached and the genome which reached it.
+	"""
+
+	migration_queues = [multiprocessing.Queue() for _ in range(args.islands)]
+	stats_queue = multiprocessing.Queue()
+
+	# The track is compiled once and published in shared memory, so the islands don't each need to
+	# generate and hold their own copy of it. A chunked track is instead opened by each island, which
+	# only loads the chunks its cars drive through
+	if is_chunked_track(args.track):
+		track = ChunkedTrack(args.track)
+	else:
+		track = publish_map(compile_map(*game_map.gen_map(args.track)))
+
+	processes = []
+	for island_idx in range(args.islands):
+		process = multiprocessing.Process(target=run_island,
+			args=(island_idx, args.islands, args, track, migration_queues, stats_queue))
+		process.start()
+		processes.append(process)
+
+	# Islands run at their own pace, so the statistics of a generation are reported once all the
+	# islands have finished it
+	generation_stats = dict()
+	best_fitness = None
+	best_genome = None
+	for _ in range(args.islands * args.generations):
+		stats = stats_queue.get()
+		if best_fitness is None or stats['max'] > best_fitness:
+			best_fitness = stats['max']
+			best_genome = Genome.from_bytes(stats['champion'])
+
+		island_stats = generation_stats.setdefault(stats['generation'], dict())
+		island_stats[stats['island']] = stats
+		if len(island_stats) == args.islands:
+			print(f'Finished generation {stats["generation"]}')
+			for island_idx in range(args.islands):
+				s = island_stats[island_idx]
+				archive_stats = f' Archive: {s["archive_size"]}' if args.novelty else ''
+				print(f'  Island {island_idx}: Average: {s["average"]:5.2f} Max: {s["max"]:5.2f} ' +
+					f'Species: {s["species"]} Cache hits: {100*s["cache_hit_rate"]:.1f}%{archive_stats}')
+			del generation_stats[stats['generation']]
+
+	for process in processes:
+		process.join()
+	if isinstance(track, CompiledMap):
+		track.unlink()
+
+	return (best_fitness, best_genome)
+
+def main():
+	parser = argparse.ArgumentParser(description='Evolves several populations in parallel, with migration')
+	parser.add_argument('--islands', type=int, default=multiprocessing.cpu_count(),
+		help='the number of islands (default: the number of CPUs)')
+	parser.add_argument('--generations', type=int, default=100,
+		help='the number of generations to evolve (default: 100)')
+	parser.add_argument('--population', type=int, default=CARS_PER_ISLAND,
+		help=f'the population size of each island (default: {CARS_PER_ISLAND})')
+	parser.add_argument('--migration-interval', type=int, default=MIGRATION_INTERVAL,
+		help=f'the number of generations between migrations (default: {MIGRATION_INTERVAL})')
+	parser.add_argument('--migrants', type=int, default=MIGRANTS_PER_ISLAND,
+		help=f'the number of champions each island sends per migration (default: {MIGRANTS_PER_ISLAND})')
+	parser.add_argument('--trials', type=int, default=1,
+		help='the number of trials, with randomized starts, each genome is evaluated on (default: 1)')
+	parser.add_argument('--reducer', choices=FITNESS_REDUCERS.keys(), default=TRIAL_REDUCER,
+		help=f'how the fitness scores of the trials are combined (default: {TRIAL_REDUCER})')
+	parser.add_argument('--fitness-cache', metavar='N', type=int, default=FITNESS_CACHE_CAPACITY,
+		help=f'the number of fitness scores each island caches (default: {FITNESS_CACHE_CAPACITY})')
+	parser.add_argument('--novelty', action='store_true',
+		help='evolve by novelty search, rewarding new behaviors instead of fitness')
+	parser.add_argument('--novelty-neighbours', metavar='K', type=int, default=NOVELTY_NEIGHBOURS,
+		help=f'the novelty of a behavior is its distance to its K nearest neighbours (default: {NOVELTY_NEIGHBOURS})')
+	parser.add_argument('--behavior-samples', metavar='N', type=int, default=BEHAVIOR_SAMPLES,
+		help=f'the number of positions along its trajectory which describe a car\'s behavior (default: {BEHAVIOR_SAMPLES})')
+	parser.add_argument('--ray-angles', metavar='DEGREES', type=parse_ray_angle, nargs='+', default=RAY_ANGLES,
+		help='the angles of the sensor rays of the cars, relative to their heading (default: -25 0 25)')
+	parser.add_argument('--heading-input', action='store_true',
+		help='also give the networks the heading to the next checkpoint as an input')
+	parser.add_argument('--record', metavar='TRAJECTORIES',
+		help='record the trajectories of each island to the file TRAJECTORIES.ISLAND')
+	parser.add_argument('--record-interval', metavar='N', type=int, default=RECORD_INTERVAL,
+		help=f'record the trajectories every N generations (default: {RECORD_INTERVAL})')
+	parser.add_argument('--seed', type=int, default=0, help='the seed of the run (default: 0)')
+	parser.add_argument('--track', default='assets/track.png',
+		help='the track description image, or a chunked track (default: assets/track.png)')
+	parser.add_argument('--output', metavar='GENOME',
+		help='save the best genome found to the file GENOME')
+	args = parser.parse_args()
+
+	best_fitness, best_genome = run_islands(args)
+	print(f'Best fitness: {best_fitness:5.2f}')
+
+	if args.output is not None:
+		with open(args.output, 'wb') as genome_file:
+			genome_file.write(best_genome.to_bytes())
+
+if __name__ == "__main__":
+	main()
@@ -1,37 +1,70 @@
 import sys
+import argparse
 import pygame
 from game import Game
+from simulation import get_car_controls, had_progress
+from simulation_config import PROGRESS_TIME_CREDIT, STALL_TIMEOUT, DEFAULT_SIMULATION_CONFIG
 from neat.population import Population
+from neat.checkpoint import save_checkpoint, load_checkpoint
+from neat.history import HistoryWriter
+from trajectory import TrajectoryRecorder
 import ui
 import game_map
 
 SCREEN_WIDTH = 1600
 SCREEN_HEIGHT = 900
 CARS_PER_GENERATION = 60
+CHECKPOINT_INTERVAL = 10
+CHECKPOINT_FILENAME = 'checkpoint.bin'
+HISTORY_FILENAME = 'run_history.bin'
+CHAMPION_FILENAME = 'champion.genome'
 
 def main():
 	"""
 	The program's starting point and main logic
 	"""
 
+	parser = argparse.ArgumentParser(description='Evolves neural networks which drive a race car')
+	parser.add_argument('--resume', metavar='CHECKPOINT',
+		help='resume the evolutionary run saved in the checkpoint file CHECKPOINT')
+	parser.add_argument('--checkpoint', metavar='CHECKPOINT', default=CHECKPOINT_FILENAME,
+		help=f'the file the run is periodically saved to (default: {CHECKPOINT_FILENAME})')
+	parser.add_argument('--checkpoint-interval', metavar='N', type=int, default=CHECKPOINT_INTERVAL,
+		help=f'save the run every N generations, 0 disables saving (default: {CHECKPOINT_INTERVAL})')
+	parser.add_argument('--history', metavar='HISTORY', default=HISTORY_FILENAME,
+		help=f'the file the fitness scores and champions are recorded to (default: {HISTORY_FILENAME})')
+	parser.add_argument('--record', metavar='TRAJECTORIES',
+		help='record the trajectories of the cars of every generation to the file TRAJECTORIES')
+	args = parser.parse_args()
+
 	# Initialize pygame, the screen and the framerate clock
 	pygame.init()
 	screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 	frame_clock = pygame.time.Clock()
 
-	# Lists to keep track of fitness and best network for every generation
-	fitness_history = []
-	network_history = []
+	# The fitness scores and the best network of every generation are streamed to disk
+	history = HistoryWriter(args.history)
+
+	# The trajectories of the cars are optionally recorded, so generations can be replayed later
+	recorder = TrajectoryRecorder(args.record) if args.record is not None else None
 
 	# Parse the map description and generate walls and checkpoints accordingly
 	start_pos, walls, checkpoints = game_map.gen_map('assets/track.png')
 
-	# Instantiate a new game simulation
-	game = Game(CARS_PER_GENERATION, start_pos, walls, checkpoints)
+	if args.resume is not None:
+		# Continue a previous run exactly where it was saved
+		population = load_checkpoint(args.resume)
+		print(f'Resuming from generation {population.generation}')
+	else:
+		# Generate an initial population (with networks which have an input for each car sensor and 4
+		# outputs)
+		population = Population(CARS_PER_GENERATION, DEFAULT_SIMULATION_CONFIG.num_inputs(), 4)
+	cur_generation = population.generation
 
-	# Generate an initial population (with networks which have 4 inputs and 4 outputs)
-	population = Population(CARS_PER_GENERATION, 4, 4)
-	cur_generation = 0
+	# Instantiate a new game simulation
+	if recorder is not None:
+		recorder.begin_generation(cur_generation, CARS_PER_GENERATION)
+	game = Game(CARS_PER_GENERATION, start_pos, walls, checkpoints, recorder=recorder)
 
 	# Compute the usable neural network for each genome in the initial population
 	networks = [organism.genome.as_neural_network() for organism in population.organisms]
@@ -48,11 +81,17 @@ def main():
 	# positivedelta in fitness, i.e. the cars made progress
 	last_fitness = None
 
+	# The genome of the most fit organism of the last finished generation
+	last_champion = None
+
 	while True:
 		# Handle pygame events
 		for event in pygame.event.get():
 			if event.type == pygame.QUIT:
 				# Exit if the close button was pressed
+				history.close()
+				if recorder is not None:
+					recorder.close()
 				sys.exit()
 			elif event.type == pygame.KEYDOWN:
 				# Keyboard shortcuts
@@ -60,42 +99,43 @@ def main():
 					# If the letter `f` was pressed, print the fitness of all simulated cars
 					print(game.get_cars_fitness())
 				elif event.key == pygame.K_s:
-					# If the letter `s` was pressed, dump the history
-					print('fitness_history =', fitness_history)
-					print('network_history =', network_history)
+					# If the letter `s` was pressed, save the last champion so it can be evaluated with
+					# champion.py, and show where the history is recorded
+					if last_champion is not None:
+						with open(CHAMPION_FILENAME, 'wb') as champion_file:
+							champion_file.write(last_champion.to_bytes())
+						print(f'Saved the champion of generation {cur_generation - 1} to {CHAMPION_FILENAME}')
+					print(f'History of generations 0-{cur_generation - 1} is recorded in {args.history}')
 
 		fitness = game.get_cars_fitness()
-		if last_fitness is not None:
-			# We go through each car and check if its fitness improved by some epsilon, to detect if
-			# any of the cars made progress
-			had_progress = False
-			for last, cur in zip(last_fitness, fitness):
-				if cur > last + 0.05:
-					had_progress = True
-					break
-
-			# If some car did make progress, we don't want to end the simulation early, so we push
-			# back the runtime by 100ms
-			if had_progress:
-				running_time = max(0, running_time - 100)
+		# We check if any car improved its fitness by some epsilon. If some car did make progress, we
+		# don't want to end the simulation early, so we push back the runtime
+		if last_fitness is not None and had_progress(last_fitness, fitness):
+			running_time = max(0, running_time - PROGRESS_TIME_CREDIT)
 
 		last_fitness = fitness
 
 		# If all the cars have died by colliding with a wall, or the cars did not make sufficient
 		# progress in over 1 second (1000ms), we end the simulation
-		if all(game.dead) or running_time > 1000:
+		if all(game.dead) or running_time > STALL_TIMEOUT:
 			print(f'Finished generation {cur_generation}')
 			print(f'Average: {sum(fitness)/len(fitness):5.2f} Max: {max(fitness):5.2f}')
+			best_lap_time = game.get_best_lap_time()
+			if best_lap_time is not None:
+				num_finished = sum(finish_time is not None for finish_time in game.finish_time)
+				print(f'Finished the course: {num_finished} Best lap: {best_lap_time:.2f}s')
 
-			# Record the fitness scores of each car in the generation
-			fitness_history.append(fitness)
-
-			# Find and record the genome of the most fit organism fo this generation
+			# Find the genome of the most fit organism fo this generation
 			best_idx = 0
 			for i in range(1, CARS_PER_GENERATION):
 				if fitness[i] > fitness[best_idx]:
 					best_idx = i
-			network_history.append(population.organisms[best_idx].genome.connections)
+
+			# Record the fitness scores of each car in the generation and a snapshot of the best genome
+			last_champion = population.organisms[best_idx].genome
+			history.write_generation(cur_generation, fitness, last_champion)
+			if recorder is not None:
+				recorder.end_generation()
 
 			# Update NEAT's view of the fitness scores of the organisms so the genetic algorithm
 			# can proceed. A tiny epsilon is added because a fitness score of zero does not work
@@ -107,12 +147,17 @@ def main():
 			population.epoch()
 			# Keep track of the current generation
 			cur_generation += 1
+			# Periodically save the whole run so it can be resumed if the process dies
+			if args.checkpoint_interval > 0 and cur_generation % args.checkpoint_interval == 0:
+				save_checkpoint(population, args.checkpoint)
 			# Reset the running time
 			running_time = 0
 			# Recompute the usable neural networks for the new organisms
 			networks = [organism.genome.as_neural_network() for organism in population.organisms]
 			# Reset the game simulation
-			game = Game(CARS_PER_GENERATION, start_pos, walls, checkpoints)
+			if recorder is not None:
+				recorder.begin_generation(cur_generation, CARS_PER_GENERATION)
+			game = Game(CARS_PER_GENERATION, start_pos, walls, checkpoints, recorder=recorder)
 			# Reset the last frame data
 			last_car_sensors = None
 			last_fitness = None
@@ -132,24 +177,9 @@ def main():
 			best_car = 0
 		game.track_car(best_car)
 
-		# If this is the first frame, we don't yet have sensor data to base our decision on, so we
-		# just don't move
-		if last_car_sensors is None:
-			controls = [{'forward': False, 'left': False, 'backward': False, 'right': False}]*CARS_PER_GENERATION
-		else:
-			# We compute the controls for each car
-			controls = []
-			for i in range(CARS_PER_GENERATION):
-				# We run the sensor data from last frame through the car's network
-				network_output = networks[i].evaluate_input(last_car_sensors[i])
-				# We then decide whether to enable that control based on a simple threshold
-				control = {
-					'forward': network_output[0] >= 0,
-					'left': network_output[1] >= 0,
-					'backward': network_output[2] >= 0,
-					'right': network_output[3] >= 0
-				}
-				controls.append(control)
+		# We compute the controls for each car by running the sensor data from last frame through the
+		# car's network
+		controls = get_car_controls(networks, last_car_sensors)
 
 		# We make a simulation update step
 		last_car_sensors = game.update(frame_clock.get_time() / 1000, controls)
@@ -0,0 +1,54 @@
+import os
+import pickle
+import random
+import struct
+import zlib
+
+# Every checkpoint file starts with this magic and a format version
+CHECKPOINT_MAGIC = b'NEATCKPT'
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct('<8sI')
+
+def save_checkpoint(population, filename):
+	"""
+	Saves the complete state of `population` (organisms, species, counters, innovation registry and
+	random state) to `filename`. The file is replaced atomically, so a crash while saving leaves
+	the previous checkpoint intact.
+	"""
+
+	state = {
+		'population': population,
+		'random_state': random.getstate()
+	}
+
+	# The genomes are pickled as raw typed arrays, and compressing the pickle makes the checkpoint
+	# considerably smaller
+	payload = zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+	# We write to a temporary file next to the checkpoint and then rename it over the checkpoint,
+	# which is atomic on both POSIX and Windows
+	temp_filename = filename + '.tmp'
+	with open(temp_filename, 'wb') as checkpoint_file:
+		checkpoint_file.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION))
+		checkpoint_file.write(payload)
+		checkpoint_file.flush()
+		os.fsync(checkpoint_file.fileno())
+	os.replace(temp_filename, filename)
+
+def load_checkpoint(filename):
+	"""
+	Loads a population saved with `save_checkpoint` from `filename`, and restores the global random
+	state. Returns the population, which continues exactly where the saved run stopped.
+	"""
+
+	with open(filename, 'rb') as checkpoint_file:
+		magic, version = CHECKPOINT_HEADER.unpack(checkpoint_file.read(CHECKPOINT_HEADER.size))
+		if magic != CHECKPOINT_MAGIC:
+			raise ValueError(f'{filename} is not a checkpoint file')
+		if version != CHECKPOINT_VERSION:
+			raise ValueError(f'Unsupported checkpoint version {version} in {filename}')
+
+		state = pickle.loads(zlib.decompress(checkpoint_file.read()))
+
+	random.setstate(state['random_state'])
+	return state['population']
@@ -0,0 +1,43 @@
+from dataclasses import dataclass, fields, replace
+
+from neat.parameters import *
+
+@dataclass(frozen=True)
+class NEATConfig:
+	"""
+	The tunable parameters of the NEAT genetic algorithm for a single run. The defaults are the
+	module-level constants in `neat.parameters`, so a default config behaves exactly like those. A
+	config is immutable, so it can be shared between populations and sent to worker processes.
+	"""
+
+	compatibility_coefficient_1: float = COMPATABILITY_COEFFICIENT_1
+	compatibility_coefficient_2: float = COMPATABILITY_COEFFICIENT_2
+	compatibility_coefficient_3: float = COMPATABILITY_COEFFICIENT_3
+	speciation_threshold: float = SPECIATION_THRESHOLD
+	weight_mutation_chance: float = WEIGHT_MUTATION_CHANCE
+	weight_randomized_chance: float = WEIGHT_RANDOMIZED_CHANCE
+	mutation_only_offspring: float = MUTATION_ONLY_OFFSPRING
+	interspecies_mating_rate: float = INTERSPECIES_MATING_RATE
+	mutation_after_crossover: float = MUTATION_AFTER_CROSSOVER
+	node_mutation_chance: float = NODE_MUTATION_CHANCE
+	link_mutation_chance: float = LINK_MUTATION_CHANCE
+	survival_threshold: float = SURVIVAL_THRESHOLD
+	innovation_retention: int = INNOVATION_RETENTION
+	reproduction_workers: int = REPRODUCTION_WORKERS
+
+	def with_changes(self, **changes):
+		"""
+		Returns a copy of this config with the parameters in `changes` replaced
+		"""
+
+		return replace(self, **changes)
+
+	@staticmethod
+	def parameter_names():
+		"""
+		Returns the names of all the parameters of a config
+		"""
+
+		return [field.name for field in fields(NEATConfig)]
+
+DEFAULT_CONFIG = NEATConfig()
@@ -0,0 +1,109 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+
+@dataclass
+class GeneAlignment:
+	"""
+	The alignment of the enabled genes of two genomes by innovation number. All the fields are lists
+	of gene indices into the respective genome's gene arrays, ordered by innovation number.
+	"""
+
+	# The indices of the matching genes, `matching_a[i]` matches `matching_b[i]`
+	matching_a: list
+	matching_b: list
+
+	# The indices of genes which are within the innovation range of the other genome, but don't match
+	disjoint_a: list
+	disjoint_b: list
+
+	# The indices of genes which are newer than all the genes of the other genome
+	excess_a: list
+	excess_b: list
+
+def align_genomes(genome_a, genome_b):
+	"""
+	Aligns the enabled genes of `genome_a` and `genome_b` by their innovation numbers. Disabled genes
+	are ignored entirely, just as they are ignored when comparing and crossing over genomes.
+	"""
+
+	enabled_a = genome_a.get_enabled_genes()
+	enabled_b = genome_b.get_enabled_genes()
+	innovations_a = genome_a.get_enabled_innovations()
+	innovations_b = genome_b.get_enabled_innovations()
+
+	# A non-matching gene is excess if it is newer than every enabled gene of the other genome. The
+	# enabled innovation numbers are sorted, so the excess genes are a suffix we find with a binary
+	# search, and every other non-matching gene is disjoint
+	excess_start_a = bisect_right(innovations_a, innovations_b[-1] if innovations_b else -1)
+	excess_start_b = bisect_right(innovations_b, innovations_a[-1] if innovations_a else -1)
+
+	# The matching genes are the intersection of the innovation numbers, which is done in bulk on the
+	# key sets instead of walking both gene lists side by side
+	matching = sorted(enabled_a.keys() & enabled_b.keys())
+
+	return GeneAlignment(
+		[enabled_a[innov] for innov in matching],
+		[enabled_b[innov] for innov in matching],
+		[enabled_a[innov] for innov in innovations_a[:excess_start_a] if innov not in enabled_b],
+		[enabled_b[innov] for innov in innovations_b[:excess_start_b] if innov not in enabled_a],
+		[enabled_a[innov] for innov in innovations_a[excess_start_a:]],
+		[enabled_b[innov] for innov in innovations_b[excess_start_b:]]
+	)
+
+def count_alignment(genome_a, genome_b, max_distance=None, excess_coefficient=1, disjoint_coefficient=1):
+	"""
+	A cheaper version of `align_genomes` for when only the sizes of the groups are needed. Returns a
+	tuple of `(matching_innovations, num_disjoint, num_excess)`, where `matching_innovations` is the
+	set of the innovation numbers of the matching genes.
+
+	If `max_distance` is supplied, the counting stops as soon as the structural part of the
+	compatibility distance, `excess_coefficient*num_excess + disjoint_coefficient*num_disjoint`, is
+	certainly at least `max_distance`. Then `matching_innovations` is None, and `num_disjoint` is a
+	lower bound of the number of disjoint genes for which the structural part reaches `max_distance`.
+	"""
+
+	enabled_a = genome_a.get_enabled_genes()
+	enabled_b = genome_b.get_enabled_genes()
+	innovations_a = genome_a.get_enabled_innovations()
+	innovations_b = genome_b.get_enabled_innovations()
+
+	# The genes newer than the newest gene of the other genome are excess, and the rest of the genes
+	# which don't match, which are in the innovation range of the other genome, are disjoint
+	_, max_innovation_a = genome_a.get_topology_fingerprint()
+	_, max_innovation_b = genome_b.get_topology_fingerprint()
+	in_range_a = bisect_right(innovations_a, max_innovation_b)
+	in_range_b = bisect_right(innovations_b, max_innovation_a)
+	num_excess = len(innovations_a) - in_range_a + len(innovations_b) - in_range_b
+
+	if max_distance is None:
+		# The matching genes are the intersection of the innovation numbers, which is done in bulk on
+		# the key sets instead of walking both gene lists side by side
+		matching = enabled_a.keys() & enabled_b.keys()
+		return (matching, in_range_a + in_range_b - 2*len(matching), num_excess)
+
+	# We walk the genes in range of the genome with fewer of them, looking each up in the other
+	# genome. At any point, every gene of the other genome which can't be matched by the genes left
+	# to walk is certainly disjoint as well
+	if in_range_a > in_range_b:
+		innovations_a, enabled_b = innovations_b, enabled_a
+		in_range_a, in_range_b = in_range_b, in_range_a
+
+	excess_distance = excess_coefficient * num_excess
+	min_disjoint = in_range_b - in_range_a
+	if excess_distance + disjoint_coefficient * min_disjoint >= max_distance:
+		return (None, min_disjoint, num_excess)
+
+	matching = []
+	num_missed = 0
+	for innov in innovations_a[:in_range_a]:
+		if innov in enabled_b:
+			matching.append(innov)
+			continue
+
+		# A missed gene is disjoint, and leaves one less gene to match a gene of the other genome
+		num_missed += 1
+		min_disjoint = 2*num_missed + in_range_b - in_range_a
+		if excess_distance + disjoint_coefficient * min_disjoint >= max_distance:
+			return (None, min_disjoint, num_excess)
+
+	return (matching, in_range_a + in_range_b - 2*len(matching), num_excess)
@@ -1,266 +1,596 @@
+import sys
 import random
-import copy
-import time
+import struct
+import hashlib
+from array import array
 
 from neat.connection_gene import ConnectionGene
+from neat.gene_alignment import align_genomes, count_alignment
 from neat.innovation import Innovation
 from neat.neural_connection import NeuralConnection
 from neat.neural_network import NeuralNetwork
-from neat.parameters import *
+from neat.config import DEFAULT_CONFIG
+
+# The header of a serialized genome: the number of inputs, outputs, genes and nodes
+SERIALIZED_GENOME_HEADER = struct.Struct('<IIII')
+# The network key is a digest of the number of inputs and outputs, followed by every enabled
+# connection's in node, out node and weight
+NETWORK_KEY_HEADER = struct.Struct('<II')
+NETWORK_KEY_CONNECTION = struct.Struct('<qqd')
 
 class Genome:
 	"""
-	The genetic encoding of an invdivdual, comprised of the network topology and weights
+	The genetic encoding of an invdivdual, comprised of the network topology and weights.
+
+	The connection genes are stored in parallel typed arrays (one entry per gene), which keeps
+	genomes compact and makes cloning a handful of array copies. Lookup structures over the genes
+	are derived from the arrays on demand, see `rebuild_index`.
 	"""
 
-	def __init__(self, num_inputs, num_outputs, connections=None, connections_by_out=None, nodes=None):
+	def __init__(self, num_inputs, num_outputs, connections=None, connections_by_out=None, nodes=None, rng=random):
 		self.num_inputs = num_inputs
 		self.num_outputs = num_outputs
 
+		# The parallel arrays which hold the connection genes: the gene at index `i` goes from
+		# `in_nodes[i]` to `out_nodes[i]` with weight `weights[i]`, was created in innovation
+		# `innovation_nums[i]`, and is disabled if `disabled[i]` is non-zero
+		self.innovation_nums = array('q')
+		self.in_nodes = array('q')
+		self.out_nodes = array('q')
+		self.weights = array('d')
+		self.disabled = array('b')
+
+		# The index over the genes is built lazily, as many genomes (e.g. carried-over champions) are
+		# never mutated
+		self.links = None
+		self.genes_by_out = None
+		self.enabled_genes = None
+		self.enabled_innovations = None
+		self.content_key = None
+		self.node_descendants = None
+
 		# The genome is either created with no initial configuration, in which case we need to
-		# generate it randomally, or we are just asked to create a genome with a specific configuration
-		if connections is None or connections_by_out is None or nodes is None:
-			self.connections = []
-			self.connections_by_out = dict()
-			self.nodes = list(range(num_inputs + 1 + num_outputs)) # Additional bias node
+		# generate it randomally, or we are just asked to create a genome with a specific configuration.
+		# `connections_by_out` is accepted for compatibility but is always rebuilt from `connections`
+		if connections is None or nodes is None:
+			self.nodes = array('q', range(num_inputs + 1 + num_outputs)) # Additional bias node
 
 			# The initial connections between the bias node and the output nodes are the only
 			# connections which are not created by mutation: we thus assign to them a consistent
 			# innovation count which is the same in all genomes created randomally, so the connection
 			# would appear to match topologically
-			innov_count = 0
 			for i in range(num_outputs):
 				# We generate a random weight in the range (-1, 1]
-				weight = (random.random() * 2) - 1
-				conn = ConnectionGene(num_inputs, num_inputs + 1 + i, weight, innov_count)
-				innov_count += 1
-
-				self.connections.append(conn)
-				# The `connections_by_out` dictionary tracks a list of connections that go into the
-				# specific node
-				self.connections_by_out[num_inputs + 1 + i] = [conn]
+				weight = (rng.random() * 2) - 1
+				self.add_gene(num_inputs, num_inputs + 1 + i, weight, i)
 		else:
-			self.connections = connections
-			self.connections_by_out = connections_by_out
-			self.nodes = nodes
+			self.nodes = array('q', nodes)
+			for conn in connections:
+				self.add_gene(conn.in_node, conn.out_node, conn.weight, conn.innovation_num, conn.disabled)
+
+	def __getstate__(self):
+		# The index is cheap to rebuild, so we don't waste space on it when pickling
+		state = self.__dict__.copy()
+		state['links'] = None
+		state['genes_by_out'] = None
+		state['enabled_genes'] = None
+		state['enabled_innovations'] = None
+		state['content_key'] = None
+		state['node_descendants'] = None
+		return state
+
+	@staticmethod
+	def from_arrays(num_inputs, num_outputs, innovation_nums, in_nodes, out_nodes, weights, disabled, nodes):
+		"""
+		Creates a genome which takes ownership of the supplied gene arrays and node array
+		"""
+
+		genome = Genome.__new__(Genome)
+		genome.num_inputs = num_inputs
+		genome.num_outputs = num_outputs
+		genome.innovation_nums = innovation_nums
+		genome.in_nodes = in_nodes
+		genome.out_nodes = out_nodes
+		genome.weights = weights
+		genome.disabled = disabled
+		genome.nodes = nodes
+		genome.links = None
+		genome.genes_by_out = None
+		genome.enabled_genes = None
+		genome.enabled_innovations = None
+		genome.content_key = None
+		genome.node_descendants = None
+		return genome
+
+	def to_bytes(self):
+		"""
+		Serializes the genome into a compact binary representation, which can be loaded back using
+		`Genome.from_bytes`
+		"""
+
+		header = SERIALIZED_GENOME_HEADER.pack(self.num_inputs, self.num_outputs, len(self), len(self.nodes))
+		return header + b''.join(little_endian_bytes(genome_array) for genome_array in
+			(self.innovation_nums, self.in_nodes, self.out_nodes, self.weights, self.disabled, self.nodes))
+
+	@staticmethod
+	def from_bytes(data):
+		"""
+		Loads a genome serialized by `to_bytes` from `data`
+		"""
+
+		num_inputs, num_outputs, num_genes, num_nodes = SERIALIZED_GENOME_HEADER.unpack_from(data)
+
+		offset = SERIALIZED_GENOME_HEADER.size
+		genome_arrays = []
+		for typecode, length in (('q', num_genes), ('q', num_genes), ('q', num_genes), ('d', num_genes),
+			('b', num_genes), ('q', num_nodes)):
+			genome_array = array(typecode)
+			size = genome_array.itemsize * length
+			genome_array.frombytes(data[offset:offset + size])
+			if sys.byteorder == 'big':
+				genome_array.byteswap()
+			genome_arrays.append(genome_array)
+			offset += size
+
+		return Genome.from_arrays(num_inputs, num_outputs, *genome_arrays)
+
+	def __len__(self):
+		"""
+		Returns the number of connection genes (enabled or disabled) in the genome
+		"""
+
+		return len(self.innovation_nums)
+
+	@property
+	def connections(self):
+		"""
+		A list of `ConnectionGene` snapshots of the genome's genes. Modifying the snapshots does not
+		modify the genome.
+		"""
+
+		return [self.get_connection(i) for i in range(len(self))]
+
+	@property
+	def connections_by_out(self):
+		"""
+		A dictionary which maps each node to a list of `ConnectionGene` snapshots of the genes which
+		go into it
+		"""
+
+		self.ensure_index()
+		return {out_node: [self.get_connection(i) for i in genes]
+			for out_node, genes in self.genes_by_out.items()}
+
+	def get_connection(self, gene_idx):
+		"""
+		Returns a `ConnectionGene` snapshot of the gene at `gene_idx`
+		"""
+
+		return ConnectionGene(self.in_nodes[gene_idx], self.out_nodes[gene_idx], self.weights[gene_idx],
+			self.innovation_nums[gene_idx], bool(self.disabled[gene_idx]))
+
+	def add_gene(self, in_node, out_node, weight, innovation_num, disabled=False):
+		"""
+		Appends a new gene to the genome, keeping the index (if it was built) up to date. Returns the
+		index of the new gene.
+		"""
+
+		gene_idx = len(self.innovation_nums)
+		self.innovation_nums.append(innovation_num)
+		self.in_nodes.append(in_node)
+		self.out_nodes.append(out_node)
+		self.weights.append(weight)
+		self.disabled.append(1 if disabled else 0)
+		self.content_key = None
+
+		if not disabled:
+			self.enabled_genes = None
+			self.enabled_innovations = None
+
+		if self.links is not None:
+			self.genes_by_out.setdefault(out_node, []).append(gene_idx)
+			if not disabled:
+				self.links[(in_node, out_node)] = gene_idx
+		if not disabled and self.node_descendants is not None:
+			if in_node in self.node_descendants and out_node in self.node_descendants:
+				self.add_descendant_link(in_node, out_node)
+			else:
+				self.node_descendants = None
+
+		return gene_idx
+
+	def disable_gene(self, gene_idx):
+		"""
+		Disables the gene at `gene_idx`, keeping the index (if it was built) up to date
+		"""
+
+		self.disabled[gene_idx] = 1
+		self.content_key = None
+		self.enabled_genes = None
+		self.enabled_innovations = None
+		# Removing a link can make nodes unreachable, so the descendants must be found again
+		self.node_descendants = None
+		if self.links is not None:
+			link = (self.in_nodes[gene_idx], self.out_nodes[gene_idx])
+			if self.links.get(link) == gene_idx:
+				del self.links[link]
+
+	def rebuild_index(self):
+		"""
+		Rebuilds the lookup structures over the gene arrays: `links` maps the `(in_node, out_node)`
+		pair of every enabled gene to the gene index, and `genes_by_out` maps each node to the list of
+		indices of the genes which go into it
+		"""
+
+		self.links = dict()
+		self.genes_by_out = {node: [] for node in self.nodes}
+		self.node_descendants = None
+
+		for gene_idx, (in_node, out_node, disabled) in enumerate(zip(self.in_nodes, self.out_nodes, self.disabled)):
+			self.genes_by_out[out_node].append(gene_idx)
+			if not disabled:
+				self.links[(in_node, out_node)] = gene_idx
+
+	def get_enabled_genes(self):
+		"""
+		Returns a dictionary which maps the innovation number of every enabled gene to its index. The
+		dictionary is cached, as genomes (e.g. species representatives) are compared many times.
+		"""
+
+		if self.enabled_genes is None:
+			self.enabled_genes = {innovation_num: gene_idx for gene_idx, (innovation_num, disabled)
+				in enumerate(zip(self.innovation_nums, self.disabled)) if not disabled}
+		return self.enabled_genes
+
+	def get_enabled_innovations(self):
+		"""
+		Returns a sorted list of the innovation numbers of the enabled genes. The list is cached
+		together with `get_enabled_genes`.
+		"""
+
+		if self.enabled_innovations is None:
+			self.enabled_innovations = sorted(self.get_enabled_genes())
+		return self.enabled_innovations
+
+	def get_topology_fingerprint(self):
+		"""
+		Returns a `(num_enabled_genes, max_innovation_num)` tuple which summarizes the topology of the
+		genome, and is used to cheaply bound the compatibility distance between genomes
+		"""
+
+		enabled_innovations = self.get_enabled_innovations()
+		if len(enabled_innovations) == 0:
+			return (0, -1)
+		return (len(enabled_innovations), enabled_innovations[-1])
+
+	def get_content_key(self):
+		"""
+		Returns a digest of the genome's genes and nodes. Genomes with the same content key are
+		identical, which lets results computed for one genome be reused for its unmodified clones.
+		"""
+
+		if self.content_key is None:
+			digest = hashlib.blake2b(digest_size=16)
+			for genome_array in (self.innovation_nums, self.in_nodes, self.out_nodes, self.weights,
+				self.disabled, self.nodes):
+				digest.update(genome_array.tobytes())
+			self.content_key = digest.digest()
+		return self.content_key
+
+	def get_network_key(self):
+		"""
+		Returns a digest of the network the genome encodes: its enabled connections and their weights.
+		Unlike the content key, it ignores disabled genes and innovation numbers, so genomes with
+		different genetic histories but the same network share a network key.
+		"""
+
+		self.ensure_index()
+
+		digest = hashlib.blake2b(digest_size=16)
+		digest.update(NETWORK_KEY_HEADER.pack(self.num_inputs, self.num_outputs))
+		# The enabled connections are hashed in a canonical order, which doesn't depend on the order of
+		# the genes
+		for (in_node, out_node), gene_idx in sorted(self.links.items()):
+			digest.update(NETWORK_KEY_CONNECTION.pack(in_node, out_node, self.weights[gene_idx]))
+		return digest.digest()
+
+	def ensure_index(self):
+		"""
+		Builds the index over the gene arrays if it was not built yet
+		"""
+
+		if self.links is None:
+			self.rebuild_index()
 
 	def clone(self):
 		"""
 		Creates a deep copy of this genome
 		"""
 
-		return copy.deepcopy(self)
+		# Slicing an array copies it in a single C-level operation, and the index is rebuilt lazily
+		clone = Genome.from_arrays(self.num_inputs, self.num_outputs, self.innovation_nums[:],
+			self.in_nodes[:], self.out_nodes[:], self.weights[:], self.disabled[:], self.nodes[:])
+		# The clone has exactly the same content
+		clone.content_key = self.content_key
+		return clone
 
-	def mutate(self, cur_gen_innovations, global_innovation_counter, global_node_counter):
+	def mutate(self, innovations, global_innovation_counter, global_node_counter, rng=random,
+		config=DEFAULT_CONFIG):
 		"""
-		Mutates the genome in-place. `cur_gene_innovations` is a global list shared between all
-		`mutate` calls in the current generation which tracks all new topological innovations made
-		this generation.
+		Mutates the genome in-place. `innovations` is the population's `InnovationRegistry`, shared
+		between all `mutate` calls, which tracks the recent topological innovations. All random choices
+		are made using `rng`, and the mutation rates are taken from the `NEATConfig` `config`.
 		"""
 
 		# We choose to either do one of the topological mutations, or try to do some
 		# weight mutations
-		if random.random() < NODE_MUTATION_CHANCE:
+		if rng.random() < config.node_mutation_chance:
+			self.ensure_index()
+
 			# We add a new node by choosing a random connection and splitting it in the middle using
 			# a new node
-			connection_to_split_idx = random.randrange(len(self.connections))
-			connection_to_split = self.connections[connection_to_split_idx]
-
-			# We first check if this exact mutation already happened in this generation, and if so,
-			# reuse its innovation numbers to prevent 'innovation explosion'
-			innovation_num_a = None
-			innovation_num_b = None
-			new_node = None
-			for innov in cur_gen_innovations:
-				if innov.is_node_mutation and innov.old_innov_num == connection_to_split.innovation_num:
-					innovation_num_a = innov.new_innov_num
-					innovation_num_b = innov.new_innov_num2
-					new_node = innov.new_node_id
-					break
-
-			# If this is a novel mutation, we give it new innovation numbers and record it
-			if innovation_num_a is None:
+			split_idx = rng.randrange(len(self))
+			split_innovation_num = self.innovation_nums[split_idx]
+
+			# We first check if this exact mutation already happened recently, and if so, reuse its
+			# innovation numbers to prevent 'innovation explosion'. If this genome already has the
+			# node of that innovation (it split the same connection before) we can't reuse it.
+			innov = innovations.find_node_innovation(split_innovation_num)
+			if innov is not None and innov.new_node_id not in self.genes_by_out:
+				innovations.touch(innov)
+				innovation_num_a = innov.new_innov_num
+				innovation_num_b = innov.new_innov_num2
+				new_node = innov.new_node_id
+			else:
+				# If this is a novel mutation, we give it new innovation numbers and record it
 				innovation_num_a = global_innovation_counter.next_id()
 				innovation_num_b = global_innovation_counter.next_id()
 
 				new_node = global_node_counter.next_id()
 
-				new_innov = Innovation(True, connection_to_split.innovation_num, None, None,
-					innovation_num_a, innovation_num_b, new_node)
-				cur_gen_innovations.append(new_innov)
-
-			# We keep track of the new node
-			self.nodes.append(new_node)
-
-			# We disable the existing connection we split
-			connection_to_split.disabled = True
-
-			# We construct two new connections: `conn_a` is the connection from the existing in_node
-			# to the new node, and `conn_b` is the connection from the new node to the existing
-			# out_node
-			conn_a = ConnectionGene(connection_to_split.in_node, new_node, 1.0, innovation_num_a)
-			conn_b = ConnectionGene(new_node, connection_to_split.out_node, connection_to_split.weight,
-				innovation_num_b)
-
-			# We append the new connections to the connection list
-			self.connections.append(conn_a)
-			self.connections.append(conn_b)
-			# We add a new `connection_by_out` list for the new node, which currently contains only
-			# the new connection
-			self.connections_by_out[new_node] = [conn_a]
-			# We add the new connection the out node's list
-			self.connections_by_out[connection_to_split.out_node].append(conn_b)
-
-		elif random.random() < LINK_MUTATION_CHANCE:
-			# We first find the layer of each node, this will be used to make sure we don't create
-			# any recurrent links
-			node_layer = self.get_node_layers()
-
-			# When picking completely random links, some links will be invalid. It is much simpler,
-			# to just try a few times to find a valid link and bail if none are found. This should
-			# not have significant effect: the genetic proccess is inherently random anyway.
-			for _ in range(50):
-
-				# An input/bias node cannot be used as an out node, because the nodes are ordered
-				# [input, bias, output, hidden], we pick a random index that starts at the first
-				# output node
-				first_output_idx = self.num_inputs + 1
-				out_node = self.nodes[random.randrange(first_output_idx, len(self.nodes))]
-
-				# An output node cannot be used as an in node, because the nodes are ordered
-				# [input, bias, output, hidden], we pick a random index out of the number of
-				# not-output nodes.
-				in_node_idx = random.randrange(len(self.nodes) - self.num_outputs)
-				# Because output nodes come before hidden nodes, this means that the index actually
-				# points to an output node if it is one of the hidden nodes, so we remap indexes
-				# in the output range to point to the corresponding node in the hidden range.
-				if self.num_inputs + 1 <= in_node_idx < first_output_idx + self.num_outputs:
-					in_node_idx = len(self.nodes) - in_node_idx + self.num_inputs
-				in_node = self.nodes[in_node_idx]
-
-				# First we have to make sure that the connection we are creating is not a recurrent
-				# connection, as we only support feed-forward networks
-				if node_layer[in_node] <= node_layer[out_node] and in_node != out_node:
-					# We then check if this connection already exists by iterating over all links
-					# that go into the chosen `out_node`
-					already_exists = False
-					for conn in self.connections_by_out[out_node]:
-						if not conn.disabled and conn.in_node == in_node:
-							already_exists = True
-							break
-
-					# If this is a new link, than we can add it
-					if not already_exists:
-						# We initialize the link with a random weight
-						weight = (random.random() * 2) - 1
-
-						# We first check if this exact mutation already happened in this generation,
-						# and if so, reuse its innovation numbers to prevent 'innovation explosion'
-						innovation_num = None
-						for innov in cur_gen_innovations:
-							if not innov.is_node_mutation and innov.node_start_id == in_node and \
-								innov.node_end_id == out_node:
-								innovation_num = innov.new_innov_num
-								break
-
-						# If this is a novel mutation, we give it a new innovation number and record it
-						if innovation_num is None:
-							innovation_num = global_innovation_counter.next_id()
-
-							new_innov = Innovation(False, None, in_node, out_node, innovation_num)
-							cur_gen_innovations.append(new_innov)
-
-						# Create the new connection
-						new_connection = ConnectionGene(in_node, out_node, weight, innovation_num)
-						self.connections.append(new_connection)
-						self.connections_by_out[out_node].append(new_connection)
-
-						# We found a valid link, so we don't have to keep retrying
-						break
-		elif random.random() < WEIGHT_MUTATION_CHANCE:
-			for conn in self.connections:
-				if conn.disabled: continue
+				if innov is None:
+					innovations.record(Innovation(True, split_innovation_num, None, None,
+						innovation_num_a, innovation_num_b, new_node))
+
+			self.split_gene(split_idx, new_node, innovation_num_a, innovation_num_b)
+
+		elif rng.random() < config.link_mutation_chance:
+			# We enumerate every link which could be added without creating a recurrent connection or
+			# duplicating an existing link, so a valid link can be picked in a single draw
+			candidates = self.get_link_candidates()
+
+			# On a fully connected genome there is no link left to add, so this mutation does nothing
+			if len(candidates) > 0:
+				in_node, out_node = rng.choice(candidates)
+
+				# We initialize the link with a random weight
+				weight = (rng.random() * 2) - 1
+
+				# We first check if this exact mutation already happened recently, and if so, reuse
+				# its innovation number to prevent 'innovation explosion'
+				innov = innovations.find_link_innovation(in_node, out_node)
+				if innov is not None:
+					innovations.touch(innov)
+					innovation_num = innov.new_innov_num
+				else:
+					# If this is a novel mutation, we give it a new innovation number and record it
+					innovation_num = global_innovation_counter.next_id()
+					innovations.record(Innovation(False, None, in_node, out_node, innovation_num))
+
+				# Create the new connection
+				self.add_gene(in_node, out_node, weight, innovation_num)
+		elif rng.random() < config.weight_mutation_chance:
+			self.content_key = None
+			weights = self.weights
+			for gene_idx, disabled in enumerate(self.disabled):
+				if disabled: continue
 				# For each connection we either randomize it completely (rarely) or perturb it
 				# slightly
-				if random.random() < WEIGHT_RANDOMIZED_CHANCE:
-					conn.weight = (random.random() * 2) - 1
+				if rng.random() < config.weight_randomized_chance:
+					weights[gene_idx] = (rng.random() * 2) - 1
 				else:
 					# TODO: Try with other values of sigma, or simple random, this is arbitary
-					conn.weight += random.gauss(0, 0.3)
+					weights[gene_idx] += rng.gauss(0, 0.3)
+
+	def split_gene(self, gene_idx, new_node, innovation_num_a, innovation_num_b):
+		"""
+		Splits the connection gene at `gene_idx` in the middle using the new node `new_node`. The two
+		new connections are assigned the innovation numbers `innovation_num_a` and
+		`innovation_num_b`.
+		"""
+
+		self.ensure_index()
+		descendants = self.node_descendants
+
+		# We keep track of the new node
+		self.nodes.append(new_node)
+		self.genes_by_out[new_node] = []
+
+		# We disable the existing connection we split
+		self.disable_gene(gene_idx)
+
+		# We construct two new connections: the first is the connection from the existing in_node
+		# to the new node, and the second is the connection from the new node to the existing
+		# out_node
+		in_node, out_node = self.in_nodes[gene_idx], self.out_nodes[gene_idx]
+		self.add_gene(in_node, new_node, 1.0, innovation_num_a)
+		self.add_gene(new_node, out_node, self.weights[gene_idx], innovation_num_b)
+
+		# The new node bridges the disabled connection, so no node became unreachable and the
+		# descendants can be updated instead of found again
+		if descendants is not None:
+			descendants[new_node] = set()
+			self.node_descendants = descendants
+			self.add_descendant_link(new_node, out_node)
+			self.add_descendant_link(in_node, new_node)
+
+	def replace_placeholder_ids(self, id_map):
+		"""
+		Replaces the placeholder (negative) innovation numbers and node ids in the genome according to
+		`id_map`. Placeholders are assigned to structural mutations made away from the population, see
+		`PendingInnovations`.
+		"""
+
+		for genome_array in (self.innovation_nums, self.in_nodes, self.out_nodes, self.nodes):
+			for idx, value in enumerate(genome_array):
+				if value < 0:
+					genome_array[idx] = id_map[value]
+
+		# The ids changed, so all the derived structures must be rebuilt
+		self.links = None
+		self.genes_by_out = None
+		self.enabled_genes = None
+		self.enabled_innovations = None
+		self.content_key = None
+		self.node_descendants = None
+
+	def get_node_descendants(self):
+		"""
+		Returns a dictionary which maps each node in the genome to the set of nodes reachable from it
+		through enabled connections. This is the reachability index used to reject recurrent links.
+		It is cached with the index over the genes, and kept up to date as links are added, so it
+		must not be modified.
+		"""
+
+		if self.node_descendants is None:
+			self.node_descendants = self.find_node_descendants()
+		return self.node_descendants
+
+	def add_descendant_link(self, in_node, out_node):
+		"""
+		Updates the cached descendants for a new enabled link from `in_node` to `out_node`: every node
+		which reaches `in_node` now reaches `out_node` and its descendants as well
+		"""
+
+		descendants = self.node_descendants
+		new_descendants = descendants[out_node] | {out_node}
+		for node, reachable in descendants.items():
+			if node == in_node or in_node in reachable:
+				reachable |= new_descendants
+
+	def find_node_descendants(self):
+		"""
+		Finds the descendants of every node, see `get_node_descendants`
+		"""
+
+		self.ensure_index()
+
+		# We build the adjacency list of outgoing connections for each node
+		outgoing = {node: [] for node in self.nodes}
+		for in_node, out_node in self.links:
+			outgoing[in_node].append(out_node)
+
+		# We then find the descendants of each node with a depth-first search, memoizing the result
+		# of every node we finish so each node is only expanded once. The search is iterative so deep
+		# genomes can't overflow the recursion limit
+		descendants = dict()
+		for root in self.nodes:
+			if root in descendants: continue
+
+			stack = [(root, iter(outgoing[root]))]
+			while len(stack) > 0:
+				node, children = stack[-1]
+				child = next(children, None)
+				if child is None:
+					# All children of the node are finalized, so its descendants are the children
+					# and their descendants
+					reachable = set()
+					for out_node in outgoing[node]:
+						reachable.add(out_node)
+						reachable |= descendants[out_node]
+					descendants[node] = reachable
+					stack.pop()
+				elif child not in descendants:
+					stack.append((child, iter(outgoing[child])))
+
+		return descendants
+
+	def get_link_candidates(self):
+		"""
+		Returns a list of all `(in_node, out_node)` pairs which can be added to the genome as a new
+		link, i.e. links which do not already exist and would not create a recurrent connection
+		"""
+
+		descendants = self.get_node_descendants()
+
+		# The nodes are ordered [input, bias, output, hidden]: an input/bias node cannot be used as an
+		# out node, and an output node cannot be used as an in node
+		first_output_idx = self.num_inputs + 1
+		first_hidden_idx = first_output_idx + self.num_outputs
+		in_nodes = self.nodes[:first_output_idx] + self.nodes[first_hidden_idx:]
+		out_nodes = self.nodes[first_output_idx:]
+
+		candidates = []
+		for out_node in out_nodes:
+			# A link from `in_node` to `out_node` creates a loop exactly when `in_node` is reachable
+			# from `out_node`
+			reachable = descendants[out_node]
+			for in_node in in_nodes:
+				if in_node == out_node or in_node in reachable: continue
+				if (in_node, out_node) in self.links: continue
+				candidates.append((in_node, out_node))
+
+		return candidates
 
-	def get_compatibility_distance(self, other):
+	def get_compatibility_distance(self, other, max_distance=None, config=DEFAULT_CONFIG):
 		"""
 		Calculates the 'compatibility distance' between this genome and `other`. Compatibility
 		distance is defined to be a linear combination of the number of excess genes, the number of
 		disjoint genes, and the average weight differences of matching genes.
-		"""
 
-		excess_genes = 0
-		disjoint_genes = 0
-		matching_genes = 0
-		weight_difference_sum = 0
+		If `max_distance` is supplied, the calculation stops as soon as it is certain the distance is
+		at least `max_distance`, in which case some value which is at least `max_distance` is returned.
+		The coefficients of the linear combination are taken from the `NEATConfig` `config`.
+		"""
 
-		# We go through each connection gene, and check if they match
-		gene_a = 0
-		gene_b = 0
-		while gene_a < len(self.connections) or gene_b < len(other.connections):
-			# Excess genes are the genes which do not match in the end, so if we ran out of genes
-			# in either genome, all the remaining genes are excess
-			if gene_a == len(self.connections):
-				if not other.connections[gene_b].disabled:
-					excess_genes += 1
-				gene_b += 1
-			elif gene_b == len(other.connections):
-				if not self.connections[gene_a].disabled:
-					excess_genes += 1
-				gene_a += 1
-			else:
-				# TODO: Should we really be ignoring disabled connections? Should we keep disabled
-				# connections around (don't prune them on cross over) and use them for matching
-				# topologies? But then, what happens when a genome with the disabled gene is crossed
-				# over with a genome with the gene enabled
-				if self.connections[gene_a].disabled:
-					gene_a += 1
-					continue
-
-				if other.connections[gene_b].disabled:
-					gene_b += 1
-					continue
-
-				# The matching of the genes is done based on the innovation numbers which are
-				# essentially historical markings
-				innovation_a = self.connections[gene_a].innovation_num
-				innovation_b = other.connections[gene_b].innovation_num
-				if innovation_a == innovation_b:
-					# If the genes have the same innovation number, they match, and we calculate the
-					# weight difference
-					matching_genes += 1
-					weight_a = self.connections[gene_a].weight
-					weight_b = other.connections[gene_b].weight
-					weight_difference_sum += abs(weight_a - weight_b)
-
-					gene_a += 1
-					gene_b += 1
-				elif innovation_a < innovation_b:
-					# If the numbers dont match up, then one of the genes is 'earlier' in history.
-					# We rely on this fact, because the genes are sorted in the list based on
-					# insertion time, so if a gene is older innovation wise, we know that we need
-					# to advance the gene index in that genome
-					disjoint_genes += 1
-					gene_a += 1
-				else:
-					disjoint_genes += 1
-					gene_b += 1
+		# TODO: Should we really be ignoring disabled connections? Should we keep disabled
+		# connections around (don't prune them on cross over) and use them for matching
+		# topologies? But then, what happens when a genome with the disabled gene is crossed
+		# over with a genome with the gene enabled
+		# The counting of the excess and disjoint genes stops early if they alone reach the bound, in
+		# which case there are no matching genes to compare
+		matching, disjoint_genes, excess_genes = count_alignment(self, other, max_distance,
+			config.compatibility_coefficient_1, config.compatibility_coefficient_2)
 
 		# The final distance is then calculated based on formula (1) from the paper
-		distance_part_1 = COMPATABILITY_COEFFICIENT_1 * excess_genes
-		distance_part_2 = COMPATABILITY_COEFFICIENT_2 * disjoint_genes
-		if matching_genes != 0:
-			distance_part_3 = COMPATABILITY_COEFFICIENT_3 * (weight_difference_sum / matching_genes)
+		distance_part_1 = config.compatibility_coefficient_1 * excess_genes
+		distance_part_2 = config.compatibility_coefficient_2 * disjoint_genes
+		if matching is None or len(matching) == 0:
+			return distance_part_1 + distance_part_2
+		matching_genes = len(matching)
+
+		# The weight part is never negative, so if the structural part alone reaches the bound we are
+		# done. Otherwise, the weight difference sum is only allowed to grow up to `max_weight_sum`
+		# before the bound is certainly crossed. Without a weight coefficient the weights can't cross
+		# the bound at all, so they are summed in full
+		if max_distance is None or config.compatibility_coefficient_3 == 0:
+			max_weight_sum = float('inf')
 		else:
-			distance_part_3 = 0
+			remaining_distance = max_distance - distance_part_1 - distance_part_2
+			if remaining_distance <= 0:
+				return distance_part_1 + distance_part_2
+			max_weight_sum = remaining_distance * matching_genes / config.compatibility_coefficient_3
+
+		# We sum the weight differences of the matching genes
+		weights_a, enabled_a = self.weights, self.get_enabled_genes()
+		weights_b, enabled_b = other.weights, other.get_enabled_genes()
+		weight_difference_sum = 0
+		for innov in matching:
+			weight_difference_sum += abs(weights_a[enabled_a[innov]] - weights_b[enabled_b[innov]])
+			if weight_difference_sum > max_weight_sum:
+				break
+
+		distance_part_3 = config.compatibility_coefficient_3 * (weight_difference_sum / matching_genes)
 		return distance_part_1 + distance_part_2 + distance_part_3
 
+	def is_compatible(self, other, threshold, config=DEFAULT_CONFIG):
+		"""
+		Returns whether the compatibility distance between this genome and `other` is below
+		`threshold`. This is cheaper than calculating the exact distance.
+		"""
+
+		return self.get_compatibility_distance(other, threshold, config) < threshold
+
 	def get_node_layers(self, node_id_normalization=None):
 		"""
 		Returns an array which maps each node in the genome to a layer number if the genome would be
@@ -269,73 +599,54 @@ class Genome:
 		neural network generation
 		"""
 
-		use_normalization = node_id_normalization is not None
-
-		# Initially the nodes do not have a layer assigned to them
-		if use_normalization:
-			node_layer = [None] * len(self.nodes)
-		else:
-			node_layer = dict()
+		self.ensure_index()
 
-		# The input nodes and the bias node are the only nodes that we know the layer of initially
+		# The layer of a node is one more than the maximal layer of the nodes which flow into it. The
+		# input nodes and the bias node are the only nodes that we know the layer of initially, and a
+		# node with no incoming enabled connections is placed in the first layer.
+		node_layer = dict()
 		for i in range(self.num_inputs + 1):
-			node_layer[i] = 0
-
-		# We then figure out the layer of the nodes by iterating over the nodes we didn't assign a
-		# layer for yet. Because we do not allow recuring networks, there must be at least one node
-		# we can figure out the layer of by finding the maximal layer which flows to that node.
-		# It is not possible that every node has some node which flows into it and doesn't have an
-		# assigned layer yet, else this implies that a loop exists in the network. Because of this
-		# we know that after O(n) iterations (each one taking O(n) time) we will have figured out
-		# the layer of every node, so in total this will take O(n^2) time.
-
-		# This is the list of node indexes we did not asssign a layer to yet
-		nodes_to_place = list(range(self.num_inputs + 1, len(self.nodes)))
-
-		while len(nodes_to_place) > 0:
-			# As long as we did not assign a layer to every node, we try to find a node which we
-			# can assign a layer to
-			for loc, node_idx in enumerate(nodes_to_place):
-				node = self.nodes[node_idx]
-				finalized = True
-				max_prev_layer = 0
-
-				# For each connection going into this node, we find if it goes out of a node whose
-				# layer we have figured out already. If we did not, this node cannot be assigned a
-				# layer yet, but if it did, then its layer must be at least one more than the
-				# maximal layer of incoming nodes.
-				for conn in self.connections_by_out[node]:
-					if conn.disabled: continue
-
-					if use_normalization:
-						if node_layer[node_id_normalization[conn.in_node]] is None:
-							finalized = False
-							break
-						else:
-							max_prev_layer = max(max_prev_layer, node_layer[node_id_normalization[conn.in_node]])
-					else:
-						if conn.in_node not in node_layer:
-							finalized = False
-							break
-						else:
-							max_prev_layer = max(max_prev_layer, node_layer[conn.in_node])
-
-				if finalized:
-					# All incoming links are from finalized nodes, so we can assign the layer of
-					# this node
-					if use_normalization:
-						node_layer[node_id_normalization[node]] = max_prev_layer + 1
-					else:
-						node_layer[node] = max_prev_layer + 1
-					nodes_to_place.pop(loc)
-					break
-
-		return node_layer
-
-	def as_neural_network(self):
-		"""
-		Converts the genome into a simple feed-forward neural network
+			node_layer[self.nodes[i]] = 0
+
+		# We assign the layers in topological order (Kahn's algorithm): we count the number of enabled
+		# connections going into each node, and a node is finalized once all of them were processed.
+		# Because we do not allow recurrent networks, every node is eventually finalized, and each
+		# connection is only processed once.
+		outgoing = {node: [] for node in self.nodes}
+		pending_inputs = {node: 0 for node in self.nodes}
+		for in_node, out_node in self.links:
+			outgoing[in_node].append(out_node)
+			pending_inputs[out_node] += 1
+
+		ready = [node for node in self.nodes if pending_inputs[node] == 0]
+		max_prev_layer = {node: 0 for node in self.nodes}
+		while len(ready) > 0:
+			node = ready.pop()
+			if node not in node_layer:
+				node_layer[node] = max_prev_layer[node] + 1
+
+			for out_node in outgoing[node]:
+				max_prev_layer[out_node] = max(max_prev_layer[out_node], node_layer[node])
+				pending_inputs[out_node] -= 1
+				if pending_inputs[out_node] == 0:
+					ready.append(out_node)
+
+		if node_id_normalization is None:
+			return node_layer
+
+		normalized_layer = [None] * len(self.nodes)
+		for node, layer in node_layer.items():
+			normalized_layer[node_id_normalization[node]] = layer
+		return normalized_layer
+
+	def as_neural_network(self, simplify=True):
 		"""
+		Converts the genome into a simple feed-forward neural network. Unless `simplify` is False,
+		the parts of the network which don't affect its outputs are removed, see
+		`NeuralNetwork.simplified`.
+		"""
+
+		self.ensure_index()
 
 		# We generate a dictionary which maps the genome's node ids into their sequential index in
 		# the genome. This is done because the `NeuralNetwork` representation expects us to refer
@@ -361,119 +672,88 @@ class Genome:
 
 		# We then generate a connections representation which is useful for network evaluation:
 		# For each node we supply a list of connections which go into it
-		network_connections = [None]*len(self.nodes)
-		for node_id in self.connections_by_out:
+		network_connections = [[] for _ in range(len(self.nodes))]
+		for node_id, node_genes in self.genes_by_out.items():
 			# We normalize the node id
 			normal_node_id = node_id_normalization[node_id]
 
-			node_conns = self.connections_by_out[node_id]
-			network_connections[normal_node_id] = []
-
-			if node_conns is not None:
-				# For every enabled connection, we create a `NeuralConnection`, the light-weight
-				# structure the neural network implemention uses
-				for conn in node_conns:
-					if conn.disabled: continue
-					neural_conn = NeuralConnection(node_id_normalization[conn.in_node], conn.weight)
-					network_connections[normal_node_id].append(neural_conn)
+			# For every enabled connection, we create a `NeuralConnection`, the light-weight
+			# structure the neural network implemention uses
+			for gene_idx in node_genes:
+				if self.disabled[gene_idx]: continue
+				neural_conn = NeuralConnection(node_id_normalization[self.in_nodes[gene_idx]],
+					self.weights[gene_idx])
+				network_connections[normal_node_id].append(neural_conn)
 
 		# Construct the neural network
-		return NeuralNetwork(self.num_inputs, self.num_outputs, evaluation_order, network_connections)
+		network = NeuralNetwork(self.num_inputs, self.num_outputs, evaluation_order, network_connections)
+		if simplify:
+			network = network.simplified()
+		return network
 
 	@staticmethod
-	def from_crossover(parent_a, parent_b):
+	def from_crossover(parent_a, parent_b, rng=random):
 		"""
-		Creates a new genome by crossing over the the genomes of the two parents
+		Creates a new genome by crossing over the the genomes of the two parents. Matching genes are
+		picked randomly using `rng`.
 		"""
 
 		genome_a = parent_a.genome
 		genome_b = parent_b.genome
 
-		connections = []
-		connections_by_out = dict()
-		nodes = list(range(genome_a.num_inputs + 1 + genome_a.num_outputs))
-
 		parent_a_better = parent_a.fitness > parent_b.fitness
 		if parent_a.fitness == parent_b.fitness:
 			# We break fitness ties by picking the smaller parent to incentivize simpler networks
-			parent_a_better = len(genome_a.connections) < len(genome_b.connections)
-
-		gene_a = 0
-		gene_b = 0
-		while gene_a < len(genome_a.connections) or gene_b < len(genome_b.connections):
-			# Excess genes are the genes which do not match in the end, so if we ran out of genes
-			# in either genome, all the remaining genes are excess
-			if gene_a == len(genome_a.connections):
-				# We only inherit excess genes from the better parent
-				if parent_a_better:
-					break
-				new_gene = genome_b.connections[gene_b]
-				gene_b += 1
-				if new_gene.disabled:
-					continue
-			elif gene_b == len(genome_b.connections):
-				# We only inherit excess genes from the better parent
-				if not parent_a_better:
-					break
-				new_gene = genome_a.connections[gene_a]
-				gene_a += 1
-				if new_gene.disabled:
-					continue
-			else:
-				if genome_a.connections[gene_a].disabled:
-					gene_a += 1
-					continue
-				if genome_b.connections[gene_b].disabled:
-					gene_b += 1
-					continue
-
-				# The matching of the genes is done based on the innovation numbers which are
-				# essentially historical markings
-				innovation_a = genome_a.connections[gene_a].innovation_num
-				innovation_b = genome_b.connections[gene_b].innovation_num
-				if innovation_a == innovation_b:
-					# If we found a matching gene, we randomally pick a parent to inherit the gene
-					# from
-					if random.random() < 0.5:
-						new_gene = genome_a.connections[gene_a]
-					else:
-						new_gene = genome_b.connections[gene_b]
-
-					gene_a += 1
-					gene_b += 1
-				elif innovation_a < innovation_b:
-					new_gene = genome_a.connections[gene_a]
-					# If the numbers dont match up, then one of the genes is 'earlier' in history.
-					# We rely on this fact, because the genes are ordered in the list based on
-					# insertion time, so if a gene is older innovation wise, we know that we need
-					# to advance the gene index in that genome
-					gene_a += 1
-
-					# We only inherit disjoint genes from the better parent
-					if not parent_a_better:
-						continue
-				else:
-					new_gene = genome_b.connections[gene_b]
-					gene_b += 1
-
-					# We only inherit disjoint genes from the better parent
-					if parent_a_better:
-						continue
-
-			# We create a copy of the inherited gene, appending it to the connections list
-			new_gene = copy.deepcopy(new_gene)
-			connections.append(new_gene)
-			# We also update the connections_by_out dictionary
-			if new_gene.out_node in connections_by_out:
-				connections_by_out[new_gene.out_node].append(new_gene)
-			else:
-				connections_by_out[new_gene.out_node] = [new_gene]
+			parent_a_better = len(genome_a) < len(genome_b)
+
+		alignment = align_genomes(genome_a, genome_b)
 
-			# If either side of the inherited connection is a node we have not encountered before we
-			# add it to the node list
-			if new_gene.in_node not in nodes:
-				nodes.append(new_gene.in_node)
-			if new_gene.out_node not in nodes:
-				nodes.append(new_gene.out_node)
+		# We only inherit disjoint and excess genes from the better parent. Each inherited gene is
+		# recorded as a `(innovation_num, source_genome, gene_idx)` triplet
+		if parent_a_better:
+			better, unmatched = genome_a, alignment.disjoint_a + alignment.excess_a
+		else:
+			better, unmatched = genome_b, alignment.disjoint_b + alignment.excess_b
+		inherited = [(better.innovation_nums[gene_idx], better, gene_idx) for gene_idx in unmatched]
+
+		# If we found a matching gene, we randomally pick a parent to inherit the gene from. The
+		# matching genes are ordered by innovation number, so the random choices are made in the same
+		# order as when walking both genomes side by side
+		for gene_a, gene_b in zip(alignment.matching_a, alignment.matching_b):
+			if rng.random() < 0.5:
+				inherited.append((genome_a.innovation_nums[gene_a], genome_a, gene_a))
+			else:
+				inherited.append((genome_b.innovation_nums[gene_b], genome_b, gene_b))
+
+		# The child's genes are kept ordered by innovation number
+		inherited.sort(key=lambda gene: gene[0])
+
+		innovation_nums = array('q', [gene[0] for gene in inherited])
+		in_nodes = array('q', [source.in_nodes[gene_idx] for _, source, gene_idx in inherited])
+		out_nodes = array('q', [source.out_nodes[gene_idx] for _, source, gene_idx in inherited])
+		weights = array('d', [source.weights[gene_idx] for _, source, gene_idx in inherited])
+		# Only enabled genes are inherited
+		disabled = array('b', bytes(len(inherited)))
+
+		# The child has the input, bias and output nodes, and every node used by an inherited gene, in
+		# order of first appearance. `dict.fromkeys` keeps the order while dropping duplicates
+		num_fixed_nodes = genome_a.num_inputs + 1 + genome_a.num_outputs
+		node_order = dict.fromkeys(range(num_fixed_nodes))
+		for in_node, out_node in zip(in_nodes, out_nodes):
+			node_order[in_node] = None
+			node_order[out_node] = None
+		nodes = array('q', node_order)
+
+		return Genome.from_arrays(genome_a.num_inputs, genome_a.num_outputs, innovation_nums, in_nodes,
+			out_nodes, weights, disabled, nodes)
+
+def little_endian_bytes(typed_array):
+	"""
+	Returns the contents of `typed_array` as little-endian bytes, regardless of the machine's byte
+	order
+	"""
 
-		return Genome(genome_a.num_inputs, genome_a.num_outputs, connections, connections_by_out, nodes)
+	if sys.byteorder == 'big':
+		typed_array = typed_array[:]
+		typed_array.byteswap()
+	return typed_array.tobytes()
@@ -0,0 +1,109 @@
+import sys
+import struct
+from array import array
+
+from neat.genome import Genome, little_endian_bytes
+from neat.record_index import RecordWriter, read_record_index
+
+# Every record in the history data file starts with this header: the generation, the number of
+# fitness scores, and the length of the serialized champion genome
+RECORD_HEADER = struct.Struct('<qII')
+
+class HistoryWriter:
+	"""
+	Streams the history of an evolutionary run to disk: for every generation the fitness scores of
+	all organisms and a snapshot of the champion's genome. The data file is only ever appended to,
+	and an index file maps each generation to its record so the history can be read selectively.
+	"""
+
+	def __init__(self, filename):
+		# Opening in append mode means that a resumed run continues the existing history
+		self.writer = RecordWriter(filename)
+
+	def write_generation(self, generation, fitness, champion_genome):
+		"""
+		Appends the record of `generation`: the list of fitness scores `fitness` and a snapshot of the
+		genome `champion_genome`
+		"""
+
+		genome_bytes = champion_genome.to_bytes()
+		fitness_bytes = little_endian_bytes(array('d', fitness))
+
+		self.writer.write_record(generation, [RECORD_HEADER.pack(generation, len(fitness), len(genome_bytes)),
+			fitness_bytes, genome_bytes])
+
+	def close(self):
+		self.writer.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+class HistoryReader:
+	"""
+	Reads a history written by `HistoryWriter`. Only the index is loaded up front, records are read
+	from the data file on demand.
+	"""
+
+	def __init__(self, filename):
+		self.data_file = open(filename, 'rb')
+
+		# Maps each generation to the `(offset, length)` of its record
+		self.records = read_record_index(filename)
+
+	def generations(self):
+		"""
+		Returns a sorted list of the recorded generations
+		"""
+
+		return sorted(self.records)
+
+	def __len__(self):
+		return len(self.records)
+
+	def read_generation(self, generation):
+		"""
+		Reads the record of `generation`, returning a tuple of the fitness scores (as an array of
+		doubles) and the champion's `Genome`
+		"""
+
+		offset, length = self.records[generation]
+		self.data_file.seek(offset)
+		record = self.data_file.read(length)
+
+		_, num_fitness, genome_length = RECORD_HEADER.unpack_from(record)
+		fitness_start = RECORD_HEADER.size
+		genome_start = fitness_start + 8*num_fitness
+
+		fitness = array('d')
+		fitness.frombytes(record[fitness_start:genome_start])
+		if sys.byteorder == 'big':
+			fitness.byteswap()
+
+		champion = Genome.from_bytes(record[genome_start:genome_start + genome_length])
+		return (fitness, champion)
+
+	def read_fitness(self, generation):
+		"""
+		Reads the fitness scores of all organisms in `generation`
+		"""
+
+		return self.read_generation(generation)[0]
+
+	def read_champion(self, generation):
+		"""
+		Reads the genome of the most fit organism in `generation`
+		"""
+
+		return self.read_generation(generation)[1]
+
+	def close(self):
+		self.data_file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
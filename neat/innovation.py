@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+from neat.parameters import *
+
 @dataclass
 class Innovation:
 	# Whether this is a node mutation or a link mutation
@@ -18,3 +20,151 @@ class Innovation:
 
 	# The id assigned to the new node in a node innovation
 	new_node_id: int = None
+
+	# The last generation in which this innovation was created or reused
+	generation: int = None
+
+class InnovationRegistry:
+	"""
+	Tracks the recent topological innovations of a population, so that the same structural mutation
+	is assigned the same innovation numbers wherever it appears. Innovations are indexed by the split
+	connection's innovation number for node mutations and by `(in_node, out_node)` for link mutations.
+	"""
+
+	def __init__(self, retention=INNOVATION_RETENTION):
+		# The number of generations an innovation is kept after it was last used. With a retention of
+		# 0 only the innovations of the current generation are kept
+		self.retention = retention
+		self.generation = 0
+
+		self.node_innovations = dict()
+		self.link_innovations = dict()
+
+	def find_node_innovation(self, old_innov_num):
+		"""
+		Returns the innovation of splitting the connection with innovation number `old_innov_num`, or
+		None if there is no such recent innovation
+		"""
+
+		return self.node_innovations.get(old_innov_num)
+
+	def find_link_innovation(self, in_node, out_node):
+		"""
+		Returns the innovation of linking `in_node` to `out_node`, or None if there is no such recent
+		innovation
+		"""
+
+		return self.link_innovations.get((in_node, out_node))
+
+	def record(self, innovation):
+		"""
+		Records a new innovation made in the current generation
+		"""
+
+		innovation.generation = self.generation
+		if innovation.is_node_mutation:
+			self.node_innovations[innovation.old_innov_num] = innovation
+		else:
+			self.link_innovations[(innovation.node_start_id, innovation.node_end_id)] = innovation
+
+	def touch(self, innovation):
+		"""
+		Marks that `innovation` was reused in the current generation, which extends its retention
+		"""
+
+		innovation.generation = self.generation
+
+	def advance_generation(self):
+		"""
+		Moves the registry to the next generation, forgetting innovations which were not used in the
+		last `retention` generations
+		"""
+
+		self.generation += 1
+		oldest_kept = self.generation - self.retention
+
+		for innovations in (self.node_innovations, self.link_innovations):
+			expired = [key for key, innov in innovations.items() if innov.generation < oldest_kept]
+			for key in expired:
+				del innovations[key]
+
+	def resolve(self, genome, pending_innovations, global_innovation_counter, global_node_counter):
+		"""
+		Assigns real innovation numbers and node ids to the structural mutations recorded in
+		`pending_innovations` (a `PendingInnovations`) and replaces the placeholders in `genome`.
+		Resolving the offspring of a generation in a fixed order makes the assigned numbers independent
+		of where and in which order the offspring were generated.
+		"""
+
+		if len(pending_innovations.innovations) == 0:
+			return
+
+		genome_nodes = set(genome.nodes)
+		id_map = dict()
+		for pending in pending_innovations.innovations:
+			if pending.is_node_mutation:
+				# The same rules as in `Genome.mutate` apply: a recent innovation is reused, unless the
+				# genome already has its node
+				innov = self.find_node_innovation(pending.old_innov_num)
+				if innov is not None and innov.new_node_id not in genome_nodes:
+					self.touch(innov)
+				else:
+					new_innov = Innovation(True, pending.old_innov_num, None, None,
+						global_innovation_counter.next_id(), global_innovation_counter.next_id(),
+						global_node_counter.next_id())
+					if innov is None:
+						self.record(new_innov)
+					innov = new_innov
+
+				id_map[pending.new_innov_num] = innov.new_innov_num
+				id_map[pending.new_innov_num2] = innov.new_innov_num2
+				id_map[pending.new_node_id] = innov.new_node_id
+			else:
+				innov = self.find_link_innovation(pending.node_start_id, pending.node_end_id)
+				if innov is not None:
+					self.touch(innov)
+				else:
+					innov = Innovation(False, None, pending.node_start_id, pending.node_end_id,
+						global_innovation_counter.next_id())
+					self.record(innov)
+
+				id_map[pending.new_innov_num] = innov.new_innov_num
+
+		genome.replace_placeholder_ids(id_map)
+
+	def __len__(self):
+		return len(self.node_innovations) + len(self.link_innovations)
+
+class PendingInnovations:
+	"""
+	Stands in for both the `InnovationRegistry` and the global innovation/node counters when
+	offspring are generated away from the population (e.g. in a worker process). Every structural
+	mutation is recorded and given placeholder ids, which are negative so they can't collide with
+	real ids. The placeholders are later replaced by `InnovationRegistry.resolve`.
+	"""
+
+	def __init__(self):
+		self.next_placeholder = -1
+		self.innovations = []
+
+	def next_id(self):
+		"""
+		Returns the next placeholder id
+		"""
+
+		self.next_placeholder -= 1
+		return self.next_placeholder + 1
+
+	def find_node_innovation(self, old_innov_num):
+		# Innovations are only matched when they are resolved
+		return None
+
+	def find_link_innovation(self, in_node, out_node):
+		# Innovations are only matched when they are resolved
+		return None
+
+	def record(self, innovation):
+		self.innovations.append(innovation)
+
+	def touch(self, innovation):
+		pass
@@ -1,4 +1,5 @@
 import math
+from neat.neural_connection import NeuralConnection
 
 class NeuralNetwork:
 	"""
@@ -51,6 +52,71 @@ class NeuralNetwork:
 		# values is exactly the output values
 		return node_values[self.num_inputs+1:][:self.num_outputs]
 
+	def simplified(self):
+		"""
+		Returns a network which computes exactly the same outputs (up to floating-point rounding), but
+		without the parts of this network which don't contribute to them: nodes which can't reach an
+		output are dropped, nodes which don't depend on any input (only on the bias, or on nothing)
+		are folded into constants, and parallel connections between the same pair of nodes are
+		merged. The cost of evaluating the result depends only on the functional size of the network.
+		"""
+
+		bias_node = self.num_inputs
+		first_hidden_node = self.num_inputs + 1 + self.num_outputs
+
+		# We find the nodes which can reach an output by going backwards over the evaluation order, so
+		# every node is visited after all the nodes it flows into
+		reaches_output = set(range(bias_node + 1, first_hidden_node))
+		for node in reversed(self.evaluation_order):
+			if node in reaches_output:
+				for conn in self.connections[node]:
+					reaches_output.add(conn.in_node)
+
+		# A node whose incoming nodes are all constant is constant itself, so we calculate its value
+		# once here instead of every evaluation. The bias node is the only constant we start with, and
+		# a node without incoming connections is constant as well
+		constant_value = {bias_node: 1}
+		for node in self.evaluation_order:
+			if node not in reaches_output: continue
+			if all(conn.in_node in constant_value for conn in self.connections[node]):
+				node_sum = 0
+				for conn in self.connections[node]:
+					node_sum += constant_value[conn.in_node]*conn.weight
+				constant_value[node] = sigmoid(node_sum)
+
+		# The inputs, bias and outputs keep their ids, and the hidden nodes which are left are given
+		# new sequential ids
+		new_ids = {node: node for node in range(first_hidden_node)}
+		for node in self.evaluation_order:
+			if node >= first_hidden_node and node in reaches_output and node not in constant_value:
+				new_ids[node] = len(new_ids)
+
+		evaluation_order = []
+		connections = [[] for _ in range(len(new_ids))]
+		for node in self.evaluation_order:
+			# Nodes which don't reach an output, and constant hidden nodes are no longer evaluated
+			if node not in new_ids: continue
+
+			# The constant incoming nodes are folded into a single connection from the bias node, and
+			# parallel connections are merged by summing their weights
+			node_weights = dict()
+			constant_sum = 0
+			for conn in self.connections[node]:
+				if conn.in_node in constant_value:
+					constant_sum += constant_value[conn.in_node]*conn.weight
+				else:
+					in_node = new_ids[conn.in_node]
+					node_weights[in_node] = node_weights.get(in_node, 0) + conn.weight
+			if constant_sum != 0:
+				node_weights[bias_node] = constant_sum
+
+			evaluation_order.append(new_ids[node])
+			# A connection with a weight of zero has no effect on the weighted sum
+			connections[new_ids[node]] = [NeuralConnection(in_node, weight)
+				for in_node, weight in node_weights.items() if weight != 0]
+
+		return NeuralNetwork(self.num_inputs, self.num_outputs, evaluation_order, connections)
+
 def sigmoid(x):
 	"""
 	Calculates a tight sigmoid function of x
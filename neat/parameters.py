@@ -14,3 +14,5 @@ MUTATION_AFTER_CROSSOVER = 0.8
 NODE_MUTATION_CHANCE = 0.03
 LINK_MUTATION_CHANCE = 0.3
 SURVIVAL_THRESHOLD = 0.2
+INNOVATION_RETENTION = 0
+REPRODUCTION_WORKERS = 1
@@ -1,30 +1,71 @@
+import random
+import math
+import multiprocessing
+
 from neat.genome import Genome
+from neat.innovation import InnovationRegistry
 from neat.organism import Organism
-from neat.species import Species
+from neat.species import Species, ReproductionTask, reproduce_offspring, get_champions
 from neat.unique_id import UniqueId
-from neat.parameters import *
+from neat.config import DEFAULT_CONFIG
+
+# The size of the range of innovation numbers and node ids reserved for each id namespace
+ID_NAMESPACE_SIZE = 2**40
 
 class Population:
 	"""
 	Represents the collection of organsims which make up a generation
 	"""
 
-	def __init__(self, population_size, num_inputs, num_outputs):
+	def __init__(self, population_size, num_inputs, num_outputs, seed=None, num_workers=None,
+		id_namespace=0, config=DEFAULT_CONFIG):
 		self.population_size = population_size
 
+		# All the parameters of the algorithm are taken from the `NEATConfig` `config`, so populations
+		# with different parameters can evolve side by side
+		self.config = config
+
+		# All the randomness of the run is derived from `seed`, so a run with a given seed is
+		# reproducible regardless of `num_workers`
+		if seed is None:
+			seed = random.randrange(2**63)
+		self.seed = seed
+		self.rng = random.Random(seed)
+		self.generation = 0
+
+		# The number of processes offspring are generated in during `epoch`. The pool of worker
+		# processes is created lazily
+		if num_workers is None:
+			num_workers = config.reproduction_workers
+		self.num_workers = num_workers
+		self.worker_pool = None
+
 		# We initially create random-weighted organisms
 		self.organisms = []
 		for _ in range(population_size):
-			self.organisms.append(Organism(Genome(num_inputs, num_outputs)))
+			self.organisms.append(Organism(Genome(num_inputs, num_outputs, rng=self.rng)))
+
+		# Populations which exchange genomes (e.g. islands) must not assign the same innovation number
+		# or node id to different innovations, so each one allocates new ids from its own namespace.
+		# Only the initial nodes and connections, which are the same in all genomes, are shared.
+		id_offset = id_namespace * ID_NAMESPACE_SIZE
 
 		# The global innovation counter is used to assign unique ids to innovations across generations
-		self.global_innovation_counter = UniqueId(num_outputs)
+		self.global_innovation_counter = UniqueId(id_offset + num_outputs)
 		# The global node counter is used to assign unique ids to nodes across organisms
-		self.global_node_counter = UniqueId(num_inputs + 1 + num_outputs)
+		self.global_node_counter = UniqueId(id_offset + num_inputs + 1 + num_outputs)
 		# The global species counter is used to assign unique ids to species across generations
 		self.global_species_counter = UniqueId()
+		# The innovation registry is used to give matching innovation numbers to identical structural
+		# mutations, it optionally remembers innovations across generations
+		self.innovations = InnovationRegistry(config.innovation_retention)
 
 		self.species = []
+		# Caches whether a genome (by content key) is compatible with a species (by id)
+		self.compatibility_cache = dict()
+
+		# The number of offspring bred one at a time in steady-state evolution
+		self.steady_state_births = 0
 
 	def speciate(self):
 		"""
@@ -36,13 +77,28 @@ class Population:
 		for species in self.species:
 			species.organisms.clear()
 
+		# Species representatives never change, so whether a genome is compatible with a species
+		# depends only on the genome's content. We cache the comparisons made this generation so that
+		# unmodified clones (e.g. carried-over champions) don't need to be compared again next
+		# generation. Only this generation's comparisons are kept, so the cache stays bounded.
+		compatibility_cache = dict()
+
 		for organism in self.organisms:
 			# For each organism we try to find a species whose representative is close enough
 			found_species = False
+			content_key = organism.genome.get_content_key()
 			for s_idx, species in enumerate(self.species):
-				# Calculate how compatible the species representative is to our organism
-				compat_dist = organism.genome.get_compatibility_distance(species.representative)
-				if compat_dist < SPECIATION_THRESHOLD:
+				# Check whether the species representative is compatible with our organism. We only need
+				# to know if the distance is below the threshold, which is cheaper than the exact
+				# distance
+				cache_key = (content_key, species.id)
+				is_compatible = self.compatibility_cache.get(cache_key)
+				if is_compatible is None:
+					is_compatible = organism.genome.is_compatible(species.representative,
+						self.config.speciation_threshold, self.config)
+				compatibility_cache[cache_key] = is_compatible
+
+				if is_compatible:
 					# If it is below the threshold, then the organism belongs to this species
 					found_species = True
 					species.organisms.append(organism)
@@ -56,6 +112,8 @@ class Population:
 				organism.species = len(self.species)
 				self.species.append(Species(organism, self.global_species_counter))
 
+		self.compatibility_cache = compatibility_cache
+
 		# Remove species which have no organisms in this population. We iterate backwards so we can
 		# delete from the list while iterating
 		for i in range(len(self.species)-1, -1, -1):
@@ -83,18 +141,13 @@ class Population:
 
 
 		average_fitness = self.calc_average_fitness()
-		for organism in self.organisms:
-			# For each organism, the proportion of expected offstring is the ratio between its
-			# fitness and the average fitness across the entire population. This way offspring is
-			# distributed with proprtion to fitness.
-			organism.expected_offspring = organism.adjusted_fitness/average_fitness
 
 		total_expected_offspring = 0
 		fractional_leftover = 0
 		for species in self.species:
 			# For each species, calculate the expected offstring given the last leftover, and update
 			# it to the new leftover
-			fractional_leftover = species.calculate_expected_offspring(fractional_leftover)
+			fractional_leftover = species.calculate_expected_offspring(average_fitness, fractional_leftover)
 			# Add the the offstring to the total count
 			total_expected_offspring += species.expected_offspring
 
@@ -118,22 +171,163 @@ class Population:
 			# Add the extra child to the best species
 			self.species[best_species].expected_offspring += self.population_size - total_expected_offspring
 
-		new_generation = []
-		cur_gen_innovations = []
+		# All the tasks share the same list of champions, so it is only pickled once per chunk of tasks
+		# sent to a worker
+		champions = get_champions(self.species)
+
+		tasks = []
 		for species in self.species:
 			# For each species, we eliminate the organisms unfit to be parents
-			species.eliminate_unfit()
+			species.eliminate_unfit(self.config)
+
+			tasks.append(species.get_reproduction_task(self, champions))
 
-			new_generation.extend(species.reproduce(self, cur_gen_innovations))
+		# The offspring of each species are generated independently, possibly in worker processes. We
+		# send the tasks in one chunk per worker to minimize the communication
+		if self.num_workers > 1:
+			chunk_size = math.ceil(len(tasks) / self.num_workers)
+			species_offspring = self.get_worker_pool().map(reproduce_offspring, tasks, chunk_size)
+		else:
+			species_offspring = map(reproduce_offspring, tasks)
+
+		# The structural mutations of the offspring are only given real innovation numbers now, in the
+		# order of the offspring, so the numbering doesn't depend on the number of workers
+		new_generation = []
+		for offspring in species_offspring:
+			for genome, pending_innovations in offspring:
+				self.innovations.resolve(genome, pending_innovations, self.global_innovation_counter,
+					self.global_node_counter)
+				new_generation.append(genome)
+
+		# Innovations which were not reused recently are forgotten
+		self.innovations.advance_generation()
+		self.generation += 1
 
 		self.organisms = [Organism(genome) for genome in new_generation]
 
+	def replace_worst_organism(self):
+		"""
+		Steady-state (rtNEAT) evolution step: removes the least fit organism out of the organisms
+		which were already evaluated, i.e. have a fitness, and breeds a single offspring in its place.
+		Organisms which were not evaluated yet are never removed. Returns the new organism.
+		Assumption: the population was speciated, and at least one organism was evaluated.
+		"""
+
+		# The worst organism is the one with the lowest adjusted (shared) fitness. We only remove it
+		# after breeding, so that there is always at least one evaluated parent
+		worst = None
+		for species in self.species:
+			for organism in species.organisms:
+				if organism.fitness is None: continue
+				adjusted_fitness = organism.fitness / len(species.organisms)
+				if worst is None or adjusted_fitness < worst[0]:
+					worst = (adjusted_fitness, species, organism)
+
+		# Only the evaluated organisms of each species can be parents
+		breeding_species = []
+		for species in self.species:
+			parents = [organism for organism in species.organisms if organism.fitness is not None]
+			if len(parents) == 0: continue
+			parents.sort(key=lambda x: x.fitness, reverse=True)
+			breeding_species.append((species, parents))
+
+		# Each offspring gets its own random stream, just like in `epoch`
+		seed = f'{self.seed}:steady:{self.steady_state_births}'
+		rng = random.Random(seed)
+
+		# The parent species is chosen with probability proportional to the average fitness of its
+		# evaluated organisms, which is the rtNEAT equivalent of the species' share of offspring
+		average_fitness = [sum(x.fitness for x in parents)/len(parents) for _, parents in breeding_species]
+		species, parents = rng.choices(breeding_species, weights=average_fitness)[0]
+
+		champions = [(species.id, parents[0]) for species, parents in breeding_species]
+		task = ReproductionTask(species.id, parents, 1, champions, seed, self.config)
+		genome, pending_innovations = reproduce_offspring(task)[0]
+		self.innovations.resolve(genome, pending_innovations, self.global_innovation_counter,
+			self.global_node_counter)
+
+		_, worst_species, worst_organism = worst
+		remove_by_identity(worst_species.organisms, worst_organism)
+		remove_by_identity(self.organisms, worst_organism)
+		if len(worst_species.organisms) == 0:
+			remove_by_identity(self.species, worst_species)
+
+		offspring = Organism(genome)
+		self.organisms.append(offspring)
+		self.assign_species(offspring)
+
+		# Every `population_size` births are the steady-state equivalent of a generation
+		self.steady_state_births += 1
+		if self.steady_state_births % self.population_size == 0:
+			self.innovations.advance_generation()
+			self.generation += 1
+
+		return offspring
+
+	def assign_species(self, organism):
+		"""
+		Adds `organism` to the first species it is compatible with, or to a new species if it isn't
+		compatible with any of them
+		"""
+
+		for s_idx, species in enumerate(self.species):
+			if organism.genome.is_compatible(species.representative, self.config.speciation_threshold,
+				self.config):
+				species.organisms.append(organism)
+				organism.species = s_idx
+				return
+
+		organism.species = len(self.species)
+		self.species.append(Species(organism, self.global_species_counter))
+
+	def accept_migrants(self, genomes):
+		"""
+		Adds the genomes `genomes` which come from another population to this population, replacing
+		the last organisms of the current generation
+		"""
+
+		for i, genome in enumerate(genomes):
+			self.organisms[len(self.organisms) - 1 - i] = Organism(genome)
+
+	def get_worker_pool(self):
+		"""
+		Returns the pool of worker processes used for reproduction, creating it if needed
+		"""
+
+		if self.worker_pool is None:
+			self.worker_pool = multiprocessing.Pool(self.num_workers)
+		return self.worker_pool
+
+	def close(self):
+		"""
+		Shuts down the worker processes of the population, if any were started
+		"""
+
+		if self.worker_pool is not None:
+			self.worker_pool.close()
+			self.worker_pool.join()
+			self.worker_pool = None
+
+	def __getstate__(self):
+		# A pool of processes can't be pickled, a new one is created when needed
+		state = self.__dict__.copy()
+		state['worker_pool'] = None
+		return state
+
 	def calc_average_fitness(self):
 		"""
-		Calculates the average (adjusted) fitness across all organisms in the population
+		Calculates the average (adjusted) fitness across all organisms in the population.
+		Assumption: the fitness of each species was adjusted.
 		"""
-		total_fitness = 0
-		for organism in self.organisms:
-			total_fitness += organism.adjusted_fitness
 
-		return total_fitness/self.population_size
+		return math.fsum(species.total_adjusted_fitness for species in self.species)/self.population_size
+
+def remove_by_identity(items, item):
+	"""
+	Removes `item` from the list `items`, comparing by identity rather than equality
+	"""
+
+	for idx, cur_item in enumerate(items):
+		if cur_item is item:
+			items.pop(idx)
+			return
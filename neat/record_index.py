@@ -0,0 +1,69 @@
+import struct
+
+# Every entry in the index file is the generation, and the offset and length of its record in the
+# data file
+INDEX_ENTRY = struct.Struct('<qQQ')
+
+def get_index_filename(filename):
+	"""
+	Returns the name of the index file of the data file `filename`
+	"""
+
+	return filename + '.idx'
+
+class RecordWriter:
+	"""
+	Appends a record per generation to a data file, which is only ever appended to, and an entry
+	for every record to an index file, which maps each generation to its record so the records can
+	be read selectively. Used for the history and the recorded trajectories.
+	"""
+
+	def __init__(self, filename):
+		# Opening in append mode means that a resumed run continues the existing records
+		self.data_file = open(filename, 'ab')
+		self.index_file = open(get_index_filename(filename), 'ab')
+
+	def write_record(self, generation, parts, alignment=1):
+		"""
+		Appends the record of `generation`, made of the list of byte strings `parts`, padded to a
+		multiple of `alignment` bytes
+		"""
+
+		offset = self.data_file.tell()
+		for part in parts:
+			self.data_file.write(part)
+		self.data_file.write(bytes(-self.data_file.tell() % alignment))
+		self.data_file.flush()
+
+		# The index entry is only written once the record is complete, so a record which was cut short
+		# by a crash is never referenced
+		length = self.data_file.tell() - offset
+		self.index_file.write(INDEX_ENTRY.pack(generation, offset, length))
+		self.index_file.flush()
+
+	def close(self):
+		self.data_file.close()
+		self.index_file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+def read_record_index(filename):
+	"""
+	Reads the index of the data file `filename`. Returns a dictionary which maps each generation to
+	the `(offset, length)` of its record. If a generation was recorded more than once (e.g. after
+	resuming from a checkpoint), the latest record is used.
+	"""
+
+	with open(get_index_filename(filename), 'rb') as index_file:
+		index_data = index_file.read()
+
+	records = dict()
+	# A partially written trailing entry is ignored
+	usable_length = len(index_data) - len(index_data) % INDEX_ENTRY.size
+	for generation, offset, length in INDEX_ENTRY.iter_unpack(index_data[:usable_length]):
+		records[generation] = (offset, length)
+	return records
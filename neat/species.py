@@ -1,8 +1,13 @@
 import random
 import math
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from dataclasses import dataclass
 
 from neat.genome import Genome
-from neat.parameters import *
+from neat.innovation import PendingInnovations
+from neat.config import DEFAULT_CONFIG
 
 class Species:
 	def __init__(self, representative_organism, global_species_counter):
@@ -10,6 +15,11 @@ class Species:
 		self.representative = representative_organism.genome
 		self.organisms = [representative_organism]
 
+		# The fitness of each organism, in the same order as `organisms`, and the sum of the adjusted
+		# fitness of the organisms. The offspring bookkeeping works on these instead of the organisms.
+		self.fitness = None
+		self.total_adjusted_fitness = None
+
 		self.expected_offspring = None
 
 	def rank_organisms(self):
@@ -18,34 +28,37 @@ class Species:
 		"""
 
 		self.organisms.sort(key=lambda x: x.fitness, reverse=True)
+		self.fitness = array('d', [organism.fitness for organism in self.organisms])
 
 	def adjust_fitness(self):
 		"""
-		Calculates an adjusted fitness for each organism in the species which takes into account
-		different factors which should contribute to faster growth
+		Calculates the total adjusted fitness of the species, which takes into account different
+		factors which should contribute to faster growth. Assumption: organisms are already ranked.
 		"""
 
-		for organism in self.organisms:
-			# For each organism in the species we calculate the 'shared' fitness
-			organism.adjusted_fitness = organism.fitness / len(self.organisms)
+		# The adjusted ('shared') fitness of an organism is its fitness divided by the size of its
+		# species, so the species' total is its total fitness divided by its size
+		self.total_adjusted_fitness = math.fsum(self.fitness) / len(self.fitness)
 
-	def eliminate_unfit(self):
+	def eliminate_unfit(self, config=DEFAULT_CONFIG):
 		"""
-		Discards all organisms in this species whose fitness lands them below the
-		`SURVIVAL_THRESHOLD`. Assumption: organisms are already sorted by fitness.
+		Discards all organisms in this species whose fitness lands them below the survival threshold
+		of the `NEATConfig` `config`. Assumption: organisms are already ranked.
 		"""
 
 		# Calculate the number of organisms that will survive to have offspring, adding 1 ensures
 		# that at least one will survive
-		num_parents = math.floor(SURVIVAL_THRESHOLD * len(self.organisms)) + 1
+		num_parents = math.floor(config.survival_threshold * len(self.organisms)) + 1
 
 		# We then only keep the `num_parents` most fit organisms in the species (organisms are
 		# already sorted by fitness)
 		self.organisms = self.organisms[:num_parents]
+		self.fitness = self.fitness[:num_parents]
 
-	def calculate_expected_offspring(self, fractional_leftover):
+	def calculate_expected_offspring(self, average_fitness, fractional_leftover):
 		"""
-		Calculates the total expected offspring of this species, the result is stored internally.
+		Calculates the total expected offspring of this species, given the `average_fitness` (adjusted)
+		fitness across the population, the result is stored internally.
 		The parameter `fractional_leftover` is the fractional (<1) carry from previous species,
 		which can be used by this species to complete a fractional amount.
 		The return value is the next fractional carry.
@@ -54,10 +67,9 @@ class Species:
 		# The purpose of a fractional carry is to 'spread' the extras across all species, and not
 		# just add all the extra fractional parts to the best species at the end
 
-		# Calculate the sum of expected offstring for each organism in the species
-		expected_offspring = 0
-		for organism in self.organisms:
-			expected_offspring += organism.expected_offspring
+		# The expected offspring of each organism is the ratio between its adjusted fitness and the
+		# average fitness, so the species expects the ratio of its total adjusted fitness
+		expected_offspring = self.total_adjusted_fitness / average_fitness
 
 		# This is the fractional part of the number of expected offspring
 		fractional_part = expected_offspring - math.floor(expected_offspring)
@@ -75,91 +87,158 @@ class Species:
 		# Return the carry
 		return fractional_leftover
 
-	def choose_parent_proportionally(self, total_fitness):
+	def choose_parent_proportionally(self, rng=random):
 		"""
 		Choose a random parent with a greater chance for more fit parents. This is done based on a
 		'roulette wheel' method, where the slot's width is proportional to the relative fitness.
 		The returned value is the index of the organism in the `organisms` list.
 		"""
 
-		# This is the 'spinning' of the wheel: We choose the point along the entire fitness spectrum
-		# where the ball lands
-		ball_land_point = random.random() * total_fitness
+		return choose_parent_proportionally(list(accumulate(self.fitness)), rng)
+
+	def get_reproduction_task(self, population, champions=None):
+		"""
+		Packs everything needed to generate the species' offspring into a `ReproductionTask`, which
+		can be carried out in another process. `champions` is the list of `(species_id, organism)`
+		tuples of the population's species' champions, it is computed if not supplied.
+		Assumption: The unfit organisms were already eliminated, and the organisms are sorted by
+		fitness.
+		"""
+
+		# The other species' champions are the candidates for inter-species mating
+		if champions is None:
+			champions = get_champions(population.species)
 
-		# We then go through the wheel to find which organism's slot the ball landed in
-		cur_organism_index = 0
-		accumulated_fitness = self.organisms[0].fitness
-		while accumulated_fitness < ball_land_point:
-			# While the ball land point is still beyond the end of the current slot, we go on to the
-			# next organism slot
-			cur_organism_index += 1
-			accumulated_fitness += self.organisms[cur_organism_index].fitness
+		# Every offspring gets its own random stream derived from the run's seed, the generation and
+		# the species, so the result doesn't depend on how the work is split up
+		seed = f'{population.seed}:{population.generation}:{self.id}'
 
-		return cur_organism_index
+		return ReproductionTask(self.id, self.organisms, self.expected_offspring, champions, seed,
+			population.config)
 
-	def reproduce(self, population, cur_gen_innovations):
+	def reproduce(self, population):
 		"""
-		Generates the species' organisms' expected number of offspring.
+		Generates the species' organisms' expected number of offspring in-process. Returns a list of
+		`(genome, pending_innovations)` tuples, see `reproduce_offspring`.
 		Assumption: The species in the population are sorted by fitness, the organisms in each
 		species are sorted by fitness.
 		"""
 
-		offspring = []
-
-		# We compute the total fitness once for use during reproduction
-		total_fitness = 0
-		for organism in self.organisms:
-			total_fitness += organism.fitness
+		return reproduce_offspring(self.get_reproduction_task(population))
+
+@dataclass
+class ReproductionTask:
+	# The id of the reproducing species
+	species_id: int
+
+	# The organisms which may be parents, sorted by fitness
+	organisms: list
+
+	# The number of offspring to generate
+	expected_offspring: int
+
+	# A list of `(species_id, champion_organism)` tuples of all species, for inter-species mating
+	champions: list
+
+	# The seed the random stream of each offspring is derived from
+	seed: str
+
+	# The `NEATConfig` of the reproducing population
+	config: object = DEFAULT_CONFIG
+
+def get_champions(species_list):
+	"""
+	Returns a list of `(species_id, champion_organism)` tuples for the species in `species_list`.
+	Assumption: the organisms in each species are sorted by fitness.
+	"""
+
+	return [(species.id, species.organisms[0]) for species in species_list]
+
+def choose_parent_proportionally(cumulative_fitness, rng=random):
+	"""
+	Choose a random parent with a greater chance for more fit parents, see
+	`Species.choose_parent_proportionally`. `cumulative_fitness` is the running total of the fitness
+	of the candidate parents, i.e. the end of each organism's slot on the wheel.
+	"""
+
+	# This is the 'spinning' of the wheel: We choose the point along the entire fitness spectrum
+	# where the ball lands
+	ball_land_point = rng.random() * cumulative_fitness[-1]
+
+	# The ball landed in the first slot which ends at or after the land point, which we find with a
+	# binary search instead of going through the slots one by one
+	return bisect_left(cumulative_fitness, ball_land_point)
+
+def reproduce_offspring(task):
+	"""
+	Generates the offspring described by the `ReproductionTask` `task`. This only depends on the task,
+	so it can run in a worker process.
+	Returns a list of `(genome, pending_innovations)` tuples, where `pending_innovations` are the
+	structural mutations of the genome which still need to be resolved, see
+	`InnovationRegistry.resolve`.
+	"""
+
+	organisms = task.organisms
+	config = task.config
+	offspring = []
+
+	# We compute the roulette wheel once for use during reproduction
+	cumulative_fitness = list(accumulate(organism.fitness for organism in organisms))
+
+	for i in range(task.expected_offspring):
+		rng = random.Random(f'{task.seed}:{i}')
+		pending_innovations = PendingInnovations()
+
+		if i == 0 and task.expected_offspring > 5:
+			# If we expect more than 5 offspring, we want to ensure that the champion is carried
+			# over to the next generation, so the first offspring is just a clone of the champion
+			offspring.append((organisms[0].genome.clone(), pending_innovations))
+
+		elif len(organisms) == 1 or rng.random() < config.mutation_only_offspring:
+			# We decide by chance if we want to produce the next generation by mutating the
+			# parents, or by cross-over. If there is only one parent, we can't cross-over anyway
+
+			# We choose the parent to mutate
+			parent_index = choose_parent_proportionally(cumulative_fitness, rng)
+			# And then clone and mutate it
+			mutated_offspring = organisms[parent_index].genome.clone()
+			mutated_offspring.mutate(pending_innovations, pending_innovations, pending_innovations, rng,
+				config)
+			offspring.append((mutated_offspring, pending_innovations))
+
+		else:
+			# In this case we want to cross over, so we need to pick two parents
+			first_parent = organisms[choose_parent_proportionally(cumulative_fitness, rng)]
+
+			# Check that there are other species, and roll the dice to decide if we do
+			# inter-species mating
+			if len(task.champions) > 1 and rng.random() < config.interspecies_mating_rate:
+				# In the (rare) case the cross over is inter-species, we need to pick a parent
+				# from the entire population, we first choose a random species
+				# We just try a to pick a random species a few times to get a random species
+				# which is not us: if we fail, this will just result in intra-species mating
+				# which is fine. (The likelyhood of that is small)
+				for _ in range(6):
+					other_species_id, other_champion = rng.choice(task.champions)
+					if other_species_id == task.species_id:
+						continue
+
+				# We pick the most fit parent from the other species
+				second_parent = other_champion
+			else:
+				# This is intra-species mating, so we just pick a second parent normally
+				second_parent = organisms[choose_parent_proportionally(cumulative_fitness, rng)]
 
-		for i in range(self.expected_offspring):
-			if i == 0 and self.expected_offspring > 5:
-				# If we expect more than 5 offspring, we want to ensure that the champion is carried
-				# over to the next generation, so the first offspring is just a clone of the champion
-				offspring.append(self.organisms[0].genome.clone())
+			new_offspring = Genome.from_crossover(first_parent, second_parent, rng)
 
-			elif len(self.organisms) == 1 or random.random() < MUTATION_ONLY_OFFSPRING:
-				# We decide by chance if we want to produce the next generation by mutating the
-				# parents, or by cross-over. If there is only one parent, we can't cross-over anyway
+			# We also decide by chance if to further mutate the result of the crossover. In the
+			# case we randomly picked the same parent twice, we always mutate (we detect this by
+			# checking if the compatability distance between the parents is zero)
+			parent_compat_dist = first_parent.genome.get_compatibility_distance(second_parent.genome, config=config)
+			if rng.random() < config.mutation_after_crossover or parent_compat_dist == 0:
+				new_offspring.mutate(pending_innovations, pending_innovations, pending_innovations, rng,
+					config)
 
-				# We choose the parent to mutate
-				parent_index = self.choose_parent_proportionally(total_fitness)
-				# And then clone and mutate it
-				mutated_offspring = self.organisms[parent_index].genome.clone()
-				mutated_offspring.mutate(cur_gen_innovations, population.global_innovation_counter, population.global_node_counter)
-				offspring.append(mutated_offspring)
+			offspring.append((new_offspring, pending_innovations))
 
-			else:
-				# In this case we want to cross over, so we need to pick two parents
-				first_parent = self.organisms[self.choose_parent_proportionally(total_fitness)]
-
-				# Check that there are other species, and roll the dice to decide if we do
-				# inter-species mating
-				if len(population.species) > 1 and random.random() < INTERSPECIES_MATING_RATE:
-					# In the (rare) case the cross over is inter-species, we need to pick a parent
-					# from the entire population, we first choose a random species
-					# We just try a to pick a random species a few times to get a random species
-					# which is not us: if we fail, this will just result in intra-species mating
-					# which is fine. (The likelyhood of that is small)
-					for _ in range(6):
-						other_species = random.choice(population.species)
-						if other_species.id == self.id:
-							continue
-
-					# We pick the most fit parent from the other species
-					second_parent = other_species.organisms[0]
-				else:
-					# This is intra-species mating, so we just pick a second parent normally
-					second_parent = self.organisms[self.choose_parent_proportionally(total_fitness)]
-
-				new_offspring = Genome.from_crossover(first_parent, second_parent)
-
-				# We also decide by chance if to further mutate the result of the crossover. In the
-				# case we randomly picked the same parent twice, we always mutate (we detect this by
-				# checking if the compatability distance between the parents is zero)
-				parent_compat_dist = first_parent.genome.get_compatibility_distance(second_parent.genome)
-				if random.random() < MUTATION_AFTER_CROSSOVER or parent_compat_dist == 0:
-					new_offspring.mutate(cur_gen_innovations, population.global_innovation_counter, population.global_node_counter)
-
-				offspring.append(new_offspring)
-
-		return offspring
+	return offspring
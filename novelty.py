@@ -0,0 +1,176 @@
+import math
+import heapq
+from array import array
+
+# The number of nearest neighbours whose average distance is the novelty of a behavior
+NOVELTY_NEIGHBOURS = 15
+# The number of the most novel behaviors of every generation which are added to the archive
+NOVELTY_ARCHIVE_ADDITIONS = 5
+# New archive entries are kept in an unindexed list until there are this many of them, then they are
+# indexed as a block. Blocks are merged into trees of doubling sizes, so every entry is only
+# reindexed a logarithmic number of times and a query looks at a logarithmic number of trees
+ARCHIVE_BLOCK_SIZE = 64
+
+class KDTree:
+	"""
+	A static k-d tree over a set of points of equal dimension, for nearest neighbour queries. The
+	tree is implicit: the points are stored in a flat array in an order where the root of every
+	subtree of `[lo, hi)` is the point at the middle of the range, so there are no node objects.
+	"""
+
+	def __init__(self, points):
+		"""
+		Builds a tree over `points`, a list of tuples of coordinates
+		"""
+
+		self.num_points = len(points)
+		self.dims = len(points[0]) if self.num_points > 0 else 0
+
+		order = list(range(self.num_points))
+		# The axis each subtree is split along, indexed like the points
+		self.split_axes = array('b', [0]*self.num_points)
+		self.build(points, order, 0, self.num_points)
+
+		# The coordinates of point `i` of the tree are `coords[i*dims:(i+1)*dims]`
+		self.coords = array('d', (coord for idx in order for coord in points[idx]))
+
+	def build(self, points, order, lo, hi):
+		"""
+		Arranges the points of `order[lo:hi]` into a subtree
+		"""
+
+		# We recurse manually, so deep trees don't hit the recursion limit
+		stack = [(lo, hi)]
+		while len(stack) > 0:
+			lo, hi = stack.pop()
+			if hi - lo <= 1:
+				continue
+
+			# Each subtree is split along the axis its points are most spread out on
+			best_axis = 0
+			best_spread = -1
+			for axis in range(self.dims):
+				values = [points[idx][axis] for idx in order[lo:hi]]
+				spread = max(values) - min(values)
+				if spread > best_spread:
+					best_axis, best_spread = axis, spread
+
+			order[lo:hi] = sorted(order[lo:hi], key=lambda idx: points[idx][best_axis])
+			mid = (lo + hi) // 2
+			self.split_axes[mid] = best_axis
+			stack.append((lo, mid))
+			stack.append((mid + 1, hi))
+
+	def __len__(self):
+		return self.num_points
+
+	def get_points(self):
+		"""
+		Returns the list of the points of the tree, as tuples of coordinates
+		"""
+
+		coords = self.coords
+		dims = self.dims
+		return [tuple(coords[offset:offset + dims]) for offset in range(0, len(coords), dims)]
+
+	def nearest(self, point, k):
+		"""
+		Returns a list of the squared distances from `point` to its `k` nearest points in the tree,
+		closest first
+		"""
+
+		coords = self.coords
+		dims = self.dims
+		# A max-heap (by negated distance) of the `k` closest squared distances found so far
+		closest = []
+		stack = [(0, self.num_points)]
+		while len(stack) > 0:
+			lo, hi = stack.pop()
+			if lo >= hi:
+				continue
+
+			mid = (lo + hi) // 2
+			offset = mid * dims
+			sqr_dist = 0
+			for axis in range(dims):
+				diff = coords[offset + axis] - point[axis]
+				sqr_dist += diff*diff
+
+			if len(closest) < k:
+				heapq.heappush(closest, -sqr_dist)
+			elif sqr_dist < -closest[0]:
+				heapq.heapreplace(closest, -sqr_dist)
+
+			# We first go down the side of the split the point is on, and only visit the other side if
+			# a point closer than the current k-th closest can be on it
+			axis = self.split_axes[mid]
+			split_diff = point[axis] - coords[offset + axis]
+			near, far = ((lo, mid), (mid + 1, hi)) if split_diff < 0 else ((mid + 1, hi), (lo, mid))
+			if len(closest) < k or split_diff*split_diff < -closest[0]:
+				stack.append(far)
+			stack.append(near)
+
+		return sorted(-sqr_dist for sqr_dist in closest)
+
+class NoveltyArchive:
+	"""
+	The archive of novelty search: the behaviors which were novel when they were found. The novelty
+	of a behavior is its average distance to its nearest neighbours out of the archive and the rest of
+	the current generation, so the population is pushed towards behaviors that weren't seen yet
+	instead of towards the objective. Behaviors are tuples of coordinates of equal length, e.g. the
+	positions sampled along a car's trajectory.
+	"""
+
+	def __init__(self, num_neighbours=NOVELTY_NEIGHBOURS, additions=NOVELTY_ARCHIVE_ADDITIONS):
+		self.num_neighbours = num_neighbours
+		# The number of behaviors added to the archive every generation
+		self.additions = additions
+
+		# The archive is indexed in `KDTree`s of decreasing sizes, each a power of two times
+		# `ARCHIVE_BLOCK_SIZE`, except the recently added behaviors, which are only indexed once there
+		# is a whole block of them
+		self.trees = []
+		self.pending = []
+
+	def __len__(self):
+		return sum(len(tree) for tree in self.trees) + len(self.pending)
+
+	def score(self, behaviors):
+		"""
+		Returns the novelty of each behavior in the list `behaviors`, which are the behaviors of a
+		whole generation, and adds the most novel of them to the archive
+		"""
+
+		generation_tree = KDTree(behaviors)
+		novelty = []
+		for behavior in behaviors:
+			# The closest behavior in the generation is the behavior itself, at a distance of 0
+			sqr_dists = generation_tree.nearest(behavior, self.num_neighbours + 1)[1:]
+			for tree in self.trees:
+				sqr_dists += tree.nearest(behavior, self.num_neighbours)
+			for archived in self.pending:
+				sqr_dists.append(sum((a - b)*(a - b) for a, b in zip(behavior, archived)))
+
+			neighbours = heapq.nsmallest(self.num_neighbours, sqr_dists)
+			novelty.append(sum(math.sqrt(sqr_dist) for sqr_dist in neighbours) / max(1, len(neighbours)))
+
+		most_novel = sorted(range(len(behaviors)), key=lambda i: novelty[i], reverse=True)
+		self.add([behaviors[i] for i in most_novel[:self.additions]])
+
+		return novelty
+
+	def add(self, behaviors):
+		"""
+		Adds the list of `behaviors` to the archive
+		"""
+
+		self.pending.extend(behaviors)
+		while len(self.pending) >= ARCHIVE_BLOCK_SIZE:
+			points = self.pending[:ARCHIVE_BLOCK_SIZE]
+			del self.pending[:ARCHIVE_BLOCK_SIZE]
+
+			# Like carrying in a binary counter, the new block is merged with the smallest trees as long as
+			# they aren't larger than it, so there is at most one tree of each size
+			while len(self.trees) > 0 and len(self.trees[-1]) <= len(points):
+				points = self.trees.pop().get_points() + points
+			self.trees.append(KDTree(points))
@@ -0,0 +1,186 @@
+import zlib
+import struct
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_CHUNK_HEADER = struct.Struct('>I4s')
+PNG_IHDR = struct.Struct('>IIBBBBB')
+
+# The number of samples in a pixel of each PNG color type: grayscale, RGB, palette, grayscale with
+# alpha and RGBA
+PNG_COLOR_TYPE_SAMPLES = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+PNG_PALETTE_COLOR_TYPE = 3
+PNG_RGB_COLOR_TYPE = 2
+
+# The compressed image data is split into `IDAT` chunks of at most this many bytes when writing
+PNG_WRITE_CHUNK_SIZE = 1 << 16
+
+def read_png_pixels(filename):
+	"""
+	Decodes the PNG image at `filename` without pygame. Returns a tuple of the width and height of the
+	image and a list of its rows, where each row is a list of the `(r, g, b)` colors of its pixels.
+	Only non-interlaced images with 8 bits per sample (or fewer for palette and grayscale images) are
+	supported, a ValueError is raised for anything else.
+	"""
+
+	width, height, rows = read_png_rows(filename)
+	return (width, height, list(rows))
+
+def read_png_rows(filename):
+	"""
+	Like `read_png_pixels`, but the rows are returned as an iterator which decodes each row only when
+	it is reached, so the decoded image is never held in memory as a whole
+	"""
+
+	with open(filename, 'rb') as png_file:
+		data = png_file.read()
+	if data[:len(PNG_SIGNATURE)] != PNG_SIGNATURE:
+		raise ValueError(f'{filename} is not a PNG image')
+
+	header = None
+	palette = None
+	compressed = []
+	offset = len(PNG_SIGNATURE)
+	while offset < len(data):
+		length, chunk_type = PNG_CHUNK_HEADER.unpack_from(data, offset)
+		chunk = data[offset + PNG_CHUNK_HEADER.size:offset + PNG_CHUNK_HEADER.size + length]
+		# Each chunk is followed by a 4 byte CRC, which we don't check
+		offset += PNG_CHUNK_HEADER.size + length + 4
+
+		if chunk_type == b'IHDR':
+			header = PNG_IHDR.unpack(chunk)
+		elif chunk_type == b'PLTE':
+			palette = [tuple(chunk[i:i+3]) for i in range(0, len(chunk), 3)]
+		elif chunk_type == b'IDAT':
+			compressed.append(chunk)
+		elif chunk_type == b'IEND':
+			break
+
+	width, height, bit_depth, color_type, _, _, interlace = header
+	if color_type not in PNG_COLOR_TYPE_SAMPLES or interlace != 0:
+		raise ValueError(f'Unsupported PNG format in {filename}')
+	if bit_depth > 8 or (bit_depth < 8 and color_type not in (0, PNG_PALETTE_COLOR_TYPE)):
+		raise ValueError(f'Unsupported PNG bit depth {bit_depth} in {filename}')
+
+	return (width, height, decode_rows(compressed, width, height, bit_depth, color_type, palette))
+
+def decode_rows(compressed, width, height, bit_depth, color_type, palette):
+	"""
+	Generates the rows of `(r, g, b)` colors of an image out of the list of its compressed `IDAT`
+	chunks `compressed`, decompressing only as much as is needed for each row
+	"""
+
+	samples = PNG_COLOR_TYPE_SAMPLES[color_type]
+	# Filters work on whole bytes, the previous pixel is at least one byte before
+	pixel_bytes = max(1, samples * bit_depth // 8)
+	row_bytes = (width * samples * bit_depth + 7) // 8
+
+	decompressor = zlib.decompressobj()
+	chunks = iter(compressed)
+	raw = bytearray()
+	prev_row = bytearray(row_bytes)
+	for _ in range(height):
+		# Every row is its filter type followed by its scanline
+		while len(raw) < row_bytes + 1:
+			chunk = next(chunks, None)
+			if chunk is None:
+				raw += decompressor.flush()
+				break
+			raw += decompressor.decompress(chunk)
+
+		filter_type = raw[0]
+		row = unfilter_row(filter_type, raw[1:row_bytes + 1], prev_row, pixel_bytes)
+		del raw[:row_bytes + 1]
+		yield decode_row(row, width, samples, bit_depth, color_type, palette)
+		prev_row = row
+
+def unfilter_row(filter_type, row, prev_row, pixel_bytes):
+	"""
+	Reverses the PNG filter `filter_type` of the scanline `row` in place, given the already unfiltered
+	previous scanline `prev_row`. Returns the row.
+	"""
+
+	if filter_type == 0:
+		return row
+
+	for i in range(len(row)):
+		left = row[i - pixel_bytes] if i >= pixel_bytes else 0
+		up = prev_row[i]
+		if filter_type == 1:
+			predictor = left
+		elif filter_type == 2:
+			predictor = up
+		elif filter_type == 3:
+			predictor = (left + up) // 2
+		elif filter_type == 4:
+			# The Paeth predictor picks whichever of left, up and upper left is closest to their
+			# linear estimate
+			upper_left = prev_row[i - pixel_bytes] if i >= pixel_bytes else 0
+			estimate = left + up - upper_left
+			left_dist = abs(estimate - left)
+			up_dist = abs(estimate - up)
+			upper_left_dist = abs(estimate - upper_left)
+			if left_dist <= up_dist and left_dist <= upper_left_dist:
+				predictor = left
+			elif up_dist <= upper_left_dist:
+				predictor = up
+			else:
+				predictor = upper_left
+		else:
+			raise ValueError(f'Unknown PNG filter type {filter_type}')
+		row[i] = (row[i] + predictor) & 0xff
+
+	return row
+
+def decode_row(row, width, samples, bit_depth, color_type, palette):
+	"""
+	Converts the unfiltered scanline `row` to a list of `(r, g, b)` colors
+	"""
+
+	if bit_depth < 8:
+		# Samples smaller than a byte are packed from the most significant bit
+		per_byte = 8 // bit_depth
+		mask = (1 << bit_depth) - 1
+		values = [(row[i // per_byte] >> (8 - bit_depth*(i % per_byte + 1))) & mask for i in range(width)]
+		if color_type == PNG_PALETTE_COLOR_TYPE:
+			return [palette[value] for value in values]
+		# Grayscale samples are scaled up to the full byte range
+		scale = 255 // mask
+		return [(value*scale,)*3 for value in values]
+
+	if color_type == PNG_PALETTE_COLOR_TYPE:
+		return [palette[value] for value in row[:width]]
+	if samples <= 2:
+		return [(row[i],)*3 for i in range(0, width*samples, samples)]
+	return [tuple(row[i:i+3]) for i in range(0, width*samples, samples)]
+
+def write_png_rows(filename, width, height, rows):
+	"""
+	Encodes an RGB PNG image of `width` by `height` pixels to `filename`, out of the iterable `rows`
+	of lists of `(r, g, b)` colors. The rows are compressed as they are iterated over, so they don't
+	all need to be in memory at once.
+	"""
+
+	def write_chunk(png_file, chunk_type, chunk):
+		png_file.write(PNG_CHUNK_HEADER.pack(len(chunk), chunk_type))
+		png_file.write(chunk)
+		png_file.write(struct.pack('>I', zlib.crc32(chunk_type + chunk)))
+
+	with open(filename, 'wb') as png_file:
+		png_file.write(PNG_SIGNATURE)
+		write_chunk(png_file, b'IHDR', PNG_IHDR.pack(width, height, 8, PNG_RGB_COLOR_TYPE, 0, 0, 0))
+
+		compressor = zlib.compressobj()
+		compressed = bytearray()
+		for row_colors in rows:
+			# Every row is written unfiltered
+			row = bytearray([0])
+			for color in row_colors:
+				row += bytes(color)
+			compressed += compressor.compress(row)
+			while len(compressed) >= PNG_WRITE_CHUNK_SIZE:
+				write_chunk(png_file, b'IDAT', bytes(compressed[:PNG_WRITE_CHUNK_SIZE]))
+				del compressed[:PNG_WRITE_CHUNK_SIZE]
+		compressed += compressor.flush()
+		write_chunk(png_file, b'IDAT', bytes(compressed))
+
+		write_chunk(png_file, b'IEND', b'')
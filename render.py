@@ -0,0 +1,100 @@
+import math
+import pygame
+from math_utils import Vector
+
+# The sprites are lazily loaded the first time they are drawn
+CAR_SPRITE = None
+FINISH_LINE_SPRITE = None
+
+def get_car_sprite():
+	"""
+	Returns the sprite used to draw a car. Lazily loads the sprite upon request.
+	"""
+
+	global CAR_SPRITE
+
+	if CAR_SPRITE is None:
+		CAR_SPRITE = pygame.transform.scale(pygame.image.load('assets/red_car.png'), (165, 78)).convert_alpha()
+	return CAR_SPRITE
+
+def get_finish_line_sprite():
+	"""
+	Returns the sprite used to mark the finish line. Lazily loads the sprite upon request.
+	"""
+
+	global FINISH_LINE_SPRITE
+
+	if FINISH_LINE_SPRITE is None:
+		FINISH_LINE_SPRITE = pygame.image.load('assets/finish_line.png').convert_alpha()
+	return FINISH_LINE_SPRITE
+
+def draw_car(screen, car, screen_mapping):
+	"""
+	Draws `car` on `screen`, with the position adjusted based on the provided `screen_mapping`
+	"""
+
+	rotated_sprite = pygame.transform.rotate(get_car_sprite(), car.direction * 180/math.pi)
+
+	sprite_rect = rotated_sprite.get_rect()
+	sprite_middle = Vector(sprite_rect.width, sprite_rect.height)/2
+	sprite_position = car.position - sprite_middle
+	screen_position = sprite_position + screen_mapping
+	screen.blit(rotated_sprite, screen_position.as_tuple())
+
+def draw_scene(screen, game):
+	"""
+	Draws the state of `game` on `screen`
+	"""
+
+	screen_mapping = game.get_screen_mapping(screen)
+	max_ray_length = game.config.max_ray_length
+
+	# We mark the finish line on the first checkpoint, where the laps start
+	finish_line_sprite = get_finish_line_sprite()
+	finish_line_middle = Vector.from_tuple(finish_line_sprite.get_size())/2
+	finish_line_position = game.checkpoints[0] - finish_line_middle + screen_mapping
+	screen.blit(finish_line_sprite, finish_line_position.as_tuple())
+
+	# We draw each checkpoint
+	for cp_idx, checkpoint in enumerate(game.checkpoints):
+		# If this checkpoint is the last checkpoint the tracked car reached, we mark it with a
+		# different color
+		if cp_idx == game.reached_checkpoint[game.tracked_car]:
+			circle_color = (221, 40, 0)
+		else:
+			circle_color = (0, 130, 224)
+		pygame.draw.circle(screen, circle_color, (checkpoint + screen_mapping).as_tuple(), 20)
+
+
+	for car_idx, car in enumerate(game.cars):
+		if game.dead[car_idx]: continue
+
+		# We draw the sensor rays of each car
+		for ray in car.get_sight_rays():
+			start_pos = ray.start + screen_mapping
+			full_end_pos = ray.start + ray.direction*max_ray_length + screen_mapping
+			pygame.draw.line(screen, (255, 0, 0), start_pos.as_tuple(), full_end_pos.as_tuple())
+
+			inter_point, ray_dist = game.raycast_against_walls(ray, max_ray_length)
+			if inter_point is not None and ray_dist <= max_ray_length:
+				end_pos = inter_point + screen_mapping
+				pygame.draw.line(screen, (0, 255, 0), start_pos.as_tuple(), end_pos.as_tuple(), 2)
+
+		# We draw the body of each car
+		draw_car(screen, car, screen_mapping)
+
+	# We draw each wall. Because there are many walls, and this is expensive, we only draw the walls
+	# which may show up on screen
+	screen_rect = screen.get_rect()
+	visible_walls = game.walls.get_walls_in_box(-screen_mapping.x, -screen_mapping.y,
+		screen_rect.width - screen_mapping.x, screen_rect.height - screen_mapping.y)
+	for wall_idx in visible_walls:
+		mapped_wall = map_rect_to_screen(game.walls.get_wall_rect(wall_idx), screen_mapping)
+		pygame.draw.polygon(screen, (160, 160, 160), mapped_wall)
+
+def map_rect_to_screen(rect, screen_mapping):
+	"""
+	Helper function to adjust a rect's vertices based on a mapping
+	"""
+
+	return [(v[0] + screen_mapping.x, v[1] + screen_mapping.y) for v in rect]
@@ -0,0 +1,181 @@
+import os
+import argparse
+import contextlib
+import multiprocessing
+
+# Frames are rendered offscreen, so pygame must not need a display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+import game_map
+from champion import load_champions
+from neat.record_index import get_index_filename
+from simulation import simulate
+from simulation_config import DEFAULT_SIMULATION_CONFIG, RAY_ANGLES, parse_ray_angle
+from trajectory import TrajectoryRecorder, TrajectoryReader
+from replay import SCREEN_WIDTH, SCREEN_HEIGHT, create_replay_game, apply_step, draw_replay_frame, get_step_at
+
+FRAMES_FPS = 30
+# The frames of a generation are split into jobs of this many frames, which are rendered in parallel
+FRAMES_PER_JOB = 60
+FRAMES_DIRECTORY = 'frames'
+CHAMPIONS_TRAJECTORIES_FILENAME = 'champions.traj'
+
+# The state of a worker process, which is set up once by `init_worker`
+worker_state = None
+
+def init_worker(trajectories_filename, track_filename, size):
+	"""
+	Sets up a rendering worker process: the offscreen screen, the track, and the trajectories reader
+	"""
+
+	global worker_state
+
+	pygame.display.init()
+	# The sprites are converted to the format of the display, so a (dummy) display is still needed
+	screen = pygame.display.set_mode(size)
+	worker_state = {
+		'screen': screen,
+		'track': game_map.gen_map(track_filename),
+		'reader': TrajectoryReader(trajectories_filename)
+	}
+
+def render_job(job):
+	"""
+	Renders a range of frames of a recorded generation. `job` is a tuple of the generation, the first
+	and last (exclusive) frames of the generation to render, the number of the first frame file, the
+	game time between frames, and the directory the frames are written to. Returns the number of
+	frames rendered.
+	"""
+
+	generation, first_frame, last_frame, first_file_number, frame_time, output_dir = job
+	screen = worker_state['screen']
+
+	# Consecutive jobs are usually of the same generation, so the replay game is reused
+	if worker_state.get('generation') != generation:
+		trajectory = worker_state['reader'].read_generation(generation)
+		worker_state['generation'] = generation
+		worker_state['trajectory'] = trajectory
+		worker_state['game'] = create_replay_game(trajectory, worker_state['track'])
+	trajectory = worker_state['trajectory']
+	game = worker_state['game']
+
+	for frame in range(first_frame, last_frame):
+		apply_step(game, trajectory, get_step_at(trajectory, frame * frame_time))
+		draw_replay_frame(screen, game)
+		file_number = first_file_number + frame - first_frame
+		pygame.image.save(screen, os.path.join(output_dir, f'frame_{file_number:06d}.png'))
+
+	return last_frame - first_frame
+
+def record_champions(genomes, track_filename, trajectories_filename, config=DEFAULT_SIMULATION_CONFIG):
+	"""
+	Simulates the list of `genomes` driving together on the track with the `SimulationConfig`
+	`config`, and records their trajectories to `trajectories_filename` as generation 0
+	"""
+
+	networks = [genome.as_neural_network() for genome in genomes]
+
+	# The trajectories are recorded from scratch. A previous recording may have been interrupted
+	# before its index was written
+	for filename in (trajectories_filename, get_index_filename(trajectories_filename)):
+		with contextlib.suppress(FileNotFoundError):
+			os.remove(filename)
+
+	start_pos, walls, checkpoints = game_map.gen_map(track_filename)
+	with TrajectoryRecorder(trajectories_filename) as recorder:
+		recorder.begin_generation(0, len(networks))
+		simulate(networks, start_pos, walls, checkpoints, config, recorder=recorder)
+		recorder.end_generation()
+
+def get_render_jobs(reader, generations, frame_time, output_dir):
+	"""
+	Splits the rendering of `generations` out of the trajectories read by `reader` into jobs, see
+	`render_job`. The frames of all the generations are numbered consecutively. Returns the list of
+	jobs and the total number of frames.
+	"""
+
+	jobs = []
+	num_frames = 0
+	for generation in generations:
+		trajectory = reader.read_generation(generation)
+		if trajectory.num_steps == 0:
+			continue
+
+		generation_frames = int(trajectory.step_times[-1] / frame_time) + 1
+		for first_frame in range(0, generation_frames, FRAMES_PER_JOB):
+			last_frame = min(first_frame + FRAMES_PER_JOB, generation_frames)
+			jobs.append((generation, first_frame, last_frame, num_frames + first_frame, frame_time, output_dir))
+		num_frames += generation_frames
+
+	return (jobs, num_frames)
+
+def main():
+	parser = argparse.ArgumentParser(description='Renders recorded trajectories or saved champions to ' +
+		'numbered PNG frames, without a display')
+	parser.add_argument('trajectories', metavar='TRAJECTORIES', nargs='?',
+		help='the trajectories file to render, recorded with --record')
+	parser.add_argument('--champion', metavar='GENOME', dest='champions', action='append', default=[],
+		help='render the genome saved in the file GENOME driving, instead of recorded trajectories ' +
+		'(may be given more than once, the champions drive together)')
+	parser.add_argument('--generation', metavar='N', dest='generations', type=int, action='append',
+		help='render generation N (may be given more than once, default: every recorded generation)')
+	parser.add_argument('--every', metavar='N', type=int, default=1,
+		help='only render every N-th recorded generation, for a highlight reel (default: 1)')
+	parser.add_argument('--speed', type=float, default=1,
+		help='the playback speed, relative to real time (default: 1)')
+	parser.add_argument('--fps', type=int, default=FRAMES_FPS,
+		help=f'the number of frames per second of playback (default: {FRAMES_FPS})')
+	parser.add_argument('--size', metavar=('WIDTH', 'HEIGHT'), type=int, nargs=2,
+		default=(SCREEN_WIDTH, SCREEN_HEIGHT),
+		help=f'the size of the frames (default: {SCREEN_WIDTH} {SCREEN_HEIGHT})')
+	parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+		help='the number of processes frames are rendered in (default: the number of CPUs)')
+	parser.add_argument('--ray-angles', metavar='DEGREES', type=parse_ray_angle, nargs='+', default=RAY_ANGLES,
+		help='the angles of the sensor rays of the cars the champions were evolved with, relative to ' +
+		'their heading (default: -25 0 25)')
+	parser.add_argument('--heading-input', action='store_true',
+		help='also give the networks the heading to the next checkpoint as an input')
+	parser.add_argument('--track', default='assets/track.png',
+		help='the track description image (default: assets/track.png)')
+	parser.add_argument('--output', default=FRAMES_DIRECTORY,
+		help=f'the directory the frames are written to (default: {FRAMES_DIRECTORY})')
+	args = parser.parse_args()
+
+	if (args.trajectories is None) == (len(args.champions) == 0):
+		parser.error('either TRAJECTORIES or --champion is required')
+
+	config = DEFAULT_SIMULATION_CONFIG.with_changes(ray_angles=tuple(args.ray_angles),
+		checkpoint_heading_input=args.heading_input)
+	champions = load_champions(args.champions)
+	for name, genome in champions:
+		if genome.num_inputs != config.num_inputs():
+			parser.error(f'{name} has {genome.num_inputs} inputs, but the sensors give {config.num_inputs()}, ' +
+				'give the --ray-angles and --heading-input it was evolved with')
+
+	os.makedirs(args.output, exist_ok=True)
+	trajectories_filename = args.trajectories
+	if len(champions) > 0:
+		# The champions are simulated once, and then rendered like any recorded generation
+		trajectories_filename = os.path.join(args.output, CHAMPIONS_TRAJECTORIES_FILENAME)
+		record_champions([genome for _, genome in champions], args.track, trajectories_filename, config)
+
+	with TrajectoryReader(trajectories_filename) as reader:
+		generations = args.generations if args.generations is not None else reader.generations()
+		generations = generations[::args.every]
+		jobs, num_frames = get_render_jobs(reader, generations, args.speed / args.fps, args.output)
+
+	print(f'Rendering {num_frames} frames of {len(generations)} generations')
+	rendered = 0
+	with multiprocessing.Pool(args.workers, init_worker, (trajectories_filename, args.track, tuple(args.size))) as pool:
+		for job_frames in pool.imap_unordered(render_job, jobs):
+			rendered += job_frames
+			print(f'Rendered {rendered}/{num_frames} frames', end='\r')
+		# SDL turns the signal `terminate` sends into a quit event, so the workers are left to exit
+		pool.close()
+		pool.join()
+	print()
+
+if __name__ == "__main__":
+	main()
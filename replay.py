@@ -0,0 +1,153 @@
+import sys
+import argparse
+from bisect import bisect_right
+import pygame
+
+from game import Game
+from math_utils import Vector
+from trajectory import TrajectoryReader
+import ui
+import game_map
+
+SCREEN_WIDTH = 1600
+SCREEN_HEIGHT = 900
+REPLAY_FPS = 30
+# The playback speed is multiplied or divided by this factor with the up and down keys
+SPEED_FACTOR = 2
+
+def create_replay_game(trajectory, track):
+	"""
+	Creates a `Game` on the track in `track` (a tuple of the start position, the walls and the
+	checkpoints) which holds the cars of the `GenerationTrajectory` `trajectory`. The game has the
+	simulation config the trajectory was recorded with, so the cars are drawn with the sensors they
+	had. The game is never updated, its cars are placed with `apply_step` instead.
+	"""
+
+	start_pos, walls, checkpoints = track
+	game = Game(trajectory.num_cars, start_pos, walls, checkpoints, trajectory.config)
+	game.track_car(get_longest_living_car(trajectory))
+	return game
+
+def apply_step(game, trajectory, step):
+	"""
+	Places the cars of `game` in the state they were recorded in after `step` of `trajectory`
+	"""
+
+	for car_idx, car in enumerate(game.cars):
+		(x, y), direction, velocity, _, dead = trajectory.get_car_state(step, car_idx)
+		car.position = Vector(x, y)
+		car.direction = direction
+		car.velocity = velocity
+		game.dead[car_idx] = dead
+	game.camera_position = game.cars[game.tracked_car].position
+
+def get_step_at(trajectory, time):
+	"""
+	Returns the last step of `trajectory` which was recorded at or before the game time `time`
+	"""
+
+	return max(0, bisect_right(trajectory.step_times, time) - 1)
+
+def get_longest_living_car(trajectory):
+	"""
+	Returns the index of the car of `trajectory` which stayed alive the longest, which is the car the
+	camera follows
+	"""
+
+	if trajectory.num_steps == 0:
+		return 0
+
+	best_car = 0
+	best_death_step = -1
+	for car_idx in range(trajectory.num_cars):
+		# A car never comes back to life, so we can binary search for the step it died at
+		lo, hi = 0, trajectory.num_steps
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if trajectory.is_dead(mid, car_idx):
+				hi = mid
+			else:
+				lo = mid + 1
+		if lo > best_death_step:
+			best_car, best_death_step = car_idx, lo
+	return best_car
+
+def draw_replay_frame(screen, game):
+	"""
+	Draws the current state of the replayed `game` on `screen`, the same way as the game window
+	"""
+
+	# Background color
+	screen.fill((57, 57, 57))
+	game.draw_scene(screen)
+	ui.draw_speedometer(screen, game.cars[game.tracked_car].get_normalized_speed())
+
+def main():
+	parser = argparse.ArgumentParser(description='Replays recorded trajectories without simulating them')
+	parser.add_argument('trajectories', metavar='TRAJECTORIES',
+		help='the trajectories file, recorded with --record')
+	parser.add_argument('--generation', type=int,
+		help='the generation to start at (default: the first recorded generation)')
+	parser.add_argument('--speed', type=float, default=1,
+		help='the playback speed, relative to real time (default: 1)')
+	parser.add_argument('--track', default='assets/track.png',
+		help='the track description image the trajectories were recorded on (default: assets/track.png)')
+	args = parser.parse_args()
+
+	reader = TrajectoryReader(args.trajectories)
+	generations = reader.generations()
+	if len(generations) == 0:
+		print(f'No generations are recorded in {args.trajectories}')
+		return
+	generation_idx = generations.index(args.generation) if args.generation is not None else 0
+
+	pygame.init()
+	screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+	frame_clock = pygame.time.Clock()
+
+	track = game_map.gen_map(args.track)
+	speed = args.speed
+	paused = False
+
+	# Switching generations is done by resetting the trajectory to `None`
+	trajectory = None
+	while True:
+		if trajectory is None:
+			trajectory = reader.read_generation(generations[generation_idx])
+			game = create_replay_game(trajectory, track)
+			playback_time = 0
+			pygame.display.set_caption(f'Generation {trajectory.generation}')
+
+		for event in pygame.event.get():
+			if event.type == pygame.QUIT:
+				reader.close()
+				sys.exit()
+			elif event.type == pygame.KEYDOWN:
+				if event.key == pygame.K_SPACE:
+					paused = not paused
+				elif event.key == pygame.K_UP:
+					speed *= SPEED_FACTOR
+				elif event.key == pygame.K_DOWN:
+					speed /= SPEED_FACTOR
+				elif event.key in (pygame.K_RIGHT, pygame.K_LEFT):
+					step = 1 if event.key == pygame.K_RIGHT else -1
+					generation_idx = (generation_idx + step) % len(generations)
+					trajectory = None
+		if trajectory is None:
+			continue
+
+		if trajectory.num_steps > 0:
+			apply_step(game, trajectory, get_step_at(trajectory, playback_time))
+			draw_replay_frame(screen, game)
+		pygame.display.flip()
+
+		delta_time = frame_clock.tick(REPLAY_FPS) / 1000
+		if not paused:
+			playback_time += delta_time * speed
+			# Once the generation is over, we go on to the next one
+			if trajectory.num_steps == 0 or playback_time > trajectory.step_times[-1]:
+				generation_idx = (generation_idx + 1) % len(generations)
+				trajectory = None
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,208 @@
+import math
+import random
+import statistics
+
+from game import Game, CarStart
+from simulation_config import DEFAULT_SIMULATION_CONFIG
+
+NO_CONTROLS = {'forward': False, 'left': False, 'backward': False, 'right': False}
+
+# The ways the fitness scores of a network's trials can be combined into a single fitness
+FITNESS_REDUCERS = {
+	'mean': statistics.fmean,
+	'min': min,
+	'median': statistics.median
+}
+
+def get_car_controls(networks, car_sensors):
+	"""
+	Computes the controls of each car by running its sensor data through its network. If
+	`car_sensors` is None (there is no sensor data yet) the cars don't move.
+	"""
+
+	# If this is the first frame, we don't yet have sensor data to base our decision on, so we
+	# just don't move
+	if car_sensors is None:
+		return [NO_CONTROLS]*len(networks)
+
+	controls = []
+	for network, sensors in zip(networks, car_sensors):
+		# We run the sensor data from last frame through the car's network
+		network_output = network.evaluate_input(sensors)
+		# We then decide whether to enable that control based on a simple threshold
+		control = {
+			'forward': network_output[0] >= 0,
+			'left': network_output[1] >= 0,
+			'backward': network_output[2] >= 0,
+			'right': network_output[3] >= 0
+		}
+		controls.append(control)
+	return controls
+
+def had_progress(last_fitness, fitness, config=DEFAULT_SIMULATION_CONFIG):
+	"""
+	Checks whether any of the cars improved its fitness by some epsilon since the last update
+	"""
+
+	for last, cur in zip(last_fitness, fitness):
+		if cur > last + config.progress_epsilon:
+			return True
+	return False
+
+def stop_stalled_cars(game, stall_time, last_fitness, fitness, config=DEFAULT_SIMULATION_CONFIG):
+	"""
+	Checks the stall timer of every car still driving in `game`: a car which improved its fitness by
+	some epsilon since the last update has its timer in the list `stall_time` pushed back, and a car
+	which made no progress for the stall timeout is stopped where it is, like a dead car. Every car
+	has its own timer, so when a car stops doesn't depend on the other cars it drives with.
+	"""
+
+	for car_idx, (last, cur) in enumerate(zip(last_fitness, fitness)):
+		if game.dead[car_idx]: continue
+		if cur > last + config.progress_epsilon:
+			stall_time[car_idx] = max(0, stall_time[car_idx] - config.progress_time_credit)
+		if stall_time[car_idx] > config.stall_timeout:
+			game.dead[car_idx] = True
+
+def simulate(networks, start_pos, walls, checkpoints, config=DEFAULT_SIMULATION_CONFIG, car_starts=None,
+	recorder=None):
+	"""
+	Simulates a generation of cars driven by `networks` without a display, using the fixed time step
+	of the `SimulationConfig` `config` so the result is deterministic. A car stops when it dies, or
+	when it made no progress for the stall timeout, see `stop_stalled_cars`, and the simulation ends
+	once every car stopped. Because of that, the fitness of a car only depends on its own network,
+	the map and the config, and not on the other cars. `car_starts` optionally lists the `CarStart` of each car, and the trajectories are
+	optionally recorded to the `TrajectoryRecorder` `recorder`. Returns the `Game` in its final state.
+	"""
+
+	game = Game(len(networks), start_pos, walls, checkpoints, config, car_starts, recorder)
+
+	last_car_sensors = None
+	last_fitness = None
+	# The time (in milliseconds) each car went without making progress
+	stall_time = [0]*len(networks)
+	delta_time = config.timestep
+	step_time = delta_time * 1000
+
+	while True:
+		fitness = game.get_cars_fitness()
+		if last_fitness is not None:
+			stop_stalled_cars(game, stall_time, last_fitness, fitness, config)
+		last_fitness = fitness
+
+		if all(game.dead):
+			return game
+
+		controls = get_car_controls(networks, last_car_sensors)
+		last_car_sensors = game.update(delta_time, controls)
+		for car_idx in range(len(stall_time)):
+			stall_time[car_idx] += step_time
+
+def generate_trial_starts(start_pos, checkpoints, num_trials, rng, config=DEFAULT_SIMULATION_CONFIG):
+	"""
+	Generates the `CarStart` of each of `num_trials` trials. The first trial is always the regular
+	start of the track, the others start at a random checkpoint, roughly facing the next checkpoint,
+	with the heading and position randomly perturbed as allowed by `config`.
+	"""
+
+	start_pos_x, start_pos_y = start_pos
+	trial_starts = [CarStart(start_pos_x, start_pos_y)]
+
+	for _ in range(num_trials - 1):
+		checkpoint_idx = rng.randrange(len(checkpoints))
+		checkpoint_x, checkpoint_y = checkpoints[checkpoint_idx]
+		next_x, next_y = checkpoints[(checkpoint_idx + 1) % len(checkpoints)]
+
+		# The y axis of the screen points down, while car directions are counter-clockwise
+		direction = math.atan2(checkpoint_y - next_y, next_x - checkpoint_x)
+		direction += rng.uniform(-config.start_heading_jitter, config.start_heading_jitter)
+
+		position_jitter = config.start_position_jitter
+		trial_starts.append(CarStart(
+			checkpoint_x + rng.uniform(-position_jitter, position_jitter),
+			checkpoint_y + rng.uniform(-position_jitter, position_jitter),
+			direction,
+			checkpoint_idx
+		))
+
+	return trial_starts
+
+def evaluate_trial(networks, start_pos, walls, checkpoints, config, trial_start, measure=Game.get_cars_fitness):
+	"""
+	Simulates the cars driven by `networks` in a single trial, where all the cars start at the
+	`CarStart` `trial_start`, and returns `measure` of the final game, by default the fitness of
+	each car
+	"""
+
+	car_starts = [trial_start]*len(networks)
+	return measure(simulate(networks, start_pos, walls, checkpoints, config, car_starts))
+
+def run_trials(networks, start_pos, walls, checkpoints, config, trial_seed, pool, measure):
+	"""
+	Simulates every trial of the cars driven by `networks`, see `evaluate_networks`. Returns a list
+	with the result of `measure` for each trial, where `measure` takes the final game of the trial
+	and returns a list with a measurement of each car.
+	"""
+
+	if config.num_trials == 1:
+		return [measure(simulate(networks, start_pos, walls, checkpoints, config))]
+
+	# Every network drives from the same starts, so their fitness scores are comparable
+	trial_starts = generate_trial_starts(start_pos, checkpoints, config.num_trials,
+		random.Random(trial_seed), config)
+
+	if pool is not None:
+		return pool.starmap(evaluate_trial,
+			[(networks, start_pos, walls, checkpoints, config, trial_start, measure) for trial_start in trial_starts])
+
+	# The cars of trial `t` are at indices `t*len(networks)` through `(t+1)*len(networks) - 1`
+	car_starts = [trial_start for trial_start in trial_starts for _ in networks]
+	game = simulate(networks*len(trial_starts), start_pos, walls, checkpoints, config, car_starts)
+	measurements = measure(game)
+	return [measurements[t*len(networks):(t+1)*len(networks)] for t in range(len(trial_starts))]
+
+def evaluate_networks(networks, start_pos, walls, checkpoints, config=DEFAULT_SIMULATION_CONFIG,
+	trial_seed=0, pool=None):
+	"""
+	Simulates the cars driven by `networks` without a display, and returns the fitness of each car.
+	If `config` asks for more than one trial, every network drives once from each trial's start and
+	its fitness is the reduction of its trials' fitness scores. The trials are derived from
+	`trial_seed`, which should change every generation so networks don't overfit to the starts.
+
+	All the trials run at once: in a single game with a car for every network and trial, or if the
+	`multiprocessing.Pool` `pool` is supplied, in a game per trial in the worker processes.
+	"""
+
+	trial_fitness = run_trials(networks, start_pos, walls, checkpoints, config, trial_seed, pool,
+		Game.get_cars_fitness)
+	if config.num_trials == 1:
+		return trial_fitness[0]
+
+	reducer = FITNESS_REDUCERS[config.trial_reducer]
+	return [reducer(network_fitness) for network_fitness in zip(*trial_fitness)]
+
+def get_cars_outcome(game):
+	"""
+	Returns a list with a tuple of the fitness and the behavior of each car in `game`
+	"""
+
+	return list(zip(game.get_cars_fitness(), game.get_cars_behavior()))
+
+def evaluate_behaviors(networks, start_pos, walls, checkpoints, config=DEFAULT_SIMULATION_CONFIG,
+	trial_seed=0, pool=None):
+	"""
+	Simulates the cars driven by `networks` like `evaluate_networks`, and returns a list with a tuple
+	of the fitness and the behavior of each car, see `Game.get_cars_behavior`. The behavior of a
+	network over several trials is the concatenation of its behaviors in each trial.
+	"""
+
+	trial_outcomes = run_trials(networks, start_pos, walls, checkpoints, config, trial_seed, pool,
+		get_cars_outcome)
+
+	reducer = FITNESS_REDUCERS[config.trial_reducer]
+	outcomes = []
+	for network_outcomes in zip(*trial_outcomes):
+		fitness = [trial_fitness for trial_fitness, _ in network_outcomes]
+		behavior = tuple(coord for _, trial_behavior in network_outcomes for coord in trial_behavior)
+		outcomes.append((fitness[0] if len(fitness) == 1 else reducer(fitness), behavior))
+	return outcomes
@@ -0,0 +1,122 @@
+import math
+import json
+from dataclasses import dataclass, fields, replace, asdict
+
+CAR_ACCELERATION = 300
+CAR_ROTATION_SPEED = 0.07
+MAX_RAY_LENGTH = 220
+FRICTION_ACCEL = 200
+MAX_VELOCITY = 500
+RAY_ANGLE = math.radians(25)
+# The angles (in radians) of the sensor rays of a car relative to its heading, and whether the heading
+# to the next checkpoint is an input of the networks as well
+RAY_ANGLES = (-RAY_ANGLE, 0, RAY_ANGLE)
+CHECKPOINT_HEADING_INPUT = False
+
+# The fixed time step of a headless simulation, the same as the 30 FPS of the game window
+SIMULATION_TIMESTEP = 1/30
+# A generation ends if the cars make no progress for this long (in milliseconds)
+STALL_TIMEOUT = 1000
+# The fitness a car needs to gain in a single update to count as progress
+PROGRESS_EPSILON = 0.05
+# The amount of time (in milliseconds) the stall timer is pushed back whenever a car makes progress
+PROGRESS_TIME_CREDIT = 100
+
+# The number of trials each network is evaluated on, and how the fitness of the trials is combined
+# into a single fitness (one of 'mean', 'min' or 'median')
+NUM_TRIALS = 1
+TRIAL_REDUCER = 'mean'
+# The randomized trials start at a random checkpoint, facing the next checkpoint up to this angle
+# off, and up to this distance (in pixels) off the checkpoint on each axis
+START_HEADING_JITTER = math.radians(15)
+START_POSITION_JITTER = 20
+
+# A car is retired once it completes this many laps, 0 means cars are never retired
+LAP_TARGET = 1
+# A car which reaches the lap target gets a fitness bonus of this value divided by the time (in
+# seconds) it took it, so faster cars are more fit
+FINISH_TIME_BONUS = 300
+
+# The behavior of a car, which novelty search compares, is its position at this many points along
+# its trajectory: one every behavior sample interval (in seconds), and lastly its final position
+BEHAVIOR_SAMPLES = 1
+BEHAVIOR_SAMPLE_INTERVAL = 2
+
+@dataclass(frozen=True)
+class SimulationConfig:
+	"""
+	The physical and timing parameters of a game simulation. The defaults are the module-level
+	constants above, which are the values the game window uses.
+	"""
+
+	car_acceleration: float = CAR_ACCELERATION
+	car_rotation_speed: float = CAR_ROTATION_SPEED
+	max_ray_length: float = MAX_RAY_LENGTH
+	friction_accel: float = FRICTION_ACCEL
+	max_velocity: float = MAX_VELOCITY
+	ray_angles: tuple = RAY_ANGLES
+	checkpoint_heading_input: bool = CHECKPOINT_HEADING_INPUT
+	timestep: float = SIMULATION_TIMESTEP
+	stall_timeout: float = STALL_TIMEOUT
+	progress_epsilon: float = PROGRESS_EPSILON
+	progress_time_credit: float = PROGRESS_TIME_CREDIT
+	num_trials: int = NUM_TRIALS
+	trial_reducer: str = TRIAL_REDUCER
+	start_heading_jitter: float = START_HEADING_JITTER
+	start_position_jitter: float = START_POSITION_JITTER
+	lap_target: int = LAP_TARGET
+	finish_time_bonus: float = FINISH_TIME_BONUS
+	behavior_samples: int = BEHAVIOR_SAMPLES
+	behavior_sample_interval: float = BEHAVIOR_SAMPLE_INTERVAL
+
+	def with_changes(self, **changes):
+		"""
+		Returns a copy of this config with the parameters in `changes` replaced
+		"""
+
+		return replace(self, **changes)
+
+	def num_inputs(self):
+		"""
+		Returns the number of inputs of the networks which drive the cars: the speed of the car, the
+		distance of each sensor ray, and optionally the heading to the next checkpoint
+		"""
+
+		return 1 + len(self.ray_angles) + (1 if self.checkpoint_heading_input else 0)
+
+	@staticmethod
+	def parameter_names():
+		"""
+		Returns the names of all the parameters of a config
+		"""
+
+		return [field.name for field in fields(SimulationConfig)]
+
+	def to_json(self):
+		"""
+		Serializes the config into JSON bytes, see `from_json`
+		"""
+
+		return json.dumps(asdict(self)).encode()
+
+	@staticmethod
+	def from_json(data):
+		"""
+		Deserializes a config serialized by `to_json`
+		"""
+
+		params = json.loads(data)
+		# JSON has no tuples, so the tuple parameters come back as lists
+		for field in fields(SimulationConfig):
+			if field.type is tuple and field.name in params:
+				params[field.name] = tuple(params[field.name])
+		return SimulationConfig(**params)
+
+DEFAULT_SIMULATION_CONFIG = SimulationConfig()
+
+def parse_ray_angle(degrees):
+	"""
+	Parses the angle of a sensor ray given in degrees on the command line, and returns it in radians
+	"""
+
+	return math.radians(float(degrees))
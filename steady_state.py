@@ -0,0 +1,122 @@
+import argparse
+import time
+
+import game_map
+from game import Game
+from neat.population import Population
+from simulation import get_car_controls
+from simulation_config import DEFAULT_SIMULATION_CONFIG, RAY_ANGLES, parse_ray_angle
+
+NUM_CARS = 60
+# A car is retired after driving for this long (in milliseconds) even if it still makes progress,
+# so a car which drives in circles along the track doesn't hold its slot forever
+MAX_CAR_LIFETIME = 60000
+# The number of evaluations between each statistics report
+REPORT_INTERVAL = 100
+
+def run_steady_state(population, start_pos, walls, checkpoints, num_evaluations,
+	config=DEFAULT_SIMULATION_CONFIG):
+	"""
+	Evolves `population` in steady-state (rtNEAT) mode without a display: every organism drives a
+	car in its own slot of a single running game, and as soon as a car dies or stalls its organism is
+	assigned its fitness and the slot is handed to a newly bred offspring. This keeps every slot busy
+	instead of waiting for the slowest car of a generation. Stops after `num_evaluations` organisms
+	were evaluated, and returns the most fit organism.
+	"""
+
+	population.speciate()
+
+	num_slots = len(population.organisms)
+	game = Game(num_slots, start_pos, walls, checkpoints, config)
+	slot_organisms = list(population.organisms)
+	networks = [organism.genome.as_neural_network() for organism in slot_organisms]
+
+	# Unlike in a generational run, every car has its own stall timer and lifetime, because the cars
+	# in the game started driving at different times
+	stall_time = [0]*num_slots
+	lifetime = [0]*num_slots
+	last_fitness = game.get_cars_fitness()
+
+	delta_time = config.timestep
+	step_time = delta_time * 1000
+	last_car_sensors = None
+	best_organism = None
+	num_evaluated = 0
+	report_fitness = []
+	report_start = time.perf_counter()
+
+	while num_evaluated < num_evaluations:
+		controls = get_car_controls(networks, last_car_sensors)
+		last_car_sensors = game.update(delta_time, controls)
+
+		fitness = game.get_cars_fitness()
+		for slot in range(num_slots):
+			lifetime[slot] += step_time
+			stall_time[slot] += step_time
+			# If the car made progress, we push back its stall timer
+			if fitness[slot] > last_fitness[slot] + config.progress_epsilon:
+				stall_time[slot] = max(0, stall_time[slot] - config.progress_time_credit)
+				last_fitness[slot] = fitness[slot]
+
+			car_done = game.dead[slot] or stall_time[slot] > config.stall_timeout or lifetime[slot] > MAX_CAR_LIFETIME
+			if not car_done: continue
+
+			# A tiny epsilon is added because a fitness score of zero does not work well when the
+			# relative fitness is calculated
+			organism = slot_organisms[slot]
+			organism.fitness = 0.00001 + fitness[slot]
+			if best_organism is None or organism.fitness > best_organism.fitness:
+				best_organism = organism
+			num_evaluated += 1
+			report_fitness.append(organism.fitness)
+
+			# The evaluated organism is now in competition with the rest of the population, and the
+			# slot is handed to a new offspring
+			offspring = population.replace_worst_organism()
+			slot_organisms[slot] = offspring
+			networks[slot] = offspring.genome.as_neural_network()
+			game.respawn_car(slot)
+			stall_time[slot] = 0
+			lifetime[slot] = 0
+			last_fitness[slot] = 0
+
+			if num_evaluated % REPORT_INTERVAL == 0:
+				elapsed = time.perf_counter() - report_start
+				print(f'Evaluations: {num_evaluated} Average: {sum(report_fitness)/len(report_fitness):5.2f} ' +
+					f'Max: {max(report_fitness):5.2f} Species: {len(population.species)} ' +
+					f'Evaluations/sec: {len(report_fitness)/elapsed:.1f}')
+				report_fitness = []
+				report_start = time.perf_counter()
+
+	return best_organism
+
+def main():
+	parser = argparse.ArgumentParser(description='Evolves a population in steady-state (rtNEAT) mode')
+	parser.add_argument('--evaluations', type=int, default=6000,
+		help='the number of organisms to evaluate (default: 6000)')
+	parser.add_argument('--population', type=int, default=NUM_CARS,
+		help=f'the population size, which is also the number of cars driving at once (default: {NUM_CARS})')
+	parser.add_argument('--ray-angles', metavar='DEGREES', type=parse_ray_angle, nargs='+', default=RAY_ANGLES,
+		help='the angles of the sensor rays of the cars, relative to their heading (default: -25 0 25)')
+	parser.add_argument('--heading-input', action='store_true',
+		help='also give the networks the heading to the next checkpoint as an input')
+	parser.add_argument('--seed', type=int, default=0, help='the seed of the run (default: 0)')
+	parser.add_argument('--track', default='assets/track.png',
+		help='the track description image (default: assets/track.png)')
+	parser.add_argument('--output', metavar='GENOME',
+		help='save the best genome found to the file GENOME')
+	args = parser.parse_args()
+
+	config = DEFAULT_SIMULATION_CONFIG.with_changes(ray_angles=tuple(args.ray_angles),
+		checkpoint_heading_input=args.heading_input)
+	start_pos, walls, checkpoints = game_map.gen_map(args.track)
+	population = Population(args.population, config.num_inputs(), 4, seed=args.seed)
+	best_organism = run_steady_state(population, start_pos, walls, checkpoints, args.evaluations, config)
+	print(f'Best fitness: {best_organism.fitness:5.2f}')
+
+	if args.output is not None:
+		with open(args.output, 'wb') as genome_file:
+			genome_file.write(best_organism.genome.to_bytes())
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,211 @@
+import csv
+import random
+import argparse
+import itertools
+import multiprocessing
+from dataclasses import fields
+
+import game_map
+from compiled_map import compile_map, publish_map
+from neat.config import NEATConfig
+from neat.population import Population
+from fitness_cache import FitnessCache, evaluate_genomes
+from simulation_config import SimulationConfig, parse_ray_angle
+
+SWEEP_GENERATIONS = 30
+SWEEP_POPULATION = 60
+SWEEP_RESULTS_FILENAME = 'sweep_results.csv'
+# The separator of the angles of a single `ray_angles` value, since commas separate the grid values
+RAY_ANGLE_SEPARATOR = ';'
+
+class SweepJob:
+	"""
+	A single run of a sweep: a NEAT config and a simulation config evolved with a given seed
+	"""
+
+	def __init__(self, run_idx, params, seed, args, track):
+		self.run_idx = run_idx
+		# The swept parameters of this run, as a dict from parameter name to value
+		self.params = params
+		self.seed = seed
+
+		self.generations = args.generations
+		self.population_size = args.population
+		# The published `CompiledMap` of the track, which is shared by all the runs
+		self.track = track
+
+		neat_params = {name: value for name, value in params.items() if name in NEATConfig.parameter_names()}
+		sim_params = {name: value for name, value in params.items() if name not in neat_params}
+		# Runs are already spread over the worker processes, so each run reproduces in-process
+		self.neat_config = NEATConfig(**neat_params).with_changes(reproduction_workers=1)
+		self.sim_config = SimulationConfig(**sim_params)
+
+def run_job(job):
+	"""
+	Evolves a population as described by the `SweepJob` `job`. Returns the job and its fitness curve,
+	a list of `(average, max, num_species)` tuples for each generation.
+	"""
+
+	start_pos, walls, checkpoints = job.track.start_pos, job.track, job.track.get_checkpoints()
+	population = Population(job.population_size, job.sim_config.num_inputs(), 4, seed=job.seed, config=job.neat_config)
+	fitness_cache = FitnessCache()
+
+	curve = []
+	for generation in range(job.generations):
+		genomes = [organism.genome for organism in population.organisms]
+		fitness = evaluate_genomes(genomes, start_pos, walls, checkpoints, fitness_cache, job.sim_config,
+			f'{job.seed}:{generation}')
+
+		# A tiny epsilon is added because a fitness score of zero does not work well when the relative
+		# fitness is calculated
+		for organism, car_fitness in zip(population.organisms, fitness):
+			organism.fitness = 0.00001 + car_fitness
+
+		population.epoch()
+		curve.append((sum(fitness)/len(fitness), max(fitness), len(population.species)))
+
+	return (job, curve)
+
+def parse_bool(value):
+	"""
+	Parses a boolean parameter value, one of `true`, `false`, `1` or `0`
+	"""
+
+	lowered = value.lower()
+	if lowered in ('true', '1'):
+		return True
+	if lowered in ('false', '0'):
+		return False
+	raise argparse.ArgumentTypeError(f'expected true or false, got {value}')
+
+def parse_ray_angles(value):
+	"""
+	Parses a `ray_angles` parameter value, the angles of the rays in degrees separated by
+	`RAY_ANGLE_SEPARATOR`, and returns the tuple of the angles in radians
+	"""
+
+	return tuple(parse_ray_angle(angle) for angle in value.split(RAY_ANGLE_SEPARATOR))
+
+# The parser of the values of the parameters of each type. The only tuple parameters are the ray
+# angles of the sensors
+PARAMETER_PARSERS = {int: int, float: float, str: str, bool: parse_bool, tuple: parse_ray_angles}
+# The types of the parameters which can be sampled from a range
+RANGE_TYPES = (int, float)
+
+def get_parameter_type(name):
+	"""
+	Returns the type of the config parameter `name`, which may be a parameter of either `NEATConfig`
+	or `SimulationConfig`
+	"""
+
+	for config_class in (NEATConfig, SimulationConfig):
+		for field in fields(config_class):
+			if field.name == name:
+				return field.type
+	raise argparse.ArgumentTypeError(f'unknown parameter {name}')
+
+def parse_param(param):
+	"""
+	Parses a `--param` argument: `NAME=V1,V2,...` is a list of values for a grid search, and
+	`NAME=LOW:HIGH` is a range for a random search, which only numeric parameters can have. Returns a
+	tuple of the name and the list of values or the `(low, high)` tuple.
+	"""
+
+	name, sep, values = param.partition('=')
+	if sep == '':
+		raise argparse.ArgumentTypeError(f'expected NAME=VALUES, got {param}')
+
+	param_type = get_parameter_type(name)
+	if param_type not in PARAMETER_PARSERS:
+		raise argparse.ArgumentTypeError(f'parameter {name} of type {param_type.__name__} can\'t be swept')
+	parse_value = PARAMETER_PARSERS[param_type]
+
+	if ':' in values:
+		if param_type not in RANGE_TYPES:
+			raise argparse.ArgumentTypeError(f'parameter {name} of type {param_type.__name__} needs a list ' +
+				'of values, not a range')
+		low, high = values.split(':')
+		return (name, (parse_value(low), parse_value(high)))
+	return (name, [parse_value(value) for value in values.split(',')])
+
+def generate_param_sets(params, num_random, rng):
+	"""
+	Generates the parameter sets of the sweep. If `num_random` is 0 this is the full grid of the
+	listed values, otherwise it is `num_random` sets sampled uniformly, where listed values are chosen
+	from and ranges are sampled from.
+	"""
+
+	names = [name for name, _ in params]
+	if num_random == 0:
+		for name, values in params:
+			if isinstance(values, tuple):
+				raise ValueError(f'a grid search needs a list of values for {name}, not a range')
+		return [dict(zip(names, values)) for values in itertools.product(*(values for _, values in params))]
+
+	param_sets = []
+	for _ in range(num_random):
+		param_set = dict()
+		for name, values in params:
+			if isinstance(values, list):
+				param_set[name] = rng.choice(values)
+			elif isinstance(values[0], int):
+				param_set[name] = rng.randint(*values)
+			else:
+				param_set[name] = rng.uniform(*values)
+		param_sets.append(param_set)
+	return param_sets
+
+def main():
+	parser = argparse.ArgumentParser(description='Runs a hyperparameter sweep over a pool of processes')
+	parser.add_argument('--param', dest='params', metavar='NAME=VALUES', type=parse_param, action='append',
+		default=[], help='a swept parameter of NEATConfig or SimulationConfig, either a list of values ' +
+		'(NAME=V1,V2,...) or a range for random search (NAME=LOW:HIGH). Booleans are true or false, and ' +
+		f'the ray angles are given in degrees separated by \'{RAY_ANGLE_SEPARATOR}\', e.g. ray_angles=-25;0;25,-45;0;45')
+	parser.add_argument('--random', metavar='N', type=int, default=0,
+		help='sample N random parameter sets instead of running the full grid')
+	parser.add_argument('--seeds', type=int, default=1,
+		help='the number of seeds each parameter set is run with (default: 1)')
+	parser.add_argument('--generations', type=int, default=SWEEP_GENERATIONS,
+		help=f'the number of generations of each run (default: {SWEEP_GENERATIONS})')
+	parser.add_argument('--population', type=int, default=SWEEP_POPULATION,
+		help=f'the population size of each run (default: {SWEEP_POPULATION})')
+	parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+		help='the number of runs evolved at once (default: the number of CPUs)')
+	parser.add_argument('--seed', type=int, default=0,
+		help='the seed of the sweep, from which the seed of each run is derived (default: 0)')
+	parser.add_argument('--track', default='assets/track.png',
+		help='the track description image (default: assets/track.png)')
+	parser.add_argument('--output', default=SWEEP_RESULTS_FILENAME,
+		help=f'the CSV file the results table is written to (default: {SWEEP_RESULTS_FILENAME})')
+	args = parser.parse_args()
+
+	# The track is compiled once and published in shared memory, so the workers don't each need to
+	# generate and hold their own copy of it
+	track = publish_map(compile_map(*game_map.gen_map(args.track)))
+
+	param_sets = generate_param_sets(args.params, args.random, random.Random(args.seed))
+	jobs = []
+	for params in param_sets:
+		for seed_idx in range(args.seeds):
+			jobs.append(SweepJob(len(jobs), params, f'{args.seed}:{seed_idx}', args, track))
+
+	param_names = [name for name, _ in args.params]
+	with open(args.output, 'w', newline='') as results_file:
+		# The results table has a row for every generation of every run, so the fitness curves of
+		# different configs can be compared directly
+		writer = csv.writer(results_file)
+		writer.writerow(['run', 'seed'] + param_names + ['generation', 'average', 'max', 'species'])
+
+		with multiprocessing.Pool(args.workers) as pool:
+			# Rows are written as the runs finish, so a sweep which is cut short keeps its results
+			for job, curve in pool.imap_unordered(run_job, jobs):
+				for generation, (average, max_fitness, num_species) in enumerate(curve):
+					writer.writerow([job.run_idx, job.seed] + [job.params[name] for name in param_names] +
+						[generation, average, max_fitness, num_species])
+				results_file.flush()
+				print(f'Finished run {job.run_idx+1}/{len(jobs)} {job.params}: Max: {curve[-1][1]:5.2f}')
+
+	track.unlink()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+
+import game_map
+from chunked_track import ChunkedTrack, build_chunked_track
+from compiled_map import compile_map
+from track_generator import generate_track
+from tests.test_simulation import TRACK_FILENAME
+
+class ContentKeyTest(unittest.TestCase):
+	def test_content_keys(self):
+		with tempfile.TemporaryDirectory() as track_dir:
+			def build(image_filename, name, chunk_tiles):
+				filename = os.path.join(track_dir, name)
+				build_chunked_track(image_filename, filename, chunk_tiles)
+				return ChunkedTrack(filename)
+
+			other_image = os.path.join(track_dir, 'other.png')
+			generate_track(other_image, 20, seed=1)
+			with build(TRACK_FILENAME, 'a.chunks', 16) as track_a, build(TRACK_FILENAME, 'b.chunks', 16) as track_b, \
+				build(TRACK_FILENAME, 'c.chunks', 32) as track_c, build(other_image, 'd.chunks', 16) as track_d:
+				# Identical tracks share a content key, while a different chunking or track doesn't
+				self.assertEqual(track_a.get_content_key(), track_b.get_content_key())
+				self.assertNotEqual(track_a.get_content_key(), track_c.get_content_key())
+				self.assertNotEqual(track_a.get_content_key(), track_d.get_content_key())
+
+	def test_compiled_map_content_key(self):
+		compiled_map = compile_map(*game_map.gen_map(TRACK_FILENAME))
+		content_key = compiled_map.get_content_key()
+		self.assertEqual(compile_map(*game_map.gen_map(TRACK_FILENAME)).get_content_key(), content_key)
+		self.assertIs(compiled_map.get_content_key(), content_key)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,83 @@
+import random
+import unittest
+
+from neat.genome import Genome
+from neat.config import DEFAULT_CONFIG
+from neat.innovation import InnovationRegistry
+from neat.unique_id import UniqueId
+
+def make_genome(seed, extra_genes=0):
+	"""
+	Returns a genome with random initial weights, and `extra_genes` additional links from the inputs to
+	the first output, which the other genomes of the tests don't have
+	"""
+
+	genome = Genome(3, 2, rng=random.Random(seed))
+	for i in range(extra_genes):
+		genome.add_gene(i, 4, 0.5, 100 + i)
+	return genome
+
+class CompatibilityDistanceTest(unittest.TestCase):
+	def test_bounded_distance_without_weight_coefficient(self):
+		# Without a weight coefficient, only the structural part of the distance remains
+		config = DEFAULT_CONFIG.with_changes(compatibility_coefficient_3=0)
+		genome_a, genome_b = make_genome(0, extra_genes=2), make_genome(1)
+
+		distance = genome_a.get_compatibility_distance(genome_b, config=config)
+		self.assertEqual(distance, 2 * config.compatibility_coefficient_1)
+		for max_distance in (0.5 * distance, distance, 2 * distance):
+			bounded_distance = genome_a.get_compatibility_distance(genome_b, max_distance, config)
+			self.assertEqual(bounded_distance, distance)
+		self.assertTrue(genome_a.is_compatible(genome_b, 2 * distance, config))
+		self.assertFalse(genome_a.is_compatible(genome_b, distance, config))
+
+	def test_bounded_distance_reaches_bound(self):
+		genome_a, genome_b = make_genome(0, extra_genes=2), make_genome(1)
+		distance = genome_a.get_compatibility_distance(genome_b)
+		self.assertGreater(distance, 0)
+		self.assertEqual(genome_a.get_compatibility_distance(genome_b, 2 * distance), distance)
+		self.assertGreaterEqual(genome_a.get_compatibility_distance(genome_b, 0.5 * distance), 0.5 * distance)
+
+	def test_bounded_distance_of_related_genomes(self):
+		# Genomes which share a history have matching, disjoint and excess genes. The bounded distance
+		# must be exact below the bound, and at least the bound otherwise
+		config = DEFAULT_CONFIG.with_changes(node_mutation_chance=0.3, link_mutation_chance=0.9)
+		rng = random.Random(0)
+		innovations = InnovationRegistry()
+		innovation_counter = UniqueId(2)
+		node_counter = UniqueId(6)
+		genomes = [Genome(3, 2, rng=rng)]
+		for _ in range(60):
+			genome = rng.choice(genomes).clone()
+			for _ in range(rng.randrange(1, 4)):
+				genome.mutate(innovations, innovation_counter, node_counter, rng, config)
+			genomes.append(genome)
+
+		for _ in range(500):
+			genome_a, genome_b = rng.choice(genomes), rng.choice(genomes)
+			distance = genome_a.get_compatibility_distance(genome_b)
+			max_distance = rng.uniform(0, 2 * distance + 1)
+			bounded_distance = genome_a.get_compatibility_distance(genome_b, max_distance)
+			if distance < max_distance:
+				self.assertAlmostEqual(bounded_distance, distance)
+			else:
+				self.assertGreaterEqual(bounded_distance, max_distance)
+			self.assertEqual(genome_a.is_compatible(genome_b, max_distance), distance < max_distance)
+
+class NodeDescendantsTest(unittest.TestCase):
+	def test_cached_descendants_match_rebuilt(self):
+		# The descendants are kept up to date through mutations, and must match finding them again
+		config = DEFAULT_CONFIG.with_changes(node_mutation_chance=0.3, link_mutation_chance=0.9)
+		rng = random.Random(0)
+		for _ in range(20):
+			genome = Genome(3, 2, rng=rng)
+			innovations = InnovationRegistry()
+			innovation_counter = UniqueId(2)
+			node_counter = UniqueId(6)
+			for _ in range(40):
+				genome.get_node_descendants()
+				genome.mutate(innovations, innovation_counter, node_counter, rng, config)
+				self.assertEqual(genome.get_node_descendants(), genome.clone().get_node_descendants())
+
+if __name__ == '__main__':
+	unittest.main()
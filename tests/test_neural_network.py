@@ -0,0 +1,90 @@
+import random
+import unittest
+
+from neat.genome import Genome
+from neat.config import DEFAULT_CONFIG
+from neat.innovation import InnovationRegistry
+from neat.neural_connection import NeuralConnection
+from neat.neural_network import NeuralNetwork
+from neat.unique_id import UniqueId
+
+NUM_INPUTS = 4
+NUM_OUTPUTS = 3
+
+# Only structural mutations, so the genomes grow quickly
+STRUCTURAL_CONFIG = DEFAULT_CONFIG.with_changes(node_mutation_chance=0.4, link_mutation_chance=0.8)
+
+def make_random_genome(rng, num_mutations=40):
+	"""
+	Returns a genome grown by `num_mutations` random mutations, where some of the genes are then
+	disabled (leaving dead and constant nodes behind) and some links are duplicated (giving parallel
+	connections)
+	"""
+
+	genome = Genome(NUM_INPUTS, NUM_OUTPUTS, rng=rng)
+	innovations = InnovationRegistry()
+	innovation_counter = UniqueId(NUM_OUTPUTS)
+	node_counter = UniqueId(NUM_INPUTS + 1 + NUM_OUTPUTS)
+	for _ in range(num_mutations):
+		genome.mutate(innovations, innovation_counter, node_counter, rng, STRUCTURAL_CONFIG)
+
+	for gene_idx in range(len(genome)):
+		if genome.disabled[gene_idx]: continue
+		if rng.random() < 0.15:
+			genome.disable_gene(gene_idx)
+		elif rng.random() < 0.15:
+			genome.add_gene(genome.in_nodes[gene_idx], genome.out_nodes[gene_idx], (rng.random() * 2) - 1,
+				innovation_counter.next_id())
+	return genome
+
+def count_connections(network):
+	return sum(len(network.connections[node]) for node in network.evaluation_order)
+
+class SimplifiedNetworkTest(unittest.TestCase):
+	def assert_same_outputs(self, network, simplified, rng):
+		for _ in range(20):
+			network_input = [rng.uniform(-2, 2) for _ in range(network.num_inputs)]
+			outputs = network.evaluate_input(network_input)
+			simplified_outputs = simplified.evaluate_input(network_input)
+			self.assertEqual(len(outputs), len(simplified_outputs))
+			for output, simplified_output in zip(outputs, simplified_outputs):
+				self.assertAlmostEqual(output, simplified_output, places=9)
+
+	def test_random_genomes(self):
+		rng = random.Random(0)
+		for _ in range(100):
+			genome = make_random_genome(rng)
+			network = genome.as_neural_network(simplify=False)
+			simplified = network.simplified()
+
+			self.assert_same_outputs(network, simplified, rng)
+			self.assertLessEqual(len(simplified.evaluation_order), len(network.evaluation_order))
+			self.assertLessEqual(count_connections(simplified), count_connections(network))
+			# Simplifying is idempotent
+			self.assertEqual(count_connections(simplified.simplified()), count_connections(simplified))
+
+	def test_removed_parts(self):
+		# Inputs 0-1, bias 2, outputs 3-4, and hidden nodes: 5 is dead since no node uses it, 6 only
+		# depends on the bias so it is constant, and 7 is fed by input 0 twice
+		connections = [[] for _ in range(8)]
+		connections[5] = [NeuralConnection(1, 0.7)]
+		connections[6] = [NeuralConnection(2, 0.4)]
+		connections[7] = [NeuralConnection(0, 0.5), NeuralConnection(0, -0.2)]
+		connections[3] = [NeuralConnection(6, 1.5), NeuralConnection(7, 0.9)]
+		connections[4] = [NeuralConnection(1, 0.3), NeuralConnection(1, -0.3)]
+		network = NeuralNetwork(2, 2, [5, 6, 7, 3, 4], connections)
+		simplified = network.simplified()
+
+		self.assert_same_outputs(network, simplified, random.Random(0))
+		# Only the output nodes and node 7 are left
+		self.assertEqual(len(simplified.evaluation_order), 3)
+		hidden_node = next(node for node in simplified.evaluation_order if node >= 5)
+		# The parallel connections into node 7 are merged
+		self.assertEqual([(conn.in_node, conn.weight) for conn in simplified.connections[hidden_node]], [(0, 0.3)])
+		# The constant node 6 is folded into the bias of output 3
+		self.assertEqual(sorted(conn.in_node for conn in simplified.connections[3]), [2, hidden_node])
+		# The parallel connections into output 4 cancel out
+		self.assertEqual(simplified.connections[4], [])
+
+if __name__ == '__main__':
+	unittest.main()
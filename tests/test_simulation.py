@@ -0,0 +1,61 @@
+import os
+import random
+import unittest
+
+import game_map
+from neat.genome import Genome
+from neat.config import DEFAULT_CONFIG
+from neat.innovation import InnovationRegistry
+from neat.unique_id import UniqueId
+from fitness_cache import FitnessCache, evaluate_genomes
+from simulation import evaluate_networks
+from simulation_config import DEFAULT_SIMULATION_CONFIG
+
+TRACK_FILENAME = os.path.join(os.path.dirname(__file__), '..', 'assets', 'track.png')
+
+def make_genomes(num_genomes, seed, sim_config=DEFAULT_SIMULATION_CONFIG):
+	"""
+	Returns `num_genomes` genomes with random weights and topologies, so their cars drive differently,
+	with the inputs of the sensors of `sim_config`
+	"""
+
+	rng = random.Random(seed)
+	num_inputs = sim_config.num_inputs()
+	innovations = InnovationRegistry()
+	innovation_counter = UniqueId(4)
+	node_counter = UniqueId(num_inputs + 1 + 4)
+	config = DEFAULT_CONFIG.with_changes(node_mutation_chance=0.2, link_mutation_chance=0.9)
+
+	genomes = []
+	for _ in range(num_genomes):
+		genome = Genome(num_inputs, 4, rng=rng)
+		for _ in range(rng.randrange(20)):
+			genome.mutate(innovations, innovation_counter, node_counter, rng, config)
+		genomes.append(genome)
+	return genomes
+
+class BatchIndependenceTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.track = game_map.gen_map(TRACK_FILENAME)
+		cls.genomes = make_genomes(16, 0)
+
+	def test_fitness_alone_and_in_batch(self):
+		networks = [genome.as_neural_network() for genome in self.genomes]
+		batch_fitness = evaluate_networks(networks, *self.track)
+		# The cars must not all behave the same, otherwise the test doesn't show anything
+		self.assertGreater(len(set(batch_fitness)), 2)
+		for network, fitness in zip(networks, batch_fitness):
+			self.assertEqual(evaluate_networks([network], *self.track), [fitness])
+
+	def test_cached_fitness_matches_uncached(self):
+		cache = FitnessCache()
+		# Half of the genomes are cached first, then every genome is evaluated in a batch where only
+		# the other half is simulated
+		partial_fitness = evaluate_genomes(self.genomes[::2], *self.track, cache)
+		fitness = evaluate_genomes(self.genomes, *self.track, cache)
+		self.assertEqual(fitness[::2], partial_fitness)
+		self.assertEqual(fitness, evaluate_genomes(self.genomes, *self.track, FitnessCache()))
+
+if __name__ == '__main__':
+	unittest.main()
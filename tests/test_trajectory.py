@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+
+import game_map
+from simulation import simulate
+from simulation_config import DEFAULT_SIMULATION_CONFIG, parse_ray_angle
+from trajectory import TrajectoryRecorder, TrajectoryReader
+from tests.test_simulation import TRACK_FILENAME, make_genomes
+
+class TrajectoryRecordingTest(unittest.TestCase):
+	def test_recorded_config(self):
+		# The cars are replayed with the sensors they were simulated with, not the default ones
+		config = DEFAULT_SIMULATION_CONFIG.with_changes(checkpoint_heading_input=True,
+			ray_angles=tuple(parse_ray_angle(angle) for angle in (-40, -20, 0, 20, 40)))
+		networks = [genome.as_neural_network() for genome in make_genomes(4, 0, config)]
+
+		with tempfile.TemporaryDirectory() as record_dir:
+			filename = os.path.join(record_dir, 'trajectories.bin')
+			with TrajectoryRecorder(filename) as recorder:
+				recorder.begin_generation(3, len(networks))
+				game = simulate(networks, *game_map.gen_map(TRACK_FILENAME), config, recorder=recorder)
+				recorder.end_generation()
+
+			with TrajectoryReader(filename) as reader:
+				self.assertEqual(reader.generations(), [3])
+				trajectory = reader.read_generation(3)
+				self.assertEqual(trajectory.config, config)
+				self.assertEqual(trajectory.num_cars, len(networks))
+				# The last recorded step is the final state of the game
+				for car_idx, car in enumerate(game.cars):
+					(x, y), _, _, _, dead = trajectory.get_car_state(trajectory.num_steps - 1, car_idx)
+					self.assertAlmostEqual(x, car.position.x, places=2)
+					self.assertAlmostEqual(y, car.position.y, places=2)
+					self.assertEqual(dead, game.dead[car_idx])
+
+if __name__ == '__main__':
+	unittest.main()
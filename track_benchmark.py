@@ -0,0 +1,173 @@
+import os
+import csv
+import math
+import time
+import random
+import argparse
+import tempfile
+import itertools
+
+import game_map
+from game import Game
+from math_utils import Vector, Ray
+from compiled_map import compile_map
+from chunked_track import ChunkedTrack, build_chunked_track
+from neat.population import Population
+from simulation import simulate, generate_trial_starts
+from simulation_config import DEFAULT_SIMULATION_CONFIG, RAY_ANGLES, parse_ray_angle
+from track_generator import generate_track, TRACK_CHAMFER
+
+BENCHMARK_LENGTHS = [20, 80, 320]
+BENCHMARK_TIGHTNESS = [0, 0.5, 1]
+BENCHMARK_CARS = 60
+BENCHMARK_STEPS = 50
+BENCHMARK_RAYS = 2000
+BENCHMARK_RESULTS_FILENAME = 'track_benchmark.csv'
+
+# The ways a track can be held for the simulation
+TRACK_BACKENDS = ('compiled', 'chunked')
+
+DIAGONAL_WALL_COLORS = (game_map.UPPER_LEFT_WALL_COLOR, game_map.UPPER_RIGHT_WALL_COLOR,
+	game_map.LOWER_RIGHT_WALL_COLOR, game_map.LOWER_LEFT_WALL_COLOR)
+
+def load_track(backend, image_filename):
+	"""
+	Loads the track description image at `image_filename` into the track backend `backend`. Returns a
+	tuple of the start position, the walls and the checkpoints, and the time it took (in seconds).
+	"""
+
+	start = time.perf_counter()
+	if backend == 'compiled':
+		start_pos, walls, checkpoints = game_map.gen_map(image_filename)
+		walls = compile_map(start_pos, walls, checkpoints)
+	else:
+		chunked_filename = os.path.splitext(image_filename)[0] + '.chunks'
+		build_chunked_track(image_filename, chunked_filename)
+		walls = ChunkedTrack(chunked_filename)
+		start_pos, checkpoints = walls.start_pos, walls.get_checkpoints()
+	return ((start_pos, walls, checkpoints), time.perf_counter() - start)
+
+def benchmark_rays(track, num_rays, config, rng):
+	"""
+	Casts `num_rays` sensor rays in random directions from the checkpoints of `track`. Returns the
+	number of rays cast per second.
+	"""
+
+	start_pos, walls, checkpoints = track
+	game = Game(0, start_pos, walls, checkpoints, config)
+	rays = []
+	for _ in range(num_rays):
+		x, y = rng.choice(checkpoints)
+		rays.append(Ray(Vector(x, y), Vector.unit_from_angle(rng.uniform(0, 2*math.pi))))
+
+	start = time.perf_counter()
+	for ray in rays:
+		game.raycast_against_walls(ray, config.max_ray_length)
+	return num_rays / (time.perf_counter() - start)
+
+def benchmark_cars(track, num_cars, num_steps, config, rng):
+	"""
+	Drives `num_cars` cars, spread over the checkpoints of `track`, straight ahead for `num_steps`
+	steps. Returns a tuple of the number of car updates (with collisions and sensors) per second and
+	of fitness measurements per second.
+	"""
+
+	start_pos, walls, checkpoints = track
+	car_starts = generate_trial_starts(start_pos, checkpoints, num_cars + 1, rng, config)[1:]
+	game = Game(num_cars, start_pos, walls, checkpoints, config, car_starts)
+	controls = [{'forward': True, 'left': False, 'backward': False, 'right': False}]*num_cars
+
+	# Cars which crash stop costing anything, so only the updates of live cars are counted
+	car_updates = 0
+	start = time.perf_counter()
+	for _ in range(num_steps):
+		car_updates += game.dead.count(False)
+		game.update(config.timestep, controls)
+	updates_per_sec = car_updates / (time.perf_counter() - start)
+
+	start = time.perf_counter()
+	for _ in range(num_steps):
+		game.get_cars_fitness()
+	fitness_per_sec = num_steps * num_cars / (time.perf_counter() - start)
+
+	return (updates_per_sec, fitness_per_sec)
+
+def benchmark_evaluation(track, num_cars, config, seed):
+	"""
+	Evaluates a population of `num_cars` random networks on `track`, like the first generation of a
+	run. Returns a tuple of the time it took (in seconds) and the mean fitness.
+	"""
+
+	population = Population(num_cars, config.num_inputs(), 4, seed=seed)
+	networks = [organism.genome.as_neural_network() for organism in population.organisms]
+
+	start = time.perf_counter()
+	game = simulate(networks, *track, config)
+	elapsed = time.perf_counter() - start
+
+	fitness = game.get_cars_fitness()
+	return (elapsed, sum(fitness) / len(fitness))
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmarks the simulation on generated tracks of ' +
+		'increasing size and wall density')
+	parser.add_argument('--length', dest='lengths', metavar='N', type=int, action='append',
+		help=f'a track length to benchmark, in cells (may be given more than once, default: {BENCHMARK_LENGTHS})')
+	parser.add_argument('--tightness', dest='tightnesses', type=float, action='append',
+		help=f'a track tightness to benchmark (may be given more than once, default: {BENCHMARK_TIGHTNESS})')
+	parser.add_argument('--chamfer', type=float, default=TRACK_CHAMFER,
+		help=f'the fraction of the corners which are chamfered (default: {TRACK_CHAMFER})')
+	parser.add_argument('--backend', dest='backends', choices=TRACK_BACKENDS, action='append',
+		help=f'a track backend to benchmark (may be given more than once, default: all)')
+	parser.add_argument('--seeds', type=int, default=1,
+		help='the number of different tracks generated for every length and tightness (default: 1)')
+	parser.add_argument('--cars', type=int, default=BENCHMARK_CARS,
+		help=f'the number of cars driving at once (default: {BENCHMARK_CARS})')
+	parser.add_argument('--steps', type=int, default=BENCHMARK_STEPS,
+		help=f'the number of steps the spread out cars are driven (default: {BENCHMARK_STEPS})')
+	parser.add_argument('--rays', type=int, default=BENCHMARK_RAYS,
+		help=f'the number of sensor rays cast (default: {BENCHMARK_RAYS})')
+	parser.add_argument('--ray-angles', metavar='DEGREES', type=parse_ray_angle, nargs='+', default=RAY_ANGLES,
+		help='the angles of the sensor rays of the cars, relative to their heading (default: -25 0 25)')
+	parser.add_argument('--heading-input', action='store_true',
+		help='also give the networks the heading to the next checkpoint as an input')
+	parser.add_argument('--output', default=BENCHMARK_RESULTS_FILENAME,
+		help=f'the CSV file the results table is written to (default: {BENCHMARK_RESULTS_FILENAME})')
+	args = parser.parse_args()
+
+	lengths = args.lengths if args.lengths is not None else BENCHMARK_LENGTHS
+	tightnesses = args.tightnesses if args.tightnesses is not None else BENCHMARK_TIGHTNESS
+	backends = args.backends if args.backends is not None else TRACK_BACKENDS
+	config = DEFAULT_SIMULATION_CONFIG.with_changes(ray_angles=tuple(args.ray_angles),
+		checkpoint_heading_input=args.heading_input)
+
+	with open(args.output, 'w', newline='') as results_file, tempfile.TemporaryDirectory() as track_dir:
+		writer = csv.writer(results_file)
+		writer.writerow(['length', 'tightness', 'chamfer', 'seed', 'backend', 'sensor_inputs', 'width', 'height',
+			'walls', 'diagonal_walls', 'checkpoints', 'load_seconds', 'rays_per_sec', 'car_updates_per_sec',
+			'fitness_per_sec', 'evaluation_seconds', 'mean_fitness'])
+
+		for length, tightness, seed in itertools.product(lengths, tightnesses, range(args.seeds)):
+			image_filename = os.path.join(track_dir, f'track_{length}_{tightness}_{seed}.png')
+			width, height, tiles = generate_track(image_filename, length, tightness, args.chamfer, seed)
+			diagonal_walls = sum(1 for color in tiles.values() if color in DIAGONAL_WALL_COLORS)
+
+			for backend in backends:
+				track, load_seconds = load_track(backend, image_filename)
+				_, walls, checkpoints = track
+				# Every backend is measured with the same rays and cars
+				rays_per_sec = benchmark_rays(track, args.rays, config, random.Random(seed))
+				updates_per_sec, fitness_per_sec = benchmark_cars(track, args.cars, args.steps, config,
+					random.Random(seed))
+				evaluation_seconds, mean_fitness = benchmark_evaluation(track, args.cars, config, seed)
+
+				writer.writerow([length, tightness, args.chamfer, seed, backend, config.num_inputs(), width, height,
+					len(walls), diagonal_walls, len(checkpoints), load_seconds, rays_per_sec, updates_per_sec,
+					fitness_per_sec, evaluation_seconds, mean_fitness])
+				results_file.flush()
+				print(f'Length {length:4} Tightness {tightness:.2f} {backend:8} {width}x{height} tiles, ' +
+					f'{len(walls)} walls: Load: {load_seconds:6.3f}s Rays/sec: {rays_per_sec:8.0f} ' +
+					f'Car updates/sec: {updates_per_sec:7.0f} Evaluation: {evaluation_seconds:6.3f}s')
+
+if __name__ == "__main__":
+	main()
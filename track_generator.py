@@ -0,0 +1,199 @@
+import random
+import argparse
+
+import game_map
+from png_reader import write_png_rows
+from chunked_track import build_chunked_track
+
+# The loop is laid out on a grid of square cells of this many tiles: a wall on each side of a
+# corridor 2 tiles wide
+CELL_TILES = 4
+TRACK_LENGTH = 40
+TRACK_TIGHTNESS = 0.5
+TRACK_CHAMFER = 0.5
+# The widest bump pushed out of the loop while it grows, for a tightness of 0
+MAX_BUMP_WIDTH = 10
+# Growing the loop gives up after this many failed bumps per cell
+BUMP_ATTEMPTS_PER_CELL = 50
+# A checkpoint marks every this many cells of the loop
+CHECKPOINT_SPACING = 2
+# Checkpoints are numbered by the blue channel of their color
+MAX_CHECKPOINTS = 255
+BACKGROUND_COLOR = (0, 0, 0)
+
+# The offset to the neighboring cell in each direction
+DIRECTIONS = {'E': (1, 0), 'S': (0, 1), 'W': (-1, 0), 'N': (0, -1)}
+
+# The colors of the walls in the cell templates
+TEMPLATE_WALLS = {
+	'-': game_map.HORIZ_WALL_COLOR,
+	'|': game_map.VERT_WALL_COLOR,
+	'1': game_map.UPPER_LEFT_WALL_COLOR,
+	'2': game_map.UPPER_RIGHT_WALL_COLOR,
+	'3': game_map.LOWER_RIGHT_WALL_COLOR,
+	'4': game_map.LOWER_LEFT_WALL_COLOR
+}
+
+# The tiles of a cell which are driven through in the middle of the corridor, where checkpoints go
+CORRIDOR_TILES = ((1, 1), (2, 1), (1, 2), (2, 2))
+
+def mirror_template(template, mirror_x, mirror_y):
+	"""
+	Mirrors the cell template `template` horizontally if `mirror_x` and vertically if `mirror_y`. The
+	diagonal walls are swapped for the ones which face the mirrored way.
+	"""
+
+	if mirror_x:
+		template = [row[::-1].translate(str.maketrans('1234', '2143')) for row in template]
+	if mirror_y:
+		template = [row.translate(str.maketrans('1234', '4321')) for row in template[::-1]]
+	return template
+
+def get_cell_templates(corner_template):
+	"""
+	Returns the templates of the cells of the loop by the pair of directions the loop leaves the cell
+	in, where `corner_template` is the template of the corner which leaves to the east and south
+	"""
+
+	templates = {
+		frozenset('EW'): ['----', '....', '....', '----'],
+		frozenset('NS'): ['|..|', '|..|', '|..|', '|..|']
+	}
+	for mirror_x, horiz in ((False, 'E'), (True, 'W')):
+		for mirror_y, vert in ((False, 'S'), (True, 'N')):
+			templates[frozenset(horiz + vert)] = mirror_template(corner_template, mirror_x, mirror_y)
+	return templates
+
+# The corners are either cut by a single diagonal wall, or chamfered by a longer diagonal
+SQUARE_CELL_TEMPLATES = get_cell_templates(['1---', '|...', '|...', '|..1'])
+CHAMFERED_CELL_TEMPLATES = get_cell_templates(['.1--', '13..', '|...', '|..1'])
+
+def get_direction(cell, next_cell):
+	"""
+	Returns the direction from `cell` to the neighboring `next_cell`
+	"""
+
+	offset = (next_cell[0] - cell[0], next_cell[1] - cell[1])
+	return next(direction for direction, direction_offset in DIRECTIONS.items() if direction_offset == offset)
+
+def generate_loop(length, tightness, rng):
+	"""
+	Generates a closed loop of about `length` cells (at least 6), as the list of its cells in driving
+	order. The loop grows out of a rectangle by pushing out runs of cells, where a `tightness` of 1
+	only pushes out runs of 2 cells, giving many tight turns, and a `tightness` of 0 pushes out runs
+	of up to `MAX_BUMP_WIDTH` cells, giving long straights. The first cell is driven straight towards
+	+x, where cars start.
+	"""
+
+	loop = [(1, 0), (2, 0), (2, 1), (1, 1), (0, 1), (0, 0)]
+	start = loop[0]
+	occupied = set(loop)
+	max_width = 2 + round((1 - tightness) * (MAX_BUMP_WIDTH - 2))
+
+	for _ in range(BUMP_ATTEMPTS_PER_CELL * length):
+		if len(loop) >= length:
+			break
+
+		# We pick a run of cells which all lead the same way
+		first_idx = rng.randrange(len(loop))
+		loop = loop[first_idx:] + loop[:first_idx]
+		direction = get_direction(loop[0], loop[1])
+		width = rng.randint(2, max_width)
+		run_length = 2
+		while run_length < min(width, len(loop) - 1) and get_direction(loop[run_length - 1], loop[run_length]) == direction:
+			run_length += 1
+		run = loop[:run_length]
+		# The start cell and the cells it connects to stay as they are
+		if start in run:
+			continue
+
+		# The run is pushed out to one side, if there is room for it
+		dx, dy = DIRECTIONS[direction]
+		side_x, side_y = rng.choice(((-dy, dx), (dy, -dx)))
+		pushed = [(x + side_x, y + side_y) for x, y in run]
+		if any(cell in occupied for cell in pushed):
+			continue
+
+		occupied.difference_update(run[1:-1])
+		occupied.update(pushed)
+		loop = [run[0]] + pushed + [run[-1]] + loop[run_length:]
+
+	start_idx = loop.index(start)
+	return loop[start_idx:] + loop[:start_idx]
+
+def render_loop(loop, chamfer, rng):
+	"""
+	Lays out the walls, the start and the checkpoints of the track along `loop` as the colors of the
+	tiles of the map. A fraction `chamfer` of the corners is chamfered. Returns a tuple of the width
+	and height of the map in tiles and a dict of the color of each non-empty `(x, y)` tile.
+	"""
+
+	min_x = min(x for x, _ in loop)
+	min_y = min(y for _, y in loop)
+	# The map has a border of empty tiles
+	width = (max(x for x, _ in loop) - min_x + 1) * CELL_TILES + 2
+	height = (max(y for _, y in loop) - min_y + 1) * CELL_TILES + 2
+	checkpoint_spacing = max(CHECKPOINT_SPACING, -(-len(loop) // MAX_CHECKPOINTS))
+
+	tiles = dict()
+	for cell_idx, cell in enumerate(loop):
+		prev_cell = loop[cell_idx - 1]
+		next_cell = loop[(cell_idx + 1) % len(loop)]
+		exits = frozenset((get_direction(cell, prev_cell), get_direction(cell, next_cell)))
+		templates = CHAMFERED_CELL_TEMPLATES if rng.random() < chamfer else SQUARE_CELL_TEMPLATES
+		template = templates[exits]
+
+		origin_x = (cell[0] - min_x) * CELL_TILES + 1
+		origin_y = (cell[1] - min_y) * CELL_TILES + 1
+		for y, row in enumerate(template):
+			for x, symbol in enumerate(row):
+				if symbol in TEMPLATE_WALLS:
+					tiles[(origin_x + x, origin_y + y)] = TEMPLATE_WALLS[symbol]
+
+		if cell_idx % checkpoint_spacing == 0:
+			x, y = next((x, y) for x, y in CORRIDOR_TILES if template[y][x] == '.')
+			checkpoint = cell_idx // checkpoint_spacing
+			if checkpoint == 0:
+				tiles[(origin_x + x, origin_y + y)] = game_map.CAR_START_COLOR
+			else:
+				tiles[(origin_x + x, origin_y + y)] = game_map.CHECKPOINT_MARKER_COLOR + (checkpoint,)
+
+	return (width, height, tiles)
+
+def generate_track(filename, length=TRACK_LENGTH, tightness=TRACK_TIGHTNESS, chamfer=TRACK_CHAMFER, seed=0):
+	"""
+	Generates a random closed track, see `generate_loop` and `render_loop`, and writes its track
+	description image to `filename`. Returns the tuple of the width and height of the map in tiles
+	and the colors of its tiles.
+	"""
+
+	rng = random.Random(seed)
+	loop = generate_loop(length, tightness, rng)
+	width, height, tiles = render_loop(loop, chamfer, rng)
+
+	rows = ([tiles.get((x, y), BACKGROUND_COLOR) for x in range(width)] for y in range(height))
+	write_png_rows(filename, width, height, rows)
+	return (width, height, tiles)
+
+def main():
+	parser = argparse.ArgumentParser(description='Generates random closed tracks, for benchmarks on tracks ' +
+		'of any size')
+	parser.add_argument('output', metavar='OUTPUT', help='the track description image to write')
+	parser.add_argument('--length', metavar='N', type=int, default=TRACK_LENGTH,
+		help=f'the length of the track, in cells of {CELL_TILES} tiles (default: {TRACK_LENGTH})')
+	parser.add_argument('--tightness', type=float, default=TRACK_TIGHTNESS,
+		help=f'from 0 for long straights to 1 for constant turns (default: {TRACK_TIGHTNESS})')
+	parser.add_argument('--chamfer', type=float, default=TRACK_CHAMFER,
+		help=f'the fraction of the corners which are chamfered by longer diagonal walls (default: {TRACK_CHAMFER})')
+	parser.add_argument('--seed', type=int, default=0, help='the seed of the track (default: 0)')
+	parser.add_argument('--chunked', metavar='TRACK',
+		help='also convert the track into the chunked track TRACK')
+	args = parser.parse_args()
+
+	width, height, tiles = generate_track(args.output, args.length, args.tightness, args.chamfer, args.seed)
+	print(f'Wrote a {width}x{height} track to {args.output}')
+	if args.chunked is not None:
+		build_chunked_track(args.output, args.chunked)
+
+if __name__ == "__main__":
+	main()
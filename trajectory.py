@@ -0,0 +1,222 @@
+import os
+import sys
+import mmap
+import struct
+from array import array
+
+from neat.genome import little_endian_bytes
+from neat.record_index import RecordWriter, read_record_index
+from simulation_config import DEFAULT_SIMULATION_CONFIG, SimulationConfig
+
+# Every record in the trajectory data file starts with this header: the generation, the number of
+# cars, the number of recorded steps and the length of the simulation config the generation was
+# recorded with, which follows the header as JSON, padded to the record alignment
+RECORD_HEADER = struct.Struct('<qIII4x')
+
+# The float columns of a record, in the order they are laid out in it. Each holds a value for every
+# car at every step, step by step
+STATE_COLUMNS = ('x', 'y', 'direction', 'velocity')
+
+# The bits of the flags column, which holds the controls of each car and whether it is dead
+CONTROL_FLAGS = {'forward': 1, 'left': 2, 'backward': 4, 'right': 8}
+DEAD_FLAG = 16
+
+# Records are padded so that every record, and therefore every column of floats, is aligned
+RECORD_ALIGNMENT = 8
+
+class TrajectoryRecorder:
+	"""
+	Records the trajectories of the cars of a game to disk: at every step the position, direction,
+	velocity and controls of every car. A generation is recorded as a columnar record of float32
+	arrays, which are only written once the generation ends, together with the simulation config of
+	the game, so the cars are replayed with the sensors they had. Like the history, the data file is only
+	ever appended to, and an index file maps each generation to its record.
+	"""
+
+	def __init__(self, filename):
+		# Opening in append mode means that a resumed run continues the existing trajectories
+		self.writer = RecordWriter(filename)
+
+		self.generation = None
+
+	def begin_generation(self, generation, num_cars):
+		"""
+		Starts recording `generation`, which has `num_cars` cars
+		"""
+
+		self.generation = generation
+		self.num_cars = num_cars
+		self.config = DEFAULT_SIMULATION_CONFIG
+		self.step_times = array('d')
+		self.columns = {name: array('f') for name in STATE_COLUMNS}
+		self.flags = array('B')
+
+	def record_step(self, game, car_controls):
+		"""
+		Records the state of every car in `game` after an update with the controls `car_controls`
+		"""
+
+		if self.generation is None:
+			return
+
+		self.config = game.config
+		self.step_times.append(game.time)
+		x, y = self.columns['x'], self.columns['y']
+		direction, velocity = self.columns['direction'], self.columns['velocity']
+		for car_idx, car in enumerate(game.cars):
+			x.append(car.position.x)
+			y.append(car.position.y)
+			direction.append(car.direction)
+			velocity.append(car.velocity)
+
+			flags = DEAD_FLAG if game.dead[car_idx] else 0
+			for control, flag in CONTROL_FLAGS.items():
+				if car_controls[car_idx][control]:
+					flags |= flag
+			self.flags.append(flags)
+
+	def end_generation(self):
+		"""
+		Writes the record of the generation being recorded
+		"""
+
+		config_bytes = self.config.to_json()
+		config_bytes += bytes(-len(config_bytes) % RECORD_ALIGNMENT)
+		parts = [RECORD_HEADER.pack(self.generation, self.num_cars, len(self.step_times), len(config_bytes)),
+			config_bytes, little_endian_bytes(self.step_times)]
+		parts.extend(little_endian_bytes(self.columns[name]) for name in STATE_COLUMNS)
+		parts.append(self.flags.tobytes())
+		self.writer.write_record(self.generation, parts, RECORD_ALIGNMENT)
+
+		self.generation = None
+
+	def close(self):
+		self.writer.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+class GenerationTrajectory:
+	"""
+	The recorded trajectories of the cars of a single generation. The columns are views into the
+	memory-mapped data file, so only the parts which are actually looked at are read from disk.
+	"""
+
+	def __init__(self, generation, num_cars, step_times, columns, flags, config=DEFAULT_SIMULATION_CONFIG):
+		self.generation = generation
+		self.num_cars = num_cars
+		# The `SimulationConfig` the generation was simulated with
+		self.config = config
+		self.num_steps = len(step_times)
+		# The game time (in seconds) of each step
+		self.step_times = step_times
+		# The state of car `i` at step `s` is at index `s*num_cars + i` of each column
+		self.x = columns['x']
+		self.y = columns['y']
+		self.direction = columns['direction']
+		self.velocity = columns['velocity']
+		self.flags = flags
+
+	def get_car_state(self, step, car_idx):
+		"""
+		Returns the state of the car at index `car_idx` after `step`: a tuple of its position, its
+		direction, its velocity, its controls and whether it is dead
+		"""
+
+		idx = step*self.num_cars + car_idx
+		flags = self.flags[idx]
+		controls = {control: flags & flag != 0 for control, flag in CONTROL_FLAGS.items()}
+		return ((self.x[idx], self.y[idx]), self.direction[idx], self.velocity[idx], controls,
+			flags & DEAD_FLAG != 0)
+
+	def is_dead(self, step, car_idx):
+		"""
+		Returns whether the car at index `car_idx` is dead after `step`
+		"""
+
+		return self.flags[step*self.num_cars + car_idx] & DEAD_FLAG != 0
+
+class TrajectoryReader:
+	"""
+	Reads trajectories written by `TrajectoryRecorder`. The data file is memory-mapped, and only the
+	index is loaded up front.
+	"""
+
+	def __init__(self, filename):
+		self.data_file = open(filename, 'rb')
+		# An empty file can't be memory-mapped, but then it has no records to read anyway
+		if os.path.getsize(filename) > 0:
+			self.data = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+		else:
+			self.data = None
+		self.views = []
+
+		# Maps each generation to the `(offset, length)` of its record
+		self.records = read_record_index(filename)
+
+	def generations(self):
+		"""
+		Returns a sorted list of the recorded generations
+		"""
+
+		return sorted(self.records)
+
+	def __len__(self):
+		return len(self.records)
+
+	def read_generation(self, generation):
+		"""
+		Returns the `GenerationTrajectory` of `generation`
+		"""
+
+		offset, _ = self.records[generation]
+		_, num_cars, num_steps, config_length = RECORD_HEADER.unpack_from(self.data, offset)
+		offset += RECORD_HEADER.size
+		# The config is padded with zero bytes, which aren't part of the JSON
+		config = SimulationConfig.from_json(self.data[offset:offset + config_length].rstrip(b'\0'))
+		offset += config_length
+
+		step_times = self.read_column('d', offset, num_steps)
+		offset += 8*num_steps
+		columns = dict()
+		for name in STATE_COLUMNS:
+			columns[name] = self.read_column('f', offset, num_steps*num_cars)
+			offset += 4*num_steps*num_cars
+		flags = self.read_column('B', offset, num_steps*num_cars)
+
+		return GenerationTrajectory(generation, num_cars, step_times, columns, flags, config)
+
+	def read_column(self, typecode, offset, count):
+		"""
+		Returns a view of the `count` values of type `typecode` at `offset` in the data file
+		"""
+
+		size = count * array(typecode).itemsize
+		if sys.byteorder == 'big' and typecode != 'B':
+			# The file is little-endian, so on big-endian machines the column has to be copied
+			column = array(typecode)
+			column.frombytes(self.data[offset:offset + size])
+			column.byteswap()
+			return column
+
+		view = memoryview(self.data)[offset:offset + size].cast(typecode)
+		# The views must be released before the file can be unmapped
+		self.views.append(view)
+		return view
+
+	def close(self):
+		for view in self.views:
+			view.release()
+		self.views = []
+		if self.data is not None:
+			self.data.close()
+		self.data_file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()